@@ -5,9 +5,11 @@ import { TrendingUp, TrendingDown, Activity, BarChart3 } from 'lucide-react';
 
 interface SentimentGaugeProps {
   sentiment: SentimentData;
+  // What the numbers cover, shown in the heading
+  caption?: string;
 }
 
-export function SentimentGauge({ sentiment }: SentimentGaugeProps) {
+export function SentimentGauge({ sentiment, caption = 'Last 500 Trades' }: SentimentGaugeProps) {
   // Calculate needle angle: 0 = -90deg (bearish), 100 = 90deg (bullish)
   const needleAngle = useMemo(() => {
     return (sentiment.sentimentScore / 100) * 180 - 90;
@@ -19,7 +21,7 @@ export function SentimentGauge({ sentiment }: SentimentGaugeProps) {
   return (
     <section className="glass-panel p-8 mb-6">
       <h2 className="text-center text-sm font-semibold text-secondary-foreground uppercase tracking-widest mb-6">
-        Market Sentiment • Last 500 Trades
+        Market Sentiment • {caption}
       </h2>
 
       {/* Gauge Visualization */}
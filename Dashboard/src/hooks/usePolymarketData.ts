@@ -1,6 +1,13 @@
 import { useState, useEffect, useCallback, useRef } from 'react';
-import { api } from '@/lib/api';
-import type { Trade, Trader, Market, OrderflowMarket } from '@/types/polymarket';
+import { api, type SnapshotResponse, type SnapshotSection } from '@/lib/api';
+import type {
+  Trade,
+  Trader,
+  Market,
+  OrderflowMarket,
+  ServerSentiment,
+  TimeframeFilter,
+} from '@/types/polymarket';
 
 interface DashboardData {
   trades: Trade[];
@@ -8,6 +15,7 @@ interface DashboardData {
   traders: Trader[];
   markets: Record<string, Market>;
   orderflow: Record<string, OrderflowMarket>;
+  sentiment: Partial<Record<TimeframeFilter, ServerSentiment>>;
   lastUpdated: Date | null;
   isLoading: boolean;
   errors: {
@@ -16,6 +24,7 @@ interface DashboardData {
     traders?: string;
     markets?: string;
     orderflow?: string;
+    sentiment?: string;
   };
 }
 
@@ -28,45 +37,71 @@ export function usePolymarketData() {
     traders: [],
     markets: {},
     orderflow: {},
+    sentiment: {},
     lastUpdated: null,
     isLoading: true,
     errors: {},
   });
 
   const isMounted = useRef(true);
+  // Last seen version per section; unchanged sections are not re-sent
+  const versions = useRef<Partial<Record<SnapshotSection, string | null>>>({});
 
   const fetchAllData = useCallback(async () => {
     if (!isMounted.current) return;
 
-    const errors: DashboardData['errors'] = {};
-    
-    // Fetch all endpoints in parallel
-    const [tradesResult, whalesResult, tradersResult, marketsResult, orderflowResult] = 
-      await Promise.allSettled([
-        api.getTrades(),
-        api.getWhales(),
-        api.getTraders(),
-        api.getMarkets(),
-        api.getOrderflow(),
-      ]);
+    // One conditional request for all sections instead of five full downloads
+    let snapshot: SnapshotResponse | null;
+    try {
+      snapshot = await api.getSnapshot(versions.current);
+    } catch (error) {
+      if (!isMounted.current) return;
+      const message = (error as Error)?.message;
+      setData(prev => ({
+        ...prev,
+        isLoading: false,
+        errors: {
+          trades: message,
+          whales: message,
+          traders: message,
+          markets: message,
+          orderflow: message,
+          sentiment: message,
+        },
+      }));
+      return;
+    }
 
     if (!isMounted.current) return;
 
+    if (snapshot === null) {
+      // 304: nothing changed since the last poll
+      setData(prev => ({ ...prev, lastUpdated: new Date(), isLoading: false, errors: {} }));
+      return;
+    }
+
+    const { sections, versions: latest } = snapshot;
+    versions.current = latest;
+    const missing = (section: SnapshotSection) =>
+      latest[section] === null ? 'Not loaded yet' : undefined;
+
     setData(prev => ({
       ...prev,
-      trades: tradesResult.status === 'fulfilled' ? tradesResult.value : prev.trades,
-      whales: whalesResult.status === 'fulfilled' ? whalesResult.value : prev.whales,
-      traders: tradersResult.status === 'fulfilled' ? tradersResult.value : prev.traders,
-      markets: marketsResult.status === 'fulfilled' ? marketsResult.value : prev.markets,
-      orderflow: orderflowResult.status === 'fulfilled' ? orderflowResult.value : prev.orderflow,
+      trades: sections.trades ?? prev.trades,
+      whales: sections.whales ?? prev.whales,
+      traders: sections.traders ?? prev.traders,
+      markets: sections.markets ?? prev.markets,
+      orderflow: sections.orderflow ?? prev.orderflow,
+      sentiment: sections.sentiment ?? prev.sentiment,
       lastUpdated: new Date(),
       isLoading: false,
       errors: {
-        trades: tradesResult.status === 'rejected' ? tradesResult.reason?.message : undefined,
-        whales: whalesResult.status === 'rejected' ? whalesResult.reason?.message : undefined,
-        traders: tradersResult.status === 'rejected' ? tradersResult.reason?.message : undefined,
-        markets: marketsResult.status === 'rejected' ? marketsResult.reason?.message : undefined,
-        orderflow: orderflowResult.status === 'rejected' ? orderflowResult.reason?.message : undefined,
+        trades: missing('trades'),
+        whales: missing('whales'),
+        traders: missing('traders'),
+        markets: missing('markets'),
+        orderflow: missing('orderflow'),
+        sentiment: missing('sentiment'),
       },
     }));
   }, []);
@@ -25,8 +25,47 @@ async function fetchAPI<T>(endpoint: string): Promise<T> {
   return response.json();
 }
 
+/** Dashboard sections served together by /api/snapshot */
+export type SnapshotSection =
+  | "trades"
+  | "whales"
+  | "traders"
+  | "markets"
+  | "orderflow"
+  | "sentiment";
+
+export interface SnapshotResponse {
+  // Current version of every section (null until the bot has written it)
+  versions: Record<SnapshotSection, string | null>;
+  // Only the sections whose version differs from the one we sent
+  sections: Partial<Record<SnapshotSection, any>>;
+}
+
+/**
+ * Combined conditional fetch: sends the last seen version of each section and
+ * gets back only what changed. Resolves to null when nothing did (304).
+ */
+async function fetchSnapshot(
+  versions: Partial<Record<SnapshotSection, string | null>>
+): Promise<SnapshotResponse | null> {
+  const params = new URLSearchParams();
+  for (const [section, version] of Object.entries(versions)) {
+    if (version) params.set(section, version);
+  }
+  const query = params.toString();
+  const response = await fetch(`${API_BASE}/api/snapshot${query ? `?${query}` : ""}`);
+  if (response.status === 304) return null;
+  if (!response.ok) {
+    throw new Error(`API Error: ${response.status} ${response.statusText}`);
+  }
+  return response.json();
+}
+
 // API endpoints matching the existing backend
 export const api = {
+  // all dashboard sections, only those changed since `versions`
+  getSnapshot: fetchSnapshot,
+
   // recent trades
   getTrades: () => fetchAPI<any[]>("/api/trades/recent"),
 
@@ -42,6 +81,9 @@ export const api = {
   // orderflow data
   getOrderflow: () => fetchAPI<Record<string, any>>("/api/orderflow"),
 
+  // bullish/bearish sentiment over all markets, per timeframe (1h/6h/24h/all)
+  getSentiment: () => fetchAPI<Record<string, any>>("/api/sentiment"),
+
   // Export URLs (for download links)
   exportBySizeUrl: `${API_BASE}/api/full/sorted`,
   exportChronoUrl: `${API_BASE}/api/full/chrono`,
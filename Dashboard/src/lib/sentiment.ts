@@ -1,4 +1,19 @@
-import type { Trade, SentimentData, TimeframeFilter } from '@/types/polymarket';
+import type { Trade, SentimentData, ServerSentiment, TimeframeFilter } from '@/types/polymarket';
+
+/**
+ * Sentiment the backend keeps over every trade (/api/sentiment), in the
+ * shape calculateSentiment returns
+ */
+export function fromServerSentiment(entry: ServerSentiment): SentimentData {
+  return {
+    bullishCount: entry.bullish_count,
+    bearishCount: entry.bearish_count,
+    totalAnalyzed: entry.total_analyzed,
+    bullishPercent: entry.bullish_percent,
+    bearishPercent: entry.bearish_percent,
+    sentimentScore: entry.sentiment_score,
+  };
+}
 
 /**
  * Calculate market sentiment from trades
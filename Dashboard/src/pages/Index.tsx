@@ -1,6 +1,6 @@
 import { useState, useMemo, useCallback } from 'react';
 import { usePolymarketData } from '@/hooks/usePolymarketData';
-import { calculateSentiment } from '@/lib/sentiment';
+import { calculateSentiment, fromServerSentiment } from '@/lib/sentiment';
 import type { TimeframeFilter } from '@/types/polymarket';
 import {
   DashboardHeader,
@@ -16,7 +16,8 @@ import {
 
 const PolymarketDashboard = () => {
   // API data
-  const { trades, whales, traders, markets, orderflow, lastUpdated, isLoading, errors } = usePolymarketData();
+  const { trades, whales, traders, markets, orderflow, sentiment: serverSentiment, lastUpdated, isLoading, errors } =
+    usePolymarketData();
 
   // Filter state
   const [searchValue, setSearchValue] = useState('');
@@ -27,10 +28,15 @@ const PolymarketDashboard = () => {
   // Modal state
   const [selectedMarket, setSelectedMarket] = useState<string | null>(null);
 
-  // Calculate sentiment from trades with timeframe filter
+  // Sentiment over every trade of the timeframe, kept by the backend; until
+  // it arrives (or from an older backend) estimate it from the recent trades
+  const serverEntry = serverSentiment[timeframe];
   const sentiment = useMemo(() => {
-    return calculateSentiment(trades, 500, timeframe);
-  }, [trades, timeframe]);
+    return serverEntry ? fromServerSentiment(serverEntry) : calculateSentiment(trades, 500, timeframe);
+  }, [serverEntry, trades, timeframe]);
+  const sentimentCaption = serverEntry
+    ? timeframe === 'all' ? 'All Trades' : `Last ${timeframe}`
+    : 'Last 500 Trades';
 
   // Check if connected (at least one successful fetch)
   const isConnected = useMemo(() => {
@@ -57,7 +63,7 @@ const PolymarketDashboard = () => {
         <DashboardHeader lastUpdated={lastUpdated} isConnected={isConnected || isLoading} />
 
         {/* Sentiment Gauge */}
-        <SentimentGauge sentiment={sentiment} />
+        <SentimentGauge sentiment={sentiment} caption={sentimentCaption} />
 
         {/* Controls Bar */}
         <ControlsBar
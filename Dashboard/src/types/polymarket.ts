@@ -57,6 +57,18 @@ export interface SentimentData {
   sentimentScore: number;
 }
 
+// One timeframe of /api/sentiment, as computed by the backend
+export interface ServerSentiment {
+  bullish_count: number;
+  bearish_count: number;
+  bullish_volume: number;
+  bearish_volume: number;
+  total_analyzed: number;
+  bullish_percent: number;
+  bearish_percent: number;
+  sentiment_score: number;
+}
+
 // Sort state for tables
 export interface SortState {
   column: string;
@@ -0,0 +1,131 @@
+"""
+Exact vs approximate (Space-Saving) trader leaderboard: memory, cost per
+trade and cycle, and how closely the approximate top list matches.
+
+    python bench/bench_leaderboard.py --trades 1000000 --wallets 300000
+    python bench/bench_leaderboard.py --capacity 2000 --slots 4
+
+Wallet activity and trade sizes are heavy-tailed (Pareto), like the real feed.
+"""
+
+import argparse
+import gc
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot import (  # noqa: E402
+    TOP_TRADERS_COUNT,
+    ApproxTraderLeaderboard,
+    TraderLeaderboard,
+    TradeRecord,
+)
+
+
+def make_trades(n, wallets, markets):
+    trades = []
+    for i in range(n):
+        # a heavy-tailed core of active wallets plus a long tail of one-offs
+        if random.random() < 0.6:
+            wallet = int(random.paretovariate(0.7)) % wallets
+        else:
+            wallet = random.randrange(wallets)
+        # each wallet mostly trades in a few favourite markets
+        market = (wallet * 7 + int(random.expovariate(0.5))) % markets
+        trades.append(TradeRecord(
+            size=round(random.paretovariate(1.3) * 20, 2),
+            market_title=f"Market {market}",
+            outcome=random.choice(["Yes", "No"]),
+            price=round(random.random(), 3),
+            ts=1769191200 + i,
+            name=f"trader{wallet}",
+            pseudonym="",
+            proxyWallet=f"0x{wallet:040x}",
+            transactionHash=f"0x{i:064x}",
+            side="buy",
+            outcomeIndex=0,
+        ))
+    return trades
+
+
+def run(board, trades):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    for t in trades:
+        board.add(t.name, t, t.size * t.price)
+    ingest_s = time.perf_counter() - start
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    gc.collect()  # keep a pending full collection out of the cycle timing
+    cycle_ms = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        rows = board.rows()
+        cycle_ms = min(cycle_ms, (time.perf_counter() - start) * 1000)
+    return rows, ingest_s, memory, cycle_ms
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--trades", type=int, default=1_000_000)
+    parser.add_argument("--wallets", type=int, default=300_000)
+    parser.add_argument("--markets", type=int, default=2_000)
+    parser.add_argument("--capacity", type=int, default=10_000, help="approx counters")
+    parser.add_argument("--slots", type=int, default=8, help="approx market/outcome slots")
+    parser.add_argument("--top", type=int, default=TOP_TRADERS_COUNT)
+    args = parser.parse_args()
+
+    random.seed(42)
+    trades = make_trades(args.trades, args.wallets, args.markets)
+
+    exact = TraderLeaderboard(args.top)
+    exact_rows, exact_s, exact_mem, exact_ms = run(exact, trades)
+    approx = ApproxTraderLeaderboard(args.top, args.capacity, args.slots)
+    approx_rows, approx_s, approx_mem, approx_ms = run(approx, trades)
+
+    # The old cycle: a row for every trader ever seen, sorted
+    gc.collect()
+    start = time.perf_counter()
+    res = [
+        {"name": nm, "total_volume": a["total_volume"], "trade_count": a["trade_count"],
+         "top_market": a["top_market"], "top_outcome": a["top_outcome"]}
+        for nm, a in exact.traders.items()
+    ]
+    res.sort(key=lambda x: x["total_volume"], reverse=True)
+    full_sort_ms = (time.perf_counter() - start) * 1000
+
+    n = len(trades)
+    print(f"{n:,} trades, {len(exact.traders):,} distinct traders, top {args.top}")
+    print(f"  exact   {exact_mem / 1e6:7.1f} MB  {exact_s / n * 1e6:.2f} us/trade  "
+          f"cycle {exact_ms:.1f} ms (all traders sorted: {full_sort_ms:.1f} ms)")
+    print(f"  approx  {approx_mem / 1e6:7.1f} MB  {approx_s / n * 1e6:.2f} us/trade  "
+          f"cycle {approx_ms:.1f} ms  capacity {args.capacity:,}, slots {args.slots}")
+
+    # Accuracy of the approximate list against the exact one
+    true = {r["name"]: r for r in exact_rows}
+    for k in (10, 100, args.top):
+        exact_names = {r["name"] for r in exact_rows[:k]}
+        approx_names = {r["name"] for r in approx_rows[:k]}
+        print(f"  top {k:<4} recall {len(exact_names & approx_names) / len(exact_names):.3f}")
+    errors = [
+        abs(r["total_volume"] - true[r["name"]]["total_volume"]) / true[r["name"]]["total_volume"]
+        for r in approx_rows if r["name"] in true
+    ]
+    same_rank = sum(a["name"] == e["name"] for a, e in zip(approx_rows, exact_rows))
+    shared = [r for r in approx_rows if r["name"] in true]
+    market_ok = sum(r["top_market"] == true[r["name"]]["top_market"] for r in shared)
+    print(f"  volume error on shared traders: mean {sum(errors) / len(errors):.2e}, "
+          f"max {max(errors):.2e}; same rank {same_rank}/{len(exact_rows)}")
+    print(f"  top_market agrees for {market_ok}/{len(shared)}; "
+          f"error bound {approx.stats()['error_bound']:,.0f} "
+          f"(#{args.top} exact volume {exact_rows[-1]['total_volume']:,.0f})")
+
+
+if __name__ == "__main__":
+    main()
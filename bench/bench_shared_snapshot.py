@@ -0,0 +1,139 @@
+"""
+Memory of N API workers: a FileCache per worker vs one shared mmap snapshot.
+
+    python bench/bench_shared_snapshot.py --trades 20000 --workers 1 2 4
+
+Writes synthetic outputs once through the bot's SnapshotWriter (data files
+plus the shared snapshot), then starts --workers processes that each load
+every output the way a worker would and read every encoded body. Reports the
+summed PSS of the workers, where pages shared between them count once.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def make_trade(i):
+    return {
+        "size": round(random.expovariate(1 / 150), 2),
+        "market_title": f"Will outcome {random.randint(0, 500)} happen by December?",
+        "outcome": random.choice(["Yes", "No"]),
+        "price": round(random.random(), 3),
+        "ts_iso": "2026-01-23T18:00:00Z",
+        "name": f"trader{i % 5000}",
+        "pseudonym": f"Pseudo-{i % 5000}",
+        "proxyWallet": f"0x{random.getrandbits(160):040x}",
+        "transactionHash": f"0x{random.getrandbits(256):064x}",
+        "side": random.choice(["buy", "sell"]),
+        "outcomeIndex": 0,
+        "ts": 1769191200 + i,
+    }
+
+
+def write_outputs(data_dir, path, n_trades):
+    from bot import SnapshotWriter
+    from file_cache import MONITOR_FILES
+    from shared_snapshot import SharedSnapshotWriter
+
+    trades = [make_trade(i) for i in range(n_trades)]
+    outputs = {fname: trades for fname in MONITOR_FILES}
+    outputs["bot_status.json"] = {"status": "ok"}
+    SnapshotWriter(data_dir, store=SharedSnapshotWriter(path)).write(outputs)
+    return sum(os.path.getsize(os.path.join(data_dir, f)) for f in outputs)
+
+
+def pss_kb():
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            if line.startswith("Pss:"):
+                return int(line.split()[1])
+    return 0
+
+
+def worker(args):
+    if args.mode == "filecache":
+        from file_cache import FileCache, MONITOR_FILES
+
+        source = FileCache(args.data_dir, MONITOR_FILES)
+        fnames = MONITOR_FILES
+    else:
+        from shared_snapshot import SharedSnapshotReader
+
+        source = SharedSnapshotReader(args.path)
+        fnames = list(source.get_stats()["versions"])
+
+    # Serve every output once in every encoding (FileCache loads in its
+    # watcher thread, so wait for the first load)
+    for fname in fnames:
+        while (encoded := source.get_encoded(fname)) is None:
+            time.sleep(0.05)
+        for body in (encoded.identity, encoded.gzip, encoded.br):
+            if body is not None:
+                hashlib.blake2b(body)
+    sys.stdout.write("PSS " + json.dumps({"pss_kb": pss_kb()}) + "\n")
+    sys.stdout.flush()
+    time.sleep(args.hold)  # stay alive until every worker has measured
+
+
+def read_pss(stdout):
+    # FileCache logs to stdout too
+    for line in stdout:
+        if line.startswith("PSS "):
+            return json.loads(line[4:])["pss_kb"]
+    raise RuntimeError("worker exited without reporting")
+
+
+def run(args, mode, n_workers):
+    cmd = [sys.executable, os.path.abspath(__file__), "--worker", "--mode", mode,
+           "--data-dir", args.data_dir, "--path", args.path,
+           "--hold", str(2 + n_workers)]
+    procs = [subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True) for _ in range(n_workers)]
+    pss = [read_pss(p.stdout) for p in procs]
+    for p in procs:
+        p.terminate()
+        p.wait()
+    return pss
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--trades", type=int, default=20_000, help="trades per output file")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--mode", choices=["filecache", "shared"], help=argparse.SUPPRESS)
+    parser.add_argument("--data-dir", help=argparse.SUPPRESS)
+    parser.add_argument("--path", help=argparse.SUPPRESS)
+    parser.add_argument("--hold", type=float, default=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        args.data_dir = tmp
+        args.path = os.path.join(tmp, "snapshot.bin")
+        total = write_outputs(tmp, args.path, args.trades)
+        body_dir = args.path + ".d"
+        shared = os.path.getsize(args.path) + sum(
+            os.path.getsize(os.path.join(body_dir, f)) for f in os.listdir(body_dir)
+        )
+        print(f"outputs: {total / 1e6:.1f} MB of JSON, shared snapshot {shared / 1e6:.1f} MB")
+        for mode in ("filecache", "shared"):
+            for n in args.workers:
+                pss = run(args, mode, n)
+                print(f"  {mode:<10} workers={n}  total PSS {sum(pss) / 1024:7.1f} MB  "
+                      f"({sum(pss) / 1024 / n:.1f} MB per worker)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Cost of matching new trades against topic subscriptions as the number of
+subscribers grows.
+
+    python bench/bench_topic_fanout.py
+
+Each subscriber follows one market's trades with a random min_notional.
+With the per-market, threshold-sorted GroupIndex the time per published
+batch should track the number of matching subscriptions, not the total.
+"""
+
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from broadcast import ClientQueue, TopicHub  # noqa: E402
+from snapshots import SnapshotStore  # noqa: E402
+
+MARKETS = [f"Will outcome {i} happen by December?" for i in range(1000)]
+
+
+def make_feed(start_seq, n):
+    return {
+        "head": start_seq + n - 1,
+        "trades": [
+            {
+                "seq": start_seq + i,
+                "market_title": random.choice(MARKETS[:50]),  # a few busy markets
+                "size": random.expovariate(1 / 200),
+                "price": random.random(),
+            }
+            for i in range(n)
+        ],
+    }
+
+
+async def run(subscribers, batches=50, batch_size=100):
+    store = SnapshotStore()
+    hub = TopicHub(store, queue_size=10**9)
+    for _ in range(subscribers):
+        client = ClientQueue(hub.queue_size)
+        hub.subscriptions[client] = set()
+        hub._subscribe(
+            client,
+            {
+                "topic": "trades",
+                "market": random.choice(MARKETS),
+                "min_notional": random.choice([0, 100, 1000, 5000]),
+            },
+        )
+
+    seq = 1
+    elapsed = 0.0
+    for _ in range(batches):
+        feed = make_feed(seq, batch_size)
+        seq += batch_size
+        store.publish("trades_feed.json", feed, str(seq), json.dumps(feed).encode())
+        start = time.perf_counter()
+        hub._process("trades_feed.json")
+        elapsed += time.perf_counter() - start
+    per_batch = elapsed / batches * 1000
+    print(
+        f"{subscribers:>8,} subscribers ({len(hub.groups):,} groups) | "
+        f"{per_batch:.3f} ms per {batch_size}-trade batch, "
+        f"{hub.stats_counters['messages'] / batches:,.0f} deliveries per batch"
+    )
+
+
+def main():
+    for n in (1_000, 10_000, 100_000):
+        asyncio.run(run(n))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Compare memory per stored trade: the old 11-key dict layout vs TradeRecord.
+
+    python bench/bench_trade_memory.py --trades 200000
+
+Raw trades go through a JSON round trip first so every trade owns its own
+string objects, like rows decoded from the API.
+"""
+
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import tracemalloc
+from datetime import datetime, UTC
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot import parse_trade  # noqa: E402
+
+
+def parse_trade_as_dict(trade):
+    """The pre-TradeRecord layout: one dict per trade."""
+    ts = int(trade.get("timestamp", 0))
+    return {
+        "size": float(trade.get("size", 0)),
+        "market_title": str(trade.get("title", "")),
+        "outcome": str(trade.get("outcome", "")),
+        "price": float(trade.get("price", 0)),
+        "ts_iso": datetime.fromtimestamp(ts, UTC).isoformat().replace("+00:00", "Z"),
+        "name": str(trade.get("name", "")),
+        "pseudonym": str(trade.get("pseudonym", "")),
+        "proxyWallet": str(trade.get("proxyWallet", "")),
+        "transactionHash": str(trade.get("transactionHash", "")),
+        "side": str(trade.get("side", "")).lower(),
+        "outcomeIndex": trade.get("outcomeIndex", 0),
+    }
+
+
+def raw_trades(n):
+    markets = [f"Will candidate {i} win the 2028 election?" for i in range(300)]
+    traders = [(f"trader-{i}", f"Pseudo-Name-{i}", f"0x{i:040x}") for i in range(5000)]
+    rows = []
+    for i in range(n):
+        name, pseudonym, wallet = random.choice(traders)
+        rows.append(
+            {
+                "timestamp": 1_760_000_000 + i,
+                "size": random.expovariate(1 / 200),
+                "price": random.random(),
+                "title": random.choice(markets),
+                "outcome": random.choice(["Yes", "No"]),
+                "name": name,
+                "pseudonym": pseudonym,
+                "proxyWallet": wallet,
+                "transactionHash": f"0x{i:064x}",
+                "side": random.choice(["BUY", "SELL"]),
+                "outcomeIndex": random.randint(0, 1),
+            }
+        )
+    return json.loads(json.dumps(rows))
+
+
+def measure(parse, n):
+    gc.collect()
+    tracemalloc.start()
+    raw = raw_trades(n)
+    stored = [parse(t) for t in raw]
+    del raw
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del stored
+    return current / n
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--trades", type=int, default=200_000)
+    args = parser.parse_args()
+
+    as_dict = measure(parse_trade_as_dict, args.trades)
+    as_record = measure(parse_trade, args.trades)
+    print(f"dict layout:        {as_dict:8.0f} bytes/trade")
+    print(f"TradeRecord layout: {as_record:8.0f} bytes/trade")
+    print(f"saving:             {1 - as_record / as_dict:8.1%}")
+
+
+if __name__ == "__main__":
+    main()
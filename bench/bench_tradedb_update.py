@@ -0,0 +1,66 @@
+"""
+Grow a TradeDB to millions of trades and report how long update() holds the lock.
+
+    python bench/bench_tradedb_update.py --total 2000000 --batch 100
+
+Lock hold time per batch should stay flat as the DB grows.
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot import TradeDB, parse_trade  # noqa: E402
+
+
+def make_batch(start_ts, start_id, n):
+    return [
+        parse_trade(
+            {
+                "timestamp": start_ts + random.randint(-30, 5),
+                "size": random.expovariate(1 / 200),
+                "price": random.random(),
+                "title": f"Market {random.randint(0, 500)}",
+                "outcome": random.choice(["Yes", "No"]),
+                "name": f"trader{random.randint(0, 20000)}",
+                "proxyWallet": f"0x{random.randint(0, 20000):040x}",
+                "transactionHash": f"0x{start_id + i:064x}",
+                "side": random.choice(["BUY", "SELL"]),
+            }
+        )
+        for i in range(n)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--total", type=int, default=1_000_000)
+    parser.add_argument("--batch", type=int, default=100)
+    parser.add_argument("--report-every", type=int, default=100_000)
+    args = parser.parse_args()
+
+    db = TradeDB()
+    ts = int(time.time()) - args.total // args.batch * 5
+    samples = []
+    inserted = 0
+    while inserted < args.total:
+        db.update(make_batch(ts, inserted, args.batch))
+        samples.append(db.lock_stats["last_ms"])
+        inserted += args.batch
+        ts += 5
+        if inserted % args.report_every == 0:
+            print(
+                f"{inserted:>10,} trades | lock hold per update: "
+                f"median {statistics.median(samples):.3f} ms, "
+                f"max {max(samples):.3f} ms"
+            )
+            samples = []
+
+
+if __name__ == "__main__":
+    main()
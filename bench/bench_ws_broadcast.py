@@ -0,0 +1,226 @@
+"""
+Fan a snapshot out to thousands of WebSocket clients and compare the
+BroadcastHub with the old per-connection polling loop.
+
+    pip install websockets
+    python bench/bench_ws_broadcast.py --mode hub --clients 2000
+    python bench/bench_ws_broadcast.py --mode poll --clients 2000
+
+Starts a one-worker uvicorn server in a subprocess that adds --new-trades
+trades every --interval seconds, connects --clients sockets (--slow of them
+never read), and reports delivery latency and message size for the reading
+clients plus server CPU time per published update. The hub streams sequenced
+deltas; poll mode resends the newest 50 trades on every change.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from collections import deque
+from contextlib import asynccontextmanager
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+FEED_FILE = "trades_feed.json"
+RECENT_FILE = "trades_recent.json"
+
+
+# ---------------- SERVER ----------------
+
+
+def make_trade(seq):
+    return {
+        "seq": seq,
+        "sent_at": time.time(),
+        "size": round(random.expovariate(1 / 150), 2),
+        "market_title": f"Will outcome {random.randint(0, 50)} happen by December?",
+        "outcome": random.choice(["Yes", "No"]),
+        "price": round(random.random(), 3),
+        "ts_iso": "2026-01-23T18:00:00Z",
+        "name": f"trader{seq % 2000}",
+        "pseudonym": f"Pseudo-{seq % 2000}",
+        "proxyWallet": f"0x{random.getrandbits(160):040x}",
+        "transactionHash": f"0x{random.getrandbits(256):064x}",
+        "side": random.choice(["buy", "sell"]),
+        "outcomeIndex": 0,
+        "ts": int(time.time()),
+    }
+
+
+def serve(args):
+    import uvicorn
+    from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+
+    from broadcast import BroadcastHub
+    from snapshots import SnapshotStore
+
+    store = SnapshotStore()
+    hub = BroadcastHub(store, FEED_FILE)
+
+    async def publisher():
+        # Like the bot: a few new trades per cycle, a 500-trade sequenced feed
+        # for the hub and the newest 50 as trades_recent.json for polling
+        seq = 0
+        trades = deque(maxlen=500)
+        while True:
+            await asyncio.sleep(args.interval)
+            for _ in range(args.new_trades):
+                seq += 1
+                trades.append(make_trade(seq))
+            feed = {"head": seq, "trades": list(trades)}
+            recent = list(trades)[-50:]
+            for fname, data in ((FEED_FILE, feed), (RECENT_FILE, recent)):
+                payload = json.dumps(data, separators=(",", ":")).encode()
+                store.publish(fname, data, str(seq), payload)
+
+    @asynccontextmanager
+    async def lifespan(app):
+        task = asyncio.create_task(publisher())
+        yield
+        task.cancel()
+
+    app = FastAPI(lifespan=lifespan)
+
+    @app.get("/cpu")
+    def cpu():
+        return {"cpu": time.process_time(), "hub": hub.stats()}
+
+    if args.mode == "hub":
+
+        @app.websocket("/ws")
+        async def ws_hub(websocket: WebSocket):
+            await hub.serve(websocket)
+
+    else:
+
+        @app.websocket("/ws")
+        async def ws_poll(websocket: WebSocket):
+            # The previous /ws/trades handler: poll and serialize per client
+            await websocket.accept()
+            last_version = None
+            try:
+                while True:
+                    data, version = store.get_versioned(RECENT_FILE)
+                    if version != last_version and data is not None:
+                        await websocket.send_text(store.dumps(data))
+                        last_version = version
+                    await asyncio.sleep(1)
+            except (WebSocketDisconnect, RuntimeError, OSError):
+                pass
+
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning",
+                ws_per_message_deflate=args.deflate)
+
+
+# ---------------- CLIENTS ----------------
+
+
+async def reader(url, latencies, counts, stop):
+    import websockets
+
+    async with websockets.connect(url, max_size=None) as ws:
+        while not stop.is_set():
+            try:
+                msg = await asyncio.wait_for(ws.recv(), 0.5)
+            except asyncio.TimeoutError:
+                continue
+            # sent_at of the newest trade in the message; skip parsing the rest
+            start = msg.rindex('"sent_at":') + 10
+            latencies.append(time.time() - float(msg[start:msg.index(",", start)]))
+            counts[0] += 1
+            counts[1] += len(msg)
+
+
+async def sleeper(url, stop):
+    import websockets
+
+    # Never reads: the socket buffers fill and the server must cope
+    async with websockets.connect(url, max_size=None, max_queue=1):
+        await stop.wait()
+
+
+def server_stats(port):
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/cpu") as r:
+        return json.loads(r.read())
+
+
+async def run_clients(args):
+    url = f"ws://127.0.0.1:{args.port}/ws"
+    stop = asyncio.Event()
+    latencies, counts = [], [0, 0]
+    n_slow = int(args.clients * args.slow)
+    tasks = []
+    for i in range(args.clients):
+        if i < n_slow:
+            tasks.append(asyncio.create_task(sleeper(url, stop)))
+        else:
+            tasks.append(asyncio.create_task(reader(url, latencies, counts, stop)))
+        if i % 100 == 99:
+            await asyncio.sleep(0.05)  # don't overflow the listen backlog
+    await asyncio.sleep(2)  # let everyone connect and get the first message
+    latencies.clear()
+    counts[:] = [0, 0]
+
+    before = server_stats(args.port)
+    await asyncio.sleep(args.duration)
+    after = server_stats(args.port)
+    stop.set()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    updates = args.duration / args.interval
+    readers = args.clients - n_slow
+    cpu_ms = (after["cpu"] - before["cpu"]) * 1000
+    print(f"mode={args.mode} clients={args.clients} (slow {n_slow}) interval={args.interval}s")
+    print(f"  messages received  {counts[0]:,} of ~{int(updates * readers):,} published x readers")
+    print(f"  bytes per message  {counts[1] / max(counts[0], 1):,.0f}")
+    if latencies:
+        latencies.sort()
+        print(
+            f"  delivery latency   p50 {statistics.median(latencies) * 1000:.1f} ms, "
+            f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.1f} ms"
+        )
+    print(f"  server CPU         {cpu_ms / updates:.1f} ms per update")
+    if args.mode == "hub":
+        print(f"  hub                {after['hub']}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mode", choices=["hub", "poll"], default="hub")
+    parser.add_argument("--clients", type=int, default=2000)
+    parser.add_argument("--slow", type=float, default=0.05, help="share of clients that never read")
+    parser.add_argument("--interval", type=float, default=1.0)
+    parser.add_argument("--new-trades", type=int, default=3, help="new trades per update")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--port", type=int, default=8097)
+    parser.add_argument("--deflate", action="store_true", help="per-connection compression")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+        return
+
+    server = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "--serve", "--mode", args.mode,
+         "--interval", str(args.interval), "--port", str(args.port),
+         "--new-trades", str(args.new_trades)]
+        + (["--deflate"] if args.deflate else [])
+    )
+    try:
+        time.sleep(2)
+        asyncio.run(run_clients(args))
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
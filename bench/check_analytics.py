@@ -0,0 +1,144 @@
+"""
+Equivalence check: IncrementalAnalytics (what the bot serves) against the
+batch compute_* reference functions over the same trades.
+
+    python bench/check_analytics.py --trades 50000 --batches 100
+
+Trades arrive like polls: consecutive time slices, each in shuffled order
+(the bot applies a batch in trade time order; trades that arrive a batch
+late, e.g. from a backfill, are outside what the references model).
+Snapshots are taken at the real, unaligned clock and at a few random
+later times, so the time windows are checked at arbitrary edges.
+Exits with status 1 on any mismatch (floats compared with a small tolerance).
+"""
+
+import argparse
+import math
+import os
+import random
+import sys
+import time
+from datetime import datetime, UTC
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot import (  # noqa: E402
+    ORDERFLOW_WINDOWS,
+    TOP_TRADERS_COUNT,
+    IncrementalAnalytics,
+    TradeRecord,
+    WhaleDetector,
+    compute_market_stats,
+    compute_orderflow,
+    compute_top_traders,
+    compute_whales,
+)
+
+
+def make_trades(n, markets, wallets, now_ts, span):
+    trades = []
+    for i in range(n):
+        wallet = int(random.paretovariate(0.8)) % wallets
+        trades.append(TradeRecord(
+            size=round(random.paretovariate(1.2) * 20, 2),
+            market_title=f"Market {int(random.expovariate(0.05)) % markets}",
+            outcome=random.choice(["Yes", "No"]),
+            price=round(random.random(), 3),
+            # whole seconds, many ties, newest exactly at now_ts
+            ts=now_ts - random.randrange(span),
+            name=f"trader{wallet}" if wallet % 3 else "",
+            pseudonym=f"Pseudo-{wallet}",
+            proxyWallet=f"0x{wallet:040x}",
+            transactionHash=f"0x{i:064x}",
+            side=random.choice(["BUY", "SELL", ""]),
+            outcomeIndex=random.randrange(2),
+        ))
+    return trades
+
+
+def same(a, b, path="", errors=None):
+    """Paths where a and b differ (floats within 1e-9 relative / 1e-6 absolute)."""
+    errors = [] if errors is None else errors
+    if isinstance(a, float) or isinstance(b, float):
+        if not (isinstance(a, (int, float)) and isinstance(b, (int, float))
+                and math.isclose(a, b, rel_tol=1e-9, abs_tol=1e-6)):
+            errors.append(f"{path}: {a!r} != {b!r}")
+    elif isinstance(a, dict) and isinstance(b, dict):
+        if a.keys() != b.keys():
+            errors.append(f"{path}: keys {sorted(a.keys() ^ b.keys())[:5]} differ")
+        for k in a.keys() & b.keys():
+            same(a[k], b[k], f"{path}/{k}", errors)
+    elif isinstance(a, list) and isinstance(b, list):
+        if len(a) != len(b):
+            errors.append(f"{path}: {len(a)} vs {len(b)} items")
+        for i, (x, y) in enumerate(zip(a, b)):
+            same(x, y, f"{path}[{i}]", errors)
+    elif a != b:
+        errors.append(f"{path}: {a!r} != {b!r}")
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--trades", type=int, default=50_000)
+    parser.add_argument("--batches", type=int, default=100)
+    parser.add_argument("--markets", type=int, default=200)
+    parser.add_argument("--wallets", type=int, default=5_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--offsets", type=int, default=3, help="extra snapshots, 0-90 s later")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    trades = make_trades(args.trades, args.markets, args.wallets, int(time.time()), 2 * 3600)
+
+    live = IncrementalAnalytics()
+    live.whales = WhaleDetector("fixed")  # the references know no adaptive thresholds
+    ordered = sorted(trades, key=lambda t: t.ts)
+    size = max(1, len(ordered) // args.batches)
+    arrived = []  # arrival order, so the references break equal-ts ties the same way
+    for i in range(0, len(ordered), size):
+        batch = ordered[i:i + size]
+        random.shuffle(batch)
+        live.ingest(batch)
+        arrived.extend(batch)
+    trades = arrived
+
+    print(f"{len(trades):,} trades in {args.batches} shuffled batches, in time order")
+    failed = False
+    # after ingest, so ingest() has dropped no trade a snapshot still covers
+    for offset in sorted([0.0] + [random.uniform(0, 90) for _ in range(args.offsets)]):
+        now = datetime.fromtimestamp(time.time() + offset, UTC)
+        print(f"snapshot at {now.timestamp():.3f} (+{offset:.1f} s)")
+        failed |= check(live.snapshot(now), trades, now)
+    sys.exit(1 if failed else 0)
+
+
+def check(snapshot, trades, now):
+    reference = {
+        "whales": [t.as_dict() for t in compute_whales(trades)],
+        "top_traders": compute_top_traders(trades)[:TOP_TRADERS_COUNT],
+        "market_stats": compute_market_stats(trades, now),
+        **{
+            f"orderflow {name}": compute_orderflow(trades, now, seconds)
+            for name, seconds in ORDERFLOW_WINDOWS.items()
+        },
+    }
+    actual = {
+        "whales": [t.as_dict() for t in snapshot["whales"]],
+        "top_traders": snapshot["top_traders"],
+        "market_stats": snapshot["market_stats"],
+        **{f"orderflow {name}": flow for name, flow in snapshot["orderflow"].items()},
+    }
+
+    failed = False
+    for name, expected in reference.items():
+        errors = same(actual[name], expected, name)
+        failed |= bool(errors)
+        print(f"  {name:<14} {'ok' if not errors else 'MISMATCH'}")
+        for error in errors[:5]:
+            print(f"    {error}")
+    return failed
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Local stand-in for the Polymarket /trades endpoint.
+
+    python bench/fake_trades_api.py --port 8090 --rate 200
+    POLYMARKET_API_URL=http://127.0.0.1:8090/trades python bot.py
+
+Generates --rate synthetic trades per second and serves them newest first
+with limit/offset paging. --error-rate makes a share of requests answer
+429 or 503, to exercise backoff.
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+MARKETS = [f"Will outcome {i} happen by December?" for i in range(50)]
+
+
+class TradeFeed:
+    def __init__(self, rate):
+        self.rate = rate
+        self.trades = []  # oldest first
+        self.lock = threading.Lock()
+        self._next_id = 0
+        self._last = time.time()
+
+    def _generate(self):
+        now = time.time()
+        due = int((now - self._last) * self.rate)
+        if due <= 0:
+            return
+        self._last += due / self.rate
+        for _ in range(due):
+            self._next_id += 1
+            wallet = random.randint(0, 2000)
+            self.trades.append(
+                {
+                    "proxyWallet": f"0x{wallet:040x}",
+                    "side": random.choice(["BUY", "SELL"]),
+                    "size": round(random.expovariate(1 / 150), 2),
+                    "price": round(random.random(), 3),
+                    "timestamp": int(now),
+                    "title": random.choice(MARKETS),
+                    "outcome": random.choice(["Yes", "No"]),
+                    "outcomeIndex": random.randint(0, 1),
+                    "name": f"trader{wallet}",
+                    "pseudonym": f"Pseudo-{wallet}",
+                    "transactionHash": f"0x{self._next_id:064x}",
+                }
+            )
+
+    def page(self, limit, offset):
+        with self.lock:
+            self._generate()
+            end = len(self.trades) - offset
+            start = max(end - limit, 0)
+            return list(reversed(self.trades[start:max(end, 0)]))
+
+
+def make_handler(feed, error_rate):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path != "/trades":
+                return self._send(404, b"{}")
+            if random.random() < error_rate:
+                return self._send(random.choice([429, 503]), b"{}")
+            qs = parse_qs(url.query)
+            limit = int(qs.get("limit", ["100"])[0])
+            offset = int(qs.get("offset", ["0"])[0])
+            body = json.dumps(feed.page(limit, offset)).encode()
+            self._send(200, body)
+
+        def _send(self, status, body):
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--rate", type=float, default=50, help="trades per second")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(
+        ("127.0.0.1", args.port), make_handler(TradeFeed(args.rate), args.error_rate)
+    )
+    print(f"Fake trades API on http://127.0.0.1:{args.port}/trades")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
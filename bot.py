@@ -1,495 +1,2335 @@
-import requests
-import json
-import time
-import threading
-import os
-import tempfile
-from datetime import datetime, timedelta, UTC
-import logging
-import csv
-import io
-import atexit          ### NEW
-import signal         ### NEW
-import sys            ### NEW
-
-# ---------------- CONFIG ----------------
-
-API_URL = "https://data-api.polymarket.com/trades"
-FETCH_INTERVAL = 5  # seconds
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DATA_DIR = os.path.join(BASE_DIR, "data")
-TEMP_DIR = os.path.join(DATA_DIR, "temp")
-os.makedirs(TEMP_DIR, exist_ok=True)
-
-RECENT_TRADES_FILE = "trades_recent.json"
-WHALES_FILE = "whales.json"
-TOP_TRADERS_FILE = "traders_top.json"
-MARKETS_STATS_FILE = "markets_stats.json"
-ORDERFLOW_FILE = "orderflow.json"
-FULL_TRADES_SIZE_FILE = "full_trades_sorted.txt"    # match routers-api expectation
-FULL_TRADES_CHRONO_FILE = "full_trades_chrono.txt"  # match routers-api expectation
-
-### Backup-related config
-BACKUP_DIR = os.path.join(BASE_DIR, "backups")   # where backups are stored
-os.makedirs(BACKUP_DIR, exist_ok=True)
-
-WHALE_THRESHOLD_USD = 999
-RECENT_COUNT = 50
-ORDERFLOW_WINDOW = 60   # seconds
-VOLATILITY_WINDOW = 60  # seconds
-
-# ---------------- LOGGING ----------------
-
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s | %(levelname)s | %(message)s",
-)
-
-# ---------------- ATOMIC SAVE ----------------
-
-
-def atomic_save(data, path, mode="w", is_json=False, encoding="utf-8"):
-    """
-    Atomically save data to a file.
-    On Windows this avoids explicit os.remove() to reduce permission issues.
-    """
-    os.makedirs(os.path.dirname(path), exist_ok=True)
-    newline_arg = "" if not is_json else None
-
-    # temp file goes into your TEMP_DIR under data/
-    temp_fd, temp_path = tempfile.mkstemp(dir=TEMP_DIR)
-
-    try:
-        with os.fdopen(temp_fd, mode, encoding=encoding, newline=newline_arg) as f:
-            if is_json:
-                json.dump(data, f, ensure_ascii=False, indent=2)
-            else:
-                f.write(data)
-
-        # Directly replace; let os.replace handle overwriting
-        os.replace(temp_path, path)
-
-    except Exception as e:
-        logging.error(f"Atomic save error for {path}: {e}")
-        try:
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
-        except Exception:
-            pass
-
-# ---------------- TRADE PARSING ----------------
-
-
-def parse_trade(trade):
-    """Parse & sanitize trade dict from API."""
-    try:
-        ts = int(trade.get("timestamp", 0))
-        parsed = {
-            "size": float(trade.get("size", 0)),
-            "market_title": str(trade.get("title", "")),
-            "outcome": str(trade.get("outcome", "")),
-            "price": float(trade.get("price", 0)),
-            # timezone-aware UTC timestamp
-            "ts_iso": datetime.fromtimestamp(ts, UTC).isoformat().replace("+00:00", "Z"),
-            "name": str(trade.get("name", "")),
-            "pseudonym": str(trade.get("pseudonym", "")),
-            "proxyWallet": str(trade.get("proxyWallet", "")),
-            "transactionHash": str(trade.get("transactionHash", "")),
-            "side": str(trade.get("side", "")).lower(),
-            "outcomeIndex": trade.get("outcomeIndex", 0),
-        }
-    except (KeyError, ValueError, TypeError):
-        return None
-    return parsed
-
-
-# ---------------- IN-MEMORY TRADE DB ----------------
-
-
-class TradeDB:
-    def __init__(self):
-        self.lock = threading.Lock()
-        self.trades_by_hash = {}  # transactionHash -> trade dict
-        self.sorted_trades_chrono = []
-        self.sorted_trades_by_size = []
-
-    def update(self, trades):
-        with self.lock:
-            new_trades = []
-            for t in trades:
-                thash = t["transactionHash"]
-                if thash not in self.trades_by_hash:
-                    self.trades_by_hash[thash] = t
-                    new_trades.append(t)
-
-            # Incremental updates
-            if new_trades:
-                self.sorted_trades_chrono.extend(new_trades)
-                self.sorted_trades_chrono.sort(
-                    key=lambda x: x["ts_iso"], reverse=True
-                )
-
-                self.sorted_trades_by_size.extend(new_trades)
-                self.sorted_trades_by_size.sort(
-                    key=lambda x: x["size"], reverse=True
-                )
-
-            return len(new_trades)
-
-    def get_all(self):
-        with self.lock:
-            return list(self.trades_by_hash.values())
-
-    def get_recent(self, n):
-        with self.lock:
-            return self.sorted_trades_chrono[:n]
-
-    def get_sorted_by_size(self):
-        with self.lock:
-            return self.sorted_trades_by_size
-
-    def get_sorted_chrono(self):
-        with self.lock:
-            return self.sorted_trades_chrono
-
-
-# ---------------- ANALYTICS ----------------
-
-
-def compute_whales(trades):
-    return [t for t in trades if t["size"] * t["price"] > WHALE_THRESHOLD_USD]
-
-
-def compute_top_traders(trades):
-    traders = {}
-    for t in trades:
-        name = t["name"] or t["pseudonym"] or t["proxyWallet"]
-        if name not in traders:
-            traders[name] = {
-                "total_volume": 0,
-                "trade_count": 0,
-                "markets": {},
-                "outcomes": {},
-            }
-
-        traders[name]["total_volume"] += t["size"] * t["price"]
-        traders[name]["trade_count"] += 1
-
-        mkt = t["market_title"]
-        outc = t["outcome"]
-        traders[name]["markets"][mkt] = traders[name]["markets"].get(mkt, 0) + 1
-        traders[name]["outcomes"][outc] = traders[name]["outcomes"].get(outc, 0) + 1
-
-    res = []
-    for nm, aggr in traders.items():
-        top_market = max(aggr["markets"], key=lambda k: aggr["markets"][k])
-        top_outcome = max(aggr["outcomes"], key=lambda k: aggr["outcomes"][k])
-        res.append(
-            {
-                "name": nm,
-                "total_volume": aggr["total_volume"],
-                "trade_count": aggr["trade_count"],
-                "top_market": top_market,
-                "top_outcome": top_outcome,
-            }
-        )
-
-    res.sort(key=lambda x: x["total_volume"], reverse=True)
-    return res
-
-
-def _parse_ts_iso_utc(ts_iso):
-    # ts_iso is like '2026-01-23T18:00:00Z'
-    if ts_iso.endswith("Z"):
-        ts_iso = ts_iso[:-1] + "+00:00"
-    return datetime.fromisoformat(ts_iso)
-
-
-def compute_market_stats(trades):
-    markets = {}
-    trades_by_market = {}
-
-    for t in trades:
-        mkt = t["market_title"]
-        if mkt not in markets:
-            markets[mkt] = {
-                "last_price": t["price"],
-                "total_volume": 0,
-                "buy_count": 0,
-                "sell_count": 0,
-                "whale_count": 0,
-                "volatility_1m": 0,
-                "outcomes": {},
-            }
-            trades_by_market[mkt] = []
-
-        markets[mkt]["last_price"] = t["price"]
-        markets[mkt]["total_volume"] += t["size"] * t["price"]
-
-        # Robust buy/sell inference
-        side_raw = t.get("side", "").lower()
-        if "buy" in side_raw:
-            side = "buy"
-        elif "sell" in side_raw:
-            side = "sell"
-        else:
-            side = "buy" if t.get("outcomeIndex", 0) == 0 else "sell"
-
-        if side == "buy":
-            markets[mkt]["buy_count"] += 1
-        else:
-            markets[mkt]["sell_count"] += 1
-
-        if t["size"] * t["price"] > WHALE_THRESHOLD_USD:
-            markets[mkt]["whale_count"] += 1
-
-        oc = t["outcome"]
-        markets[mkt]["outcomes"][oc] = (
-            markets[mkt]["outcomes"].get(oc, 0) + t["size"] * t["price"]
-        )
-        trades_by_market[mkt].append(t)
-
-    # Volatility
-    now = datetime.now(UTC)
-    one_min_ago = now - timedelta(seconds=VOLATILITY_WINDOW)
-    for mkt, arr in trades_by_market.items():
-        prices = [
-            x["price"]
-            for x in arr
-            if _parse_ts_iso_utc(x["ts_iso"]) >= one_min_ago
-        ]
-        if len(prices) > 1:
-            mean_p = sum(prices) / len(prices)
-            variance = sum((p - mean_p) ** 2 for p in prices) / len(prices)
-            markets[mkt]["volatility_1m"] = variance ** 0.5
-        else:
-            markets[mkt]["volatility_1m"] = 0
-
-    return markets
-
-
-def compute_orderflow(trades):
-    now = datetime.now(UTC)
-    window_start = now - timedelta(seconds=ORDERFLOW_WINDOW)
-
-    markets = {}
-    for t in trades:
-        t_time = _parse_ts_iso_utc(t["ts_iso"])
-        if t_time < window_start:
-            continue
-
-        mkt = t["market_title"]
-        if mkt not in markets:
-            markets[mkt] = {
-                "buy_volume": 0,
-                "sell_volume": 0,
-                "buy_count": 0,
-                "sell_count": 0,
-            }
-
-        side_raw = t.get("side", "").lower()
-        if "buy" in side_raw:
-            side = "buy"
-        elif "sell" in side_raw:
-            side = "sell"
-        else:
-            side = "buy" if t.get("outcomeIndex", 0) == 0 else "sell"
-
-        if side == "buy":
-            markets[mkt]["buy_volume"] += t["size"] * t["price"]
-            markets[mkt]["buy_count"] += 1
-        else:
-            markets[mkt]["sell_volume"] += t["size"] * t["price"]
-            markets[mkt]["sell_count"] += 1
-
-    output = {}
-    for mkt, m in markets.items():
-        imbalance = m["buy_volume"] - m["sell_volume"]
-        total = m["buy_volume"] + m["sell_volume"] or 1
-        momentum_score = (m["buy_count"] - m["sell_count"]) / (
-            (m["buy_count"] + m["sell_count"]) or 1
-        )
-        output[mkt] = {
-            "buy_volume": m["buy_volume"],
-            "sell_volume": m["sell_volume"],
-            "buy_count": m["buy_count"],
-            "sell_count": m["sell_count"],
-            "imbalance": imbalance,
-            "momentum_score": momentum_score,
-        }
-
-    return output
-
-
-# ---------------- CSV HELPER ----------------
-
-
-def trades_to_csv(trades, fields):
-    """Convert sorted trades list to CSV string with header."""
-    output = io.StringIO()
-    # delimiter=';' for German Excel
-    writer = csv.DictWriter(output, fieldnames=fields, delimiter=";")
-    writer.writeheader()
-    writer.writerows(trades)
-    return output.getvalue()
-
-
-# ---------------- BACKUP HELPER ----------------
-
-def backup_data():
-    """
-    Create a timestamped backup of all data files.
-    Called at startup and on clean shutdown.
-    """
-    try:
-        ts = datetime.now(UTC).strftime("%Y%m%dT%H%M%SZ")
-        backup_dir = os.path.join(BACKUP_DIR, ts)
-        os.makedirs(backup_dir, exist_ok=True)
-
-        for fname in [
-            RECENT_TRADES_FILE,
-            WHALES_FILE,
-            TOP_TRADERS_FILE,
-            MARKETS_STATS_FILE,
-            ORDERFLOW_FILE,
-            FULL_TRADES_SIZE_FILE,
-            FULL_TRADES_CHRONO_FILE,
-        ]:
-            src = os.path.join(DATA_DIR, fname)
-            if os.path.exists(src):
-                dst = os.path.join(backup_dir, fname)
-                with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
-                    fdst.write(fsrc.read())
-
-        logging.info(f"Backup created at {backup_dir}")
-    except Exception as e:
-        logging.error(f"Backup failed: {e}")
-
-
-# ---------------- POLYMARKET BOT ----------------
-
-
-class PolymarketBot:
-    def __init__(self):
-        self.db = TradeDB()
-        os.makedirs(DATA_DIR, exist_ok=True)
-
-    def run(self):
-        logging.info("Starting Polymarket local engine (Ctrl+C to exit)...")
-
-        ### Run a backup right after startup
-        backup_data()
-
-        while True:
-            try:
-                self.fetch_and_update()
-                self.compute_and_save()
-            except Exception as e:
-                logging.error(f"Error in main loop: {e}")
-            time.sleep(FETCH_INTERVAL)
-
-    def fetch_and_update(self):
-        try:
-            resp = requests.get(API_URL, timeout=5)
-            if not resp.ok:
-                logging.warning(f"API returned {resp.status_code}")
-                return
-
-            raw_trades = resp.json()
-            parsed_trades = [parse_trade(t) for t in raw_trades if parse_trade(t)]
-            new_trades = self.db.update(parsed_trades)
-            logging.info(
-                f"Fetched {len(parsed_trades)} trades; {new_trades} new trades added."
-            )
-        except requests.RequestException as e:
-            logging.warning(f"Network error: {e}")
-
-    def compute_and_save(self):
-        trades = self.db.get_all()
-        recent = self.db.get_recent(RECENT_COUNT)
-        whales = compute_whales(trades)
-        top_traders = compute_top_traders(trades)
-        market_stats = compute_market_stats(trades)
-        orderflow = compute_orderflow(trades)
-        sorted_by_size = self.db.get_sorted_by_size()
-        sorted_chrono = self.db.get_sorted_chrono()
-
-        fields = [
-            "size",
-            "market_title",
-            "outcome",
-            "price",
-            "ts_iso",
-            "name",
-            "pseudonym",
-            "proxyWallet",
-            "transactionHash",
-            "side",
-            "outcomeIndex",
-        ]
-
-        # JSON files used by your API & WebSocket
-        atomic_save(
-            recent,
-            os.path.join(DATA_DIR, RECENT_TRADES_FILE),
-            is_json=True,
-        )
-        atomic_save(
-            whales,
-            os.path.join(DATA_DIR, WHALES_FILE),
-            is_json=True,
-        )
-        atomic_save(
-            top_traders,
-            os.path.join(DATA_DIR, TOP_TRADERS_FILE),
-            is_json=True,
-        )
-        atomic_save(
-            market_stats,
-            os.path.join(DATA_DIR, MARKETS_STATS_FILE),
-            is_json=True,
-        )
-        atomic_save(
-            orderflow,
-            os.path.join(DATA_DIR, ORDERFLOW_FILE),
-            is_json=True,
-        )
-
-        # Text files used by /api/full/sorted and /api/full/chrono (routers-api.py)
-        atomic_save(
-            trades_to_csv(sorted_by_size, fields),
-            os.path.join(DATA_DIR, FULL_TRADES_SIZE_FILE),
-            is_json=False,
-        )
-        atomic_save(
-            trades_to_csv(sorted_chrono, fields),
-            os.path.join(DATA_DIR, FULL_TRADES_CHRONO_FILE),
-            is_json=False,
-        )
-
-
-# ---------------- SHUTDOWN HANDLING ----------------
-
-def _graceful_shutdown(signum=None, frame=None):
-    """
-    Signal handler + atexit target.
-    Runs backup before exit.
-    """
-    logging.info(f"Received shutdown signal {signum}, creating backup and exiting...")
-    backup_data()
-    # If called from a signal handler, exit explicitly.
-    if signum is not None:
-        sys.exit(0)
-
-# ---------------- ENTRYPOINT ----------------
-
-if __name__ == "__main__":
-    # Register atexit backup (normal interpreter exit)
-    atexit.register(backup_data)
-
-    # Register signal handlers for clean shutdown (Ctrl+C, systemd stop, docker stop)
-    signal.signal(signal.SIGINT, _graceful_shutdown)
-    signal.signal(signal.SIGTERM, _graceful_shutdown)
-
-    bot = PolymarketBot()
-    bot.run()
+import asyncio
+import json
+import time
+import threading
+import os
+import tempfile
+import hashlib
+from datetime import datetime, UTC
+import logging
+import math
+import bisect
+import heapq
+import itertools
+from array import array
+from collections import deque
+from operator import attrgetter, itemgetter
+import atexit          ### NEW
+import signal         ### NEW
+import sys            ### NEW
+
+from trade_log import TradeLog, LOG_DIR, LOG_COLUMNS, TRADE_FIELDS
+from fetcher import TradeFetcher, FetchError, MAX_BACKFILL_PAGES, PAGE_LIMIT
+from scheduler import PollScheduler
+from snapshots import (
+    SHARED,
+    CANDLE_SHARDS,
+    RETENTION_SECONDS,
+    candle_shard_file,
+    candle_shard_name,
+)
+from shared_snapshot import SharedSnapshotWriter
+
+try:
+    import orjson  # optional fast JSON encoder for compact snapshots
+except ImportError:
+    orjson = None
+
+# ---------------- CONFIG ----------------
+
+API_URL = os.environ.get("POLYMARKET_API_URL", "https://data-api.polymarket.com/trades")
+FETCH_INTERVAL = 5  # seconds, base interval of the adaptive poll scheduler
+INGEST_QUEUE_SIZE = 4  # fetched batches waiting for ingest before fetching blocks
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(BASE_DIR, "data")
+TEMP_DIR = os.path.join(DATA_DIR, "temp")
+os.makedirs(TEMP_DIR, exist_ok=True)
+
+RECENT_TRADES_FILE = "trades_recent.json"
+WHALES_FILE = "whales.json"
+TOP_TRADERS_FILE = "traders_top.json"
+MARKETS_STATS_FILE = "markets_stats.json"
+ORDERFLOW_FILE = "orderflow.json"
+LARGEST_TRADES_FILE = "trades_largest.json"
+STATUS_FILE = "bot_status.json"
+FEED_FILE = "trades_feed.json"
+WHALE_ALERTS_FILE = "whale_alerts.json"
+SENTIMENT_FILE = "sentiment.json"
+SENTIMENT_MARKETS_FILE = "sentiment_markets.json"
+
+COMPACT_JSON = True      # no indentation in data/*.json (uses orjson if installed)
+FSYNC_SNAPSHOTS = False  # data/*.json is rebuilt from the trade log (which fsyncs) on restart
+
+### Backup-related config
+BACKUP_DIR = os.path.join(BASE_DIR, "backups")   # where backups are stored
+os.makedirs(BACKUP_DIR, exist_ok=True)
+
+WHALE_THRESHOLD_USD = 999
+### Whale detection: "fixed" flags notional above WHALE_THRESHOLD_USD; "adaptive"
+### flags the top (1 - WHALE_QUANTILE) of each market's notional over the window
+WHALE_MODE = os.environ.get("POLYMARKET_WHALES", "fixed")
+WHALE_QUANTILE = 0.99
+WHALE_QUANTILE_WINDOW = 24 * 3600  # seconds of trades behind a market's threshold
+WHALE_MIN_SAMPLES = 100            # below this many, a market uses WHALE_THRESHOLD_USD
+WHALE_MIN_NOTIONAL = 100           # adaptive thresholds never go below this (USD)
+WHALE_SKETCH_ACCURACY = 0.02       # relative error of the quantile sketch
+WHALE_SKETCH_SLOTS = 24            # the window slides one slot (1 h) at a time
+WHALE_BUFFER = 1000                # most recent whales in whales.json
+WHALE_ALERT_COUNT = 500            # newest sequenced alerts in whale_alerts.json
+RECENT_COUNT = 50
+LARGEST_COUNT = 50       # size of the bounded "largest trades" view
+# Newest sequenced trades kept in trades_feed.json: two cycles with a full
+# backfill (1 + MAX_BACKFILL_PAGES pages each), so a batch never overruns
+# the feed before /ws/trades has seen it
+FEED_COUNT = 2 * (MAX_BACKFILL_PAGES + 1) * PAGE_LIMIT
+TOP_TRADERS_COUNT = 500  # traders in traders_top.json, by volume
+### Trader leaderboard: "exact" keeps every trader's totals, "approx" keeps a
+### fixed number of Space-Saving counters however many wallets show up
+LEADERBOARD_MODE = os.environ.get("POLYMARKET_LEADERBOARD", "exact")
+LEADERBOARD_CAPACITY = 10_000     # traders tracked in approx mode
+LEADERBOARD_DETAIL_SLOTS = 8      # market / outcome counters per trader in approx mode
+ORDERFLOW_WINDOW = 60   # seconds, the window of orderflow.json
+# Orderflow windows served by /api/orderflow?window=, one output file each
+ORDERFLOW_WINDOWS = {"1m": 60, "5m": 300, "15m": 900, "1h": 3600, "24h": 86400}
+ORDERFLOW_FILES = {
+    "1m": ORDERFLOW_FILE,
+    "5m": "orderflow_5m.json",
+    "15m": "orderflow_15m.json",
+    "1h": "orderflow_1h.json",
+    "24h": "orderflow_24h.json",
+}
+# Granularity of the orderflow prefix sums. Trade timestamps are whole
+# seconds, so one-second buckets make every window exact
+ORDERFLOW_BUCKET_SECONDS = 1
+VOLATILITY_WINDOW = 60  # seconds
+# Sentiment timeframes of the dashboard gauge ("all" = every trade ingested)
+SENTIMENT_WINDOWS = {"1h": 3600, "6h": 6 * 3600, "24h": 24 * 3600}
+SENTIMENT_BUCKET_SECONDS = 60
+
+### OHLCV candles per market and outcome: resolution -> (seconds, buckets kept)
+CANDLE_RESOLUTIONS = {
+    "1m": (60, 1440),     # 1 day
+    "5m": (300, 864),     # 3 days
+    "1h": (3600, 720),    # 30 days
+    "1d": (86400, 365),   # 1 year
+}
+# The candles_NNN.json shards (for API processes without the bot) of markets
+# with new trades are rebuilt at most this often; embedded mode reads the
+# live rings instead
+CANDLES_PUBLISH_SECONDS = 15
+CANDLE_ROW_FIELDS = ["ts", "open", "high", "low", "close", "volume", "trade_count"]
+
+### Retention of the in-memory (hot) trade set; the trade log in LOG_DIR keeps everything.
+### Its age limit, RETENTION_SECONDS, lives in snapshots.py (the API uses it too)
+RETENTION_MAX_TRADES = 500_000  # evict oldest beyond this count (None = no cap)
+DEDUP_WINDOW = 48 * 3600        # how long seen transaction hashes are remembered
+DEDUP_BUCKET_SECONDS = 3600     # rotation granularity of the dedup set
+
+# ---------------- LOGGING ----------------
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s | %(levelname)s | %(message)s",
+)
+# httpx logs every request at INFO
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+# ---------------- ATOMIC SAVE ----------------
+
+
+def _json_default(obj):
+    """Serialize TradeRecord rows as plain dicts."""
+    if isinstance(obj, TradeRecord):
+        return obj.as_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def encode_json(data, compact=COMPACT_JSON):
+    """
+    Serialize to UTF-8 JSON bytes.
+    Compact mode drops indentation and uses orjson when it is installed.
+    """
+    if compact and orjson is not None:
+        return orjson.dumps(data, default=_json_default)
+    if compact:
+        text = json.dumps(
+            data, ensure_ascii=False, separators=(",", ":"), default=_json_default
+        )
+    else:
+        text = json.dumps(data, ensure_ascii=False, indent=2, default=_json_default)
+    return text.encode("utf-8")
+
+
+def atomic_save(data, path, is_json=False, encoding="utf-8", fsync=False):
+    """
+    Atomically save data to a file: str, bytes, or any JSON-able object with
+    is_json=True. With fsync=True the data is on disk before the rename.
+    On Windows this avoids explicit os.remove() to reduce permission issues.
+    Returns True if the file was replaced.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if is_json:
+        data = encode_json(data)
+    elif isinstance(data, str):
+        data = data.encode(encoding)
+
+    # temp file goes into your TEMP_DIR under data/
+    temp_fd, temp_path = tempfile.mkstemp(dir=TEMP_DIR)
+
+    try:
+        with os.fdopen(temp_fd, "wb") as f:
+            f.write(data)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+
+        # Directly replace; let os.replace handle overwriting
+        os.replace(temp_path, path)
+        return True
+
+    except Exception as e:
+        logging.error(f"Atomic save error for {path}: {e}")
+        try:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        except Exception:
+            pass
+        return False
+
+
+class SnapshotWriter:
+    """
+    Writes the per-cycle outputs, skipping every output whose serialized
+    content did not change since the last write (blake2b digest per output).
+    Changed outputs go to data_dir (if set) and are published to an
+    in-process SnapshotStore (if set), versioned by their digest.
+    Keeps bytes written / fsyncs per cycle so the savings are visible.
+    """
+
+    def __init__(self, data_dir, store=None, compact=COMPACT_JSON, fsync=FSYNC_SNAPSHOTS):
+        self.data_dir = data_dir
+        self.store = store
+        self.compact = compact
+        self.fsync = fsync
+        self._digests = {}  # fname -> digest of the last written content
+        self.last_cycle = {"written": 0, "skipped": 0, "bytes": 0, "fsyncs": 0}
+        self.totals = {"written": 0, "skipped": 0, "bytes": 0, "fsyncs": 0}
+
+    def write(self, outputs):
+        cycle = {"written": 0, "skipped": 0, "bytes": 0, "fsyncs": 0}
+        for fname, data in outputs.items():
+            payload = encode_json(data, self.compact)
+            digest = hashlib.blake2b(payload, digest_size=16).digest()
+            path = os.path.join(self.data_dir, fname) if self.data_dir else None
+            if self._digests.get(fname) == digest and (
+                path is None or os.path.exists(path)
+            ):
+                cycle["skipped"] += 1
+                continue
+
+            if path is not None:
+                if not atomic_save(payload, path, fsync=self.fsync):
+                    continue
+                cycle["bytes"] += len(payload)
+                cycle["fsyncs"] += int(self.fsync)
+            if self.store is not None:
+                self.store.publish(fname, _plain(data), digest.hex(), payload)
+            self._digests[fname] = digest
+            cycle["written"] += 1
+
+        if cycle["written"] and hasattr(self.store, "commit"):
+            self.store.commit()  # one new shared snapshot generation per cycle
+        self.last_cycle = cycle
+        for k, v in cycle.items():
+            self.totals[k] += v
+        return cycle
+
+
+def _plain(data):
+    """Output value with TradeRecord rows turned into dicts, for in-process readers."""
+    if isinstance(data, list):
+        return [t.as_dict() if isinstance(t, TradeRecord) else t for t in data]
+    return data
+
+
+# ---------------- TRADE PARSING ----------------
+
+def _ts_to_iso(ts):
+    # timezone-aware UTC timestamp like '2026-01-23T18:00:00Z'
+    return datetime.fromtimestamp(ts, UTC).isoformat().replace("+00:00", "Z")
+
+
+class TradeRecord:
+    """
+    Compact trade row stored by TradeDB.
+    Uses __slots__ instead of a per-trade dict, interns the strings that repeat
+    across trades (market, outcome, trader, wallet, side) and derives ts_iso from
+    the epoch on demand. Still readable as t["field"] / t.get("field"), so the
+    analytics work unchanged; as_dict() gives the JSON row.
+    """
+
+    __slots__ = (
+        "size",
+        "market_title",
+        "outcome",
+        "price",
+        "ts",
+        "name",
+        "pseudonym",
+        "proxyWallet",
+        "transactionHash",
+        "side",
+        "outcomeIndex",
+    )
+
+    def __init__(
+        self,
+        size,
+        market_title,
+        outcome,
+        price,
+        ts,
+        name,
+        pseudonym,
+        proxyWallet,
+        transactionHash,
+        side,
+        outcomeIndex,
+    ):
+        intern = sys.intern
+        self.size = size
+        self.market_title = intern(market_title)
+        self.outcome = intern(outcome)
+        self.price = price
+        self.ts = ts
+        self.name = intern(name)
+        self.pseudonym = intern(pseudonym)
+        self.proxyWallet = intern(proxyWallet)
+        self.transactionHash = transactionHash
+        self.side = intern(side)
+        self.outcomeIndex = outcomeIndex
+
+    @property
+    def ts_iso(self):
+        return _ts_to_iso(self.ts)
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def keys(self):
+        return TRADE_FIELDS + ["ts"]
+
+    @classmethod
+    def from_log_row(cls, row):
+        return cls(**dict(zip(LOG_COLUMNS, row)))
+
+    def as_dict(self):
+        row = {f: getattr(self, f) for f in TRADE_FIELDS}
+        row["ts"] = self.ts
+        return row
+
+    def __repr__(self):
+        return f"TradeRecord({self.as_dict()!r})"
+
+
+def parse_trade(trade):
+    """Parse & sanitize trade dict from API."""
+    try:
+        parsed = TradeRecord(
+            size=float(trade.get("size", 0)),
+            market_title=str(trade.get("title", "")),
+            outcome=str(trade.get("outcome", "")),
+            price=float(trade.get("price", 0)),
+            # integer epoch seconds, used for all window / ordering logic
+            ts=int(trade.get("timestamp", 0)),
+            name=str(trade.get("name", "")),
+            pseudonym=str(trade.get("pseudonym", "")),
+            proxyWallet=str(trade.get("proxyWallet", "")),
+            transactionHash=str(trade.get("transactionHash", "")),
+            side=str(trade.get("side", "")).lower(),
+            outcomeIndex=trade.get("outcomeIndex", 0),
+        )
+    except (KeyError, ValueError, TypeError, OverflowError, OSError):
+        return None
+    return parsed
+
+
+# ---------------- ORDERED INDEXES ----------------
+
+
+class SortedIndex:
+    """
+    Trades kept in ascending key order as a list of bounded sorted chunks.
+    Inserting a batch costs O(k * (log n + CHUNK)) instead of re-sorting all
+    n trades; batches newer than everything (the usual case for timestamps)
+    just append to the last chunk.
+    """
+
+    CHUNK = 1024
+
+    def __init__(self, key):
+        self.key = key
+        self._chunks = []  # sorted lists of trades
+        self._keys = []  # matching sorted lists of keys
+        self._maxes = []  # last key of every chunk
+        self._len = 0
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        return itertools.chain.from_iterable(self._chunks)
+
+    def add_batch(self, trades):
+        key = self.key
+        for t in sorted(trades, key=key):
+            self._insert(key(t), t)
+
+    def _insert(self, k, t):
+        if not self._chunks:
+            self._chunks.append([t])
+            self._keys.append([k])
+            self._maxes.append(k)
+            self._len += 1
+            return
+
+        i = bisect.bisect_right(self._maxes, k)
+        if i == len(self._chunks):
+            i -= 1
+        keys, chunk = self._keys[i], self._chunks[i]
+        pos = bisect.bisect_right(keys, k)
+        keys.insert(pos, k)
+        chunk.insert(pos, t)
+        self._maxes[i] = keys[-1]
+        self._len += 1
+
+        if len(keys) > 2 * self.CHUNK:
+            half = len(keys) // 2
+            self._chunks[i:i + 1] = [chunk[:half], chunk[half:]]
+            self._keys[i:i + 1] = [keys[:half], keys[half:]]
+            self._maxes[i:i + 1] = [keys[half - 1], keys[-1]]
+
+    def remove(self, t):
+        """Remove one trade (matched by identity); returns False if absent."""
+        k = self.key(t)
+        i = bisect.bisect_left(self._maxes, k)
+        while i < len(self._chunks):
+            keys, chunk = self._keys[i], self._chunks[i]
+            pos = bisect.bisect_left(keys, k)
+            while pos < len(keys) and keys[pos] == k:
+                if chunk[pos] is t:
+                    del keys[pos]
+                    del chunk[pos]
+                    self._len -= 1
+                    if keys:
+                        self._maxes[i] = keys[-1]
+                    else:
+                        del self._chunks[i], self._keys[i], self._maxes[i]
+                    return True
+                pos += 1
+            if pos < len(keys):
+                break
+            i += 1
+        return False
+
+    def pop_first(self, n):
+        """Remove and return the n trades with the smallest keys."""
+        out = []
+        while n > 0 and self._chunks:
+            chunk, keys = self._chunks[0], self._keys[0]
+            take = min(n, len(chunk))
+            out.extend(chunk[:take])
+            del chunk[:take], keys[:take]
+            if not chunk:
+                del self._chunks[0], self._keys[0], self._maxes[0]
+            n -= take
+        self._len -= len(out)
+        return out
+
+    def pop_below(self, k):
+        """Remove and return all trades with key < k."""
+        n = 0
+        for keys, max_key in zip(self._keys, self._maxes):
+            if max_key < k:
+                n += len(keys)
+            else:
+                n += bisect.bisect_left(keys, k)
+                break
+        return self.pop_first(n)
+
+    def descending(self):
+        """Iterate from the largest key to the smallest."""
+        for chunk in reversed(self._chunks):
+            yield from reversed(chunk)
+
+    def last(self, n):
+        """The n largest trades, largest first."""
+        return list(itertools.islice(self.descending(), n))
+
+
+class TopK:
+    """Bounded min-heap holding the k largest trades by key."""
+
+    def __init__(self, k, key):
+        self.k = k
+        self.key = key
+        self._heap = []  # (key, tiebreak, trade)
+        self._counter = itertools.count()
+
+    def add(self, t):
+        item = (self.key(t), next(self._counter), t)
+        if len(self._heap) < self.k:
+            heapq.heappush(self._heap, item)
+        elif item[0] > self._heap[0][0]:
+            heapq.heapreplace(self._heap, item)
+
+    def items(self):
+        """The held trades, largest first."""
+        return [t for _, _, t in sorted(self._heap, reverse=True)]
+
+    def contains_any(self, trades):
+        held = {id(t) for _, _, t in self._heap}
+        return any(id(t) in held for t in trades)
+
+    def rebuild(self, trades):
+        self._heap = []
+        for t in trades:
+            self.add(t)
+
+
+class RotatingHashSet:
+    """
+    Seen transaction hashes, bucketed by trade timestamp.
+    Whole buckets older than `horizon` seconds are dropped on rotate(), so
+    dedup keeps working after trades are evicted while memory stays bounded.
+    Trades older than the horizon count as already seen.
+    """
+
+    def __init__(self, horizon, bucket_seconds):
+        self.horizon = horizon
+        self.bucket_seconds = bucket_seconds
+        self._buckets = {}  # bucket start ts -> set of hashes
+
+    def __len__(self):
+        return sum(len(b) for b in self._buckets.values())
+
+    def __contains__(self, thash):
+        return any(thash in b for b in self._buckets.values())
+
+    def seen(self, thash, ts, now_ts):
+        if ts < now_ts - self.horizon:
+            return True
+        return thash in self
+
+    def add(self, thash, ts):
+        start = ts - ts % self.bucket_seconds
+        bucket = self._buckets.get(start)
+        if bucket is None:
+            bucket = self._buckets[start] = set()
+        bucket.add(thash)
+
+    def rotate(self, now_ts):
+        cutoff = now_ts - self.horizon - self.bucket_seconds
+        for start in [s for s in self._buckets if s < cutoff]:
+            del self._buckets[start]
+
+
+# ---------------- SECONDARY INDEXES ----------------
+
+
+class EntityIndex:
+    """
+    Hot trades grouped by one field (market title, proxy wallet), each group a
+    ts-sorted list, plus running totals and a volume split by a second
+    `breakdown` field. Kept in step with TradeDB as a consumer, so reading one
+    entity costs O(result) instead of a scan over every trade.
+    """
+
+    def __init__(self, field, breakdown):
+        self.key = attrgetter(field)
+        self.breakdown_key = attrgetter(breakdown)
+        self.groups = {}  # key -> that key's trades, ascending ts
+        # key -> running aggregates; only numbers and strings inside, so
+        # these dicts stay out of the cyclic GC's way
+        self.totals = {}
+        self.breakdown_counts = {}
+        self.breakdown_volumes = {}
+
+    def __len__(self):
+        return len(self.groups)
+
+    def ingest(self, new_trades):
+        ts_key = attrgetter("ts")
+        for t in new_trades:
+            k = self.key(t)
+            group = self.groups.get(k)
+            if group is None:
+                self.groups[k] = [t]
+                self.totals[k] = {
+                    "trade_count": 0,
+                    "total_volume": 0.0,
+                    "buy_volume": 0.0,
+                    "sell_volume": 0.0,
+                }
+                self.breakdown_counts[k] = {}
+                self.breakdown_volumes[k] = {}
+            elif t.ts >= group[-1].ts:
+                group.append(t)
+            else:
+                bisect.insort_right(group, t, key=ts_key)
+            self._count(k, t, 1)
+
+    def evict(self, trades):
+        ts_key = attrgetter("ts")
+        for t in trades:
+            k = self.key(t)
+            group = self.groups.get(k)
+            if group is None:
+                continue
+            # Evicted trades are the oldest, so this is normally index 0
+            i = bisect.bisect_left(group, t.ts, key=ts_key)
+            while i < len(group) and group[i] is not t:
+                i += 1
+            if i == len(group):
+                continue
+            del group[i]
+            if group:
+                self._count(k, t, -1)
+            else:
+                del self.groups[k], self.totals[k]
+                del self.breakdown_counts[k], self.breakdown_volumes[k]
+
+    def _count(self, k, t, sign):
+        notional = sign * t.size * t.price
+        totals = self.totals[k]
+        totals["trade_count"] += sign
+        totals["total_volume"] += notional
+        totals["buy_volume" if _infer_side(t) == "buy" else "sell_volume"] += notional
+        b = self.breakdown_key(t)
+        counts, volumes = self.breakdown_counts[k], self.breakdown_volumes[k]
+        count = counts.get(b, 0) + sign
+        if count > 0:
+            counts[b] = count
+            volumes[b] = volumes.get(b, 0.0) + notional
+        else:
+            counts.pop(b, None)
+            volumes.pop(b, None)
+
+    def summary(self, k, limit):
+        """Aggregates and the newest `limit` trades of one key, or None."""
+        group = self.groups.get(k)
+        if group is None:
+            return None
+        volumes = self.breakdown_volumes[k]
+        return {
+            **self.totals[k],
+            "first_ts": group[0].ts,
+            "last_ts": group[-1].ts,
+            "breakdown": {
+                b: {"trade_count": n, "volume": volumes[b]}
+                for b, n in self.breakdown_counts[k].items()
+            },
+            "recent_trades": [t.as_dict() for t in reversed(group[-limit:])],
+        }
+
+
+# Fields of one candle in CandleRing.values
+_OPEN, _HIGH, _LOW, _CLOSE, _VOLUME, _COUNT, _FIRST_TS, _LAST_TS = range(8)
+_CANDLE_FIELDS = 8
+
+
+class CandleRing:
+    """
+    Fixed-capacity ring of OHLCV buckets at one resolution, ascending by
+    bucket start. Only buckets that saw a trade take a slot, and the oldest
+    is overwritten once full. Backed by flat arrays (no per-bucket objects),
+    so a series costs at most capacity * 72 bytes and is invisible to the GC.
+    """
+
+    __slots__ = ("seconds", "capacity", "head", "n", "starts", "values")
+
+    def __init__(self, seconds, capacity):
+        self.seconds = seconds
+        self.capacity = capacity
+        self.head = 0  # slot of the oldest bucket
+        self.n = 0
+        self.starts = array("q")
+        self.values = array("d")
+
+    def _slot(self, i):
+        return (self.head + i) % self.capacity
+
+    def _find(self, start):
+        """Logical index of the first bucket starting at or after start."""
+        lo, hi = 0, self.n
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.starts[self._slot(mid)] < start:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def add(self, ts, price, notional):
+        start = ts - ts % self.seconds
+        if self.n:
+            last = self._slot(self.n - 1)
+            if start == self.starts[last]:
+                return self._update(last, ts, price, notional)
+            if start < self.starts[last]:
+                return self._add_late(start, ts, price, notional)
+
+        bucket = (price, price, price, price, notional, 1, ts, ts)
+        if self.n < self.capacity:
+            # Still filling: the arrays grow and head stays 0
+            self.starts.append(start)
+            self.values.extend(bucket)
+            self.n += 1
+        else:
+            slot = self.head
+            self.starts[slot] = start
+            self.values[slot * _CANDLE_FIELDS:(slot + 1) * _CANDLE_FIELDS] = array("d", bucket)
+            self.head = (self.head + 1) % self.capacity
+
+    def _update(self, slot, ts, price, notional):
+        v = self.values
+        base = slot * _CANDLE_FIELDS
+        if price > v[base + _HIGH]:
+            v[base + _HIGH] = price
+        if price < v[base + _LOW]:
+            v[base + _LOW] = price
+        # Open and close follow trade time, not arrival order
+        if ts < v[base + _FIRST_TS]:
+            v[base + _OPEN] = price
+            v[base + _FIRST_TS] = ts
+        if ts >= v[base + _LAST_TS]:
+            v[base + _CLOSE] = price
+            v[base + _LAST_TS] = ts
+        v[base + _VOLUME] += notional
+        v[base + _COUNT] += 1
+
+    def _add_late(self, start, ts, price, notional):
+        """A trade older than the newest bucket (rare: late API pages)."""
+        i = self._find(start)
+        if i < self.n and self.starts[self._slot(i)] == start:
+            return self._update(self._slot(i), ts, price, notional)
+        if i == 0 and self.n == self.capacity:
+            return  # older than everything kept
+        # Linearize so the new bucket can be inserted in place; O(capacity)
+        if self.head:
+            cut = self.head * _CANDLE_FIELDS
+            self.starts = self.starts[self.head:] + self.starts[:self.head]
+            self.values = self.values[cut:] + self.values[:cut]
+            self.head = 0
+        self.starts.insert(i, start)
+        at = i * _CANDLE_FIELDS
+        self.values[at:at] = array("d", (price, price, price, price, notional, 1, ts, ts))
+        if self.n == self.capacity:
+            del self.starts[0]
+            del self.values[:_CANDLE_FIELDS]
+        else:
+            self.n += 1
+
+    def last(self, limit, since=None):
+        """Up to `limit` newest buckets (starting at or after since), ascending."""
+        first = max(0, self.n - limit)
+        if since is not None:
+            first = max(first, self._find(since - since % self.seconds))
+        return [dict(zip(CANDLE_ROW_FIELDS, row)) for row in self.rows(first)]
+
+    def copy(self):
+        """Independent copy (two array copies), to read outside the DB lock."""
+        ring = CandleRing(self.seconds, self.capacity)
+        ring.head = self.head
+        ring.n = self.n
+        ring.starts = array("q", self.starts)
+        ring.values = array("d", self.values)
+        return ring
+
+    def rows(self, first=0):
+        """Buckets from logical index first on as CANDLE_ROW_FIELDS lists, ascending."""
+        out = []
+        v = self.values
+        for i in range(first, self.n):
+            slot = self._slot(i)
+            base = slot * _CANDLE_FIELDS
+            out.append([
+                self.starts[slot],
+                v[base + _OPEN],
+                v[base + _HIGH],
+                v[base + _LOW],
+                v[base + _CLOSE],
+                v[base + _VOLUME],
+                int(v[base + _COUNT]),
+            ])
+        return out
+
+
+class CandleIndex:
+    """
+    Rolling OHLCV candles per market and outcome at every resolution in
+    CANDLE_RESOLUTIONS, built incrementally as a TradeDB consumer. Volume is
+    notional (size * price). Candles outlive the hot trade set: evicted
+    trades leave them untouched, and each ring drops its own oldest buckets.
+    """
+
+    def __init__(self, resolutions=CANDLE_RESOLUTIONS):
+        self.resolutions = resolutions
+        self.series = {}  # market -> {outcome -> {res -> CandleRing}}
+        self.changes = 0  # ingest batches so far, to tell when take_dirty() is due
+        self._dirty = set()  # markets with new trades since the last take_dirty()
+
+    def __len__(self):
+        return len(self.series)
+
+    def ingest(self, new_trades):
+        # API pages come newest first; apply in trade time so open/close
+        # need no correction in the common case
+        for t in sorted(new_trades, key=attrgetter("ts")):
+            outcomes = self.series.get(t.market_title)
+            if outcomes is None:
+                outcomes = self.series[t.market_title] = {}
+            rings = outcomes.get(t.outcome)
+            if rings is None:
+                rings = outcomes[t.outcome] = {
+                    res: CandleRing(seconds, capacity)
+                    for res, (seconds, capacity) in self.resolutions.items()
+                }
+            notional = t.size * t.price
+            for ring in rings.values():
+                ring.add(t.ts, t.price, notional)
+            self._dirty.add(t.market_title)
+        if new_trades:
+            self.changes += 1
+
+    def candles(self, market, res, outcome=None, limit=200, since=None):
+        """{outcome: [candle, ...]} for one market, or None if it has no candles."""
+        outcomes = self.series.get(market)
+        if outcomes is None:
+            return None
+        if outcome is not None:
+            outcomes = {outcome: outcomes[outcome]} if outcome in outcomes else {}
+        return {o: rings[res].last(limit, since) for o, rings in outcomes.items()}
+
+    def take_dirty(self):
+        """
+        {market: {outcome: {res: CandleRing copy}}} of the markets with new
+        trades since the last call. Copying is cheap enough for the DB lock;
+        turning the copies into rows and JSON happens outside it.
+        """
+        dirty, self._dirty = self._dirty, set()
+        return {
+            market: {
+                outcome: {res: ring.copy() for res, ring in rings.items()}
+                for outcome, rings in self.series[market].items()
+            }
+            for market in dirty
+        }
+
+
+class CandleShards:
+    """
+    The candle rings as CANDLE_SHARDS files (candles_NNN.json), for API
+    processes without the bot. Keeps every market's rows as of its last
+    update; update() converts only the copied rings of markets that traded
+    and returns the bodies of the shards they fall in, so the other shards
+    are neither rebuilt nor rewritten.
+    """
+
+    def __init__(self, resolutions=CANDLE_RESOLUTIONS):
+        self.header = {
+            "resolutions": {res: seconds for res, (seconds, _) in resolutions.items()},
+            "fields": CANDLE_ROW_FIELDS,
+        }
+        self.shards = {candle_shard_name(i): {} for i in range(CANDLE_SHARDS)}
+        self._published = False
+
+    def update(self, dirty):
+        """{shard file: body} of the shards holding the markets in dirty (take_dirty())."""
+        # the first call publishes every shard, so a missing one means "not yet"
+        changed = set() if self._published else set(self.shards)
+        self._published = True
+        for market, outcomes in dirty.items():
+            fname = candle_shard_file(market)
+            self.shards[fname][market] = {
+                outcome: {res: ring.rows() for res, ring in rings.items()}
+                for outcome, rings in outcomes.items()
+            }
+            changed.add(fname)
+        # shallow copies: later updates replace a market's rows, never mutate them
+        return {
+            fname: {**self.header, "markets": dict(self.shards[fname])}
+            for fname in sorted(changed)
+        }
+
+
+# ---------------- IN-MEMORY TRADE DB ----------------
+
+
+class TradeDB:
+    def __init__(
+        self,
+        retention_seconds=RETENTION_SECONDS,
+        max_trades=RETENTION_MAX_TRADES,
+        trade_log=None,
+    ):
+        self.lock = threading.Lock()
+        self.trades_by_hash = {}  # transactionHash -> TradeRecord (hot trades only)
+        self.chrono_index = SortedIndex(key=attrgetter("ts"))
+        self.size_index = SortedIndex(key=attrgetter("size"))
+        self.largest = TopK(LARGEST_COUNT, key=attrgetter("size"))
+        self.by_market = EntityIndex("market_title", breakdown="outcome")
+        self.by_wallet = EntityIndex("proxyWallet", breakdown="market_title")
+        self.candles = CandleIndex()
+        # fed with the new trades of every update
+        self.consumers = [self.by_market, self.by_wallet, self.candles]
+        # lock hold time of update(), in milliseconds
+        self.lock_stats = {"updates": 0, "last_ms": 0.0, "max_ms": 0.0, "total_ms": 0.0}
+
+        self.retention_seconds = retention_seconds
+        self.max_trades = max_trades
+        self.trade_log = trade_log
+        self.seen = RotatingHashSet(
+            max(DEDUP_WINDOW, retention_seconds or 0), DEDUP_BUCKET_SECONDS
+        )
+        self.evicted_count = 0
+
+    def add_consumer(self, consumer):
+        """
+        Register an object whose ingest(new_trades) is called on every update.
+        If it also has evict(trades), it is told about trades leaving the hot set.
+        """
+        with self.lock:
+            self.consumers.append(consumer)
+
+    def update(self, trades):
+        new_trades = self._apply(trades)
+
+        # Every new trade is logged exactly once, outside the lock
+        if new_trades and self.trade_log is not None:
+            try:
+                self.trade_log.append(new_trades)
+            except OSError as e:
+                logging.error(f"Trade log append failed: {e}")
+        return len(new_trades)
+
+    def restore(self, rows, batch_size=10_000):
+        """Rebuild the hot set from trade log rows without re-logging them."""
+        restored = 0
+        batch = []
+        for row in rows:
+            batch.append(TradeRecord.from_log_row(row))
+            if len(batch) >= batch_size:
+                restored += len(self._apply(batch))
+                batch = []
+        if batch:
+            restored += len(self._apply(batch))
+        return restored
+
+    def _apply(self, trades):
+        now_ts = time.time()
+        with self.lock:
+            start = time.perf_counter()
+            new_trades = []
+            for t in trades:
+                thash = t["transactionHash"]
+                if not self.seen.seen(thash, t["ts"], now_ts):
+                    self.seen.add(thash, t["ts"])
+                    self.trades_by_hash[thash] = t
+                    new_trades.append(t)
+
+            # Incremental updates
+            if new_trades:
+                self.chrono_index.add_batch(new_trades)
+                self.size_index.add_batch(new_trades)
+                for t in new_trades:
+                    self.largest.add(t)
+
+                for consumer in self.consumers:
+                    consumer.ingest(new_trades)
+
+            self._evict(now_ts)
+            self._record_lock_hold(time.perf_counter() - start)
+            return new_trades
+
+    def _evict(self, now_ts):
+        """Drop trades beyond the retention limits from every hot structure.
+        They stay on disk in the trade log."""
+        evicted = []
+        if self.retention_seconds is not None:
+            evicted.extend(self.chrono_index.pop_below(now_ts - self.retention_seconds))
+        if self.max_trades is not None and len(self.chrono_index) > self.max_trades:
+            evicted.extend(
+                self.chrono_index.pop_first(len(self.chrono_index) - self.max_trades)
+            )
+        self.seen.rotate(now_ts)
+        if not evicted:
+            return evicted
+
+        for t in evicted:
+            del self.trades_by_hash[t["transactionHash"]]
+            self.size_index.remove(t)
+        if self.largest.contains_any(evicted):
+            self.largest.rebuild(self.size_index.last(self.largest.k))
+        for consumer in self.consumers:
+            if hasattr(consumer, "evict"):
+                consumer.evict(evicted)
+
+        self.evicted_count += len(evicted)
+        return evicted
+
+    def _record_lock_hold(self, seconds):
+        ms = seconds * 1000
+        stats = self.lock_stats
+        stats["updates"] += 1
+        stats["last_ms"] = ms
+        stats["max_ms"] = max(stats["max_ms"], ms)
+        stats["total_ms"] += ms
+
+    def is_known(self, thash):
+        """True if the transaction hash was seen within the dedup window."""
+        with self.lock:
+            return thash in self.seen
+
+    def get_all(self):
+        with self.lock:
+            return list(self.trades_by_hash.values())
+
+    def get_recent(self, n):
+        with self.lock:
+            return self.chrono_index.last(n)
+
+    def get_largest(self):
+        with self.lock:
+            return self.largest.items()
+
+    def get_market(self, market, limit=RECENT_COUNT):
+        """One market's aggregates and newest trades (None if not in the hot set)."""
+        with self.lock:
+            return self.by_market.summary(market, limit)
+
+    def get_wallet(self, wallet, limit=RECENT_COUNT):
+        """One proxy wallet's aggregates and newest trades (None if not in the hot set)."""
+        with self.lock:
+            summary = self.by_wallet.summary(wallet, limit)
+            if summary is not None:
+                latest = summary["recent_trades"][0]
+                summary["name"] = latest["name"]
+                summary["pseudonym"] = latest["pseudonym"]
+            return summary
+
+    def get_candles(self, market, res, outcome=None, limit=200, since=None):
+        """One market's candles at resolution res, per outcome (None if unknown)."""
+        with self.lock:
+            return self.candles.candles(market, res, outcome, limit, since)
+
+    def take_dirty_candles(self):
+        """(change count, copies of the candle rings of markets that traded since the last call)."""
+        with self.lock:
+            return self.candles.changes, self.candles.take_dirty()
+
+
+# ---------------- ANALYTICS ----------------
+
+
+def _infer_side(t):
+    """Robust buy/sell inference shared by all analytics."""
+    side_raw = t.get("side", "").lower()
+    if "buy" in side_raw:
+        return "buy"
+    if "sell" in side_raw:
+        return "sell"
+    return "buy" if t.get("outcomeIndex", 0) == 0 else "sell"
+
+
+def _volatility(prices):
+    """Population standard deviation of a price list (0 for fewer than 2 prices)."""
+    if len(prices) > 1:
+        mean_p = sum(prices) / len(prices)
+        variance = sum((p - mean_p) ** 2 for p in prices) / len(prices)
+        return variance ** 0.5
+    return 0
+
+
+# The compute_* functions are the batch reference for IncrementalAnalytics.
+# Like it, they take trades in timestamp order (stable for equal ts), so
+# last_price is the latest trade's price and top_market / top_outcome ties
+# go to the key seen first in time, whatever the order of the API pages.
+# bench/check_analytics.py compares the two.
+
+
+def compute_whales(trades):
+    """Newest WHALE_BUFFER trades above WHALE_THRESHOLD_USD, ascending ts (fixed mode)."""
+    whales = [
+        t for t in sorted(trades, key=itemgetter("ts"))
+        if t["size"] * t["price"] > WHALE_THRESHOLD_USD
+    ]
+    return whales[-WHALE_BUFFER:]
+
+
+def compute_top_traders(trades):
+    traders = {}
+    for t in sorted(trades, key=itemgetter("ts")):
+        name = t["name"] or t["pseudonym"] or t["proxyWallet"]
+        if name not in traders:
+            traders[name] = {
+                "total_volume": 0,
+                "trade_count": 0,
+                "markets": {},
+                "outcomes": {},
+            }
+
+        traders[name]["total_volume"] += t["size"] * t["price"]
+        traders[name]["trade_count"] += 1
+
+        mkt = t["market_title"]
+        outc = t["outcome"]
+        traders[name]["markets"][mkt] = traders[name]["markets"].get(mkt, 0) + 1
+        traders[name]["outcomes"][outc] = traders[name]["outcomes"].get(outc, 0) + 1
+
+    res = []
+    for nm, aggr in traders.items():
+        top_market = max(aggr["markets"], key=lambda k: aggr["markets"][k])
+        top_outcome = max(aggr["outcomes"], key=lambda k: aggr["outcomes"][k])
+        res.append(
+            {
+                "name": nm,
+                "total_volume": aggr["total_volume"],
+                "trade_count": aggr["trade_count"],
+                "top_market": top_market,
+                "top_outcome": top_outcome,
+            }
+        )
+
+    res.sort(key=lambda x: x["total_volume"], reverse=True)
+    return res
+
+
+def compute_market_stats(trades, now=None):
+    markets = {}
+    trades_by_market = {}
+
+    for t in sorted(trades, key=itemgetter("ts")):
+        mkt = t["market_title"]
+        if mkt not in markets:
+            markets[mkt] = {
+                "last_price": t["price"],
+                "total_volume": 0,
+                "buy_count": 0,
+                "sell_count": 0,
+                "whale_count": 0,
+                "volatility_1m": 0,
+                "outcomes": {},
+            }
+            trades_by_market[mkt] = []
+
+        markets[mkt]["last_price"] = t["price"]
+        markets[mkt]["total_volume"] += t["size"] * t["price"]
+
+        if _infer_side(t) == "buy":
+            markets[mkt]["buy_count"] += 1
+        else:
+            markets[mkt]["sell_count"] += 1
+
+        if t["size"] * t["price"] > WHALE_THRESHOLD_USD:
+            markets[mkt]["whale_count"] += 1
+
+        oc = t["outcome"]
+        markets[mkt]["outcomes"][oc] = (
+            markets[mkt]["outcomes"].get(oc, 0) + t["size"] * t["price"]
+        )
+        trades_by_market[mkt].append(t)
+
+    # Volatility
+    now = now or datetime.now(UTC)
+    one_min_ago = now.timestamp() - VOLATILITY_WINDOW
+    for mkt, arr in trades_by_market.items():
+        prices = [x["price"] for x in arr if x["ts"] >= one_min_ago]
+        markets[mkt]["volatility_1m"] = _volatility(prices)
+
+    return markets
+
+
+def compute_orderflow(trades, now=None, seconds=ORDERFLOW_WINDOW):
+    now = now or datetime.now(UTC)
+    window_start = now.timestamp() - seconds
+
+    markets = {}
+    for t in trades:
+        if t["ts"] < window_start:
+            continue
+
+        mkt = t["market_title"]
+        if mkt not in markets:
+            markets[mkt] = {
+                "buy_volume": 0,
+                "sell_volume": 0,
+                "buy_count": 0,
+                "sell_count": 0,
+            }
+
+        if _infer_side(t) == "buy":
+            markets[mkt]["buy_volume"] += t["size"] * t["price"]
+            markets[mkt]["buy_count"] += 1
+        else:
+            markets[mkt]["sell_volume"] += t["size"] * t["price"]
+            markets[mkt]["sell_count"] += 1
+
+    return {
+        mkt: _orderflow_entry(
+            m["buy_volume"], m["sell_volume"], m["buy_count"], m["sell_count"]
+        )
+        for mkt, m in markets.items()
+    }
+
+
+def _orderflow_entry(buy_volume, sell_volume, buy_count, sell_count):
+    momentum_score = (buy_count - sell_count) / ((buy_count + sell_count) or 1)
+    return {
+        "buy_volume": buy_volume,
+        "sell_volume": sell_volume,
+        "buy_count": buy_count,
+        "sell_count": sell_count,
+        "imbalance": buy_volume - sell_volume,
+        "momentum_score": momentum_score,
+    }
+
+
+# ---------------- SLIDING WINDOWS ----------------
+
+
+class SlidingWindow:
+    """
+    Time-ordered trade prices of one market over the last `seconds` seconds.
+    Keeps a Welford mean/variance of the price, so adding or evicting a
+    trade is O(1) amortized. Orderflow lives in FlowBuckets.
+    """
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.items = deque()  # (ts, price), ascending ts
+        self._reset()
+
+    def _reset(self):
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def __len__(self):
+        return len(self.items)
+
+    def add(self, ts, price):
+        item = (ts, price)
+        if not self.items or ts >= self.items[-1][0]:
+            self.items.append(item)
+        else:
+            # late trade from a previous page; usually lands close to the tail
+            bisect.insort(self.items, item)
+
+        n = len(self.items)
+        delta = price - self.mean
+        self.mean += delta / n
+        self.m2 += delta * (price - self.mean)
+
+    def evict(self, now_ts):
+        """Drop everything older than now_ts - seconds."""
+        cutoff = now_ts - self.seconds
+        items = self.items
+        while items and items[0][0] < cutoff:
+            _, price = items.popleft()
+            if not items:
+                # start from exact zeros again instead of carrying float drift
+                self._reset()
+                break
+
+            n = len(items)
+            delta = price - self.mean
+            self.mean -= delta / n
+            self.m2 -= delta * (price - self.mean)
+
+    def volatility(self):
+        """Population standard deviation of prices in the window."""
+        n = len(self.items)
+        if n > 1:
+            return max(self.m2 / n, 0.0) ** 0.5
+        return 0
+
+
+class FlowBuckets:
+    """
+    One market's orderflow as prefix sums: for every time bucket that saw a
+    trade, the cumulative buy/sell volume and counts up to its end. The flow
+    of any window is the running total minus the prefix before the window's
+    first bucket, so each extra window costs one bisect, not another scan.
+    """
+
+    __slots__ = ("bucket_seconds", "starts", "cums", "base")
+
+    def __init__(self, bucket_seconds=ORDERFLOW_BUCKET_SECONDS):
+        self.bucket_seconds = bucket_seconds
+        self.starts = array("q")  # bucket starts, ascending
+        # 4 per bucket: buy_volume, sell_volume, buy_count, sell_count
+        self.cums = array("d")
+        self.base = array("d", bytes(32))  # prefix before the oldest kept bucket
+
+    def __len__(self):
+        return len(self.starts)
+
+    def _prefix(self, i):
+        """Cumulative sums before bucket i."""
+        return self.cums[(i - 1) * 4:i * 4] if i else self.base
+
+    def add(self, ts, notional, is_buy):
+        start = ts - ts % self.bucket_seconds
+        starts = self.starts
+        if starts and start <= starts[-1]:
+            i = bisect.bisect_left(starts, start)
+            if starts[i] != start:
+                # late trade opening a bucket in the past
+                starts.insert(i, start)
+                self.cums[i * 4:i * 4] = self._prefix(i)
+        else:
+            i = len(starts)
+            starts.append(start)
+            self.cums.extend(self._prefix(i))
+
+        # this bucket's prefix and every later one; normally just the last
+        vol, count = (0, 2) if is_buy else (1, 3)
+        cums = self.cums
+        for base in range(i * 4, len(cums), 4):
+            cums[base + vol] += notional
+            cums[base + count] += 1
+
+    def window(self, since_ts):
+        """
+        (buy_volume, sell_volume, buy_count, sell_count) from since_ts on.
+        Exact with one-second buckets; coarser ones also count the trades of
+        the bucket since_ts falls in.
+        """
+        starts, cums = self.starts, self.cums
+        first = math.ceil(since_ts)  # trade timestamps are whole seconds
+        first -= first % self.bucket_seconds
+        if not starts or starts[-1] < first:
+            return 0.0, 0.0, 0, 0  # quiet market: skip the bisect
+        i = bisect.bisect_left(starts, first)
+        end = len(cums) - 4
+        if i:
+            before, b = cums, (i - 1) * 4
+        else:
+            before, b = self.base, 0
+        return (
+            cums[end] - before[b],
+            cums[end + 1] - before[b + 1],
+            cums[end + 2] - before[b + 2],
+            cums[end + 3] - before[b + 3],
+        )
+
+    def evict(self, cutoff_ts):
+        """Drop buckets that end before cutoff_ts."""
+        i = bisect.bisect_left(self.starts, cutoff_ts - cutoff_ts % self.bucket_seconds)
+        if i == 0:
+            return
+        if i == len(self.starts):
+            # start from exact zeros again instead of carrying float drift
+            self.base = array("d", bytes(32))
+        else:
+            self.base = self.cums[(i - 1) * 4:i * 4]
+        del self.starts[:i]
+        del self.cums[:i * 4]
+
+
+# ---------------- SENTIMENT ----------------
+
+
+def _sentiment_class(t):
+    """
+    "bullish" for BUY Yes / SELL No, "bearish" for BUY No / SELL Yes, None for
+    other outcomes or sides; the classification of Dashboard/src/lib/sentiment.ts.
+    Unlike _infer_side there is no outcomeIndex fallback: a trade without an
+    exact BUY/SELL side is not counted, as in the client.
+    """
+    outcome = (t["outcome"] or "").upper()
+    side = (t.get("side") or "").upper()
+    if outcome not in ("YES", "NO") or side not in ("BUY", "SELL"):
+        return None
+    return "bullish" if (side == "BUY") == (outcome == "YES") else "bearish"
+
+
+def _sentiment_entry(bullish_volume, bearish_volume, bullish_count, bearish_count):
+    """Counts plus the percentages and 0-100 score the dashboard gauge shows."""
+    total = bullish_count + bearish_count
+    bullish_percent = bullish_count / total * 100 if total else 0
+    bearish_percent = bearish_count / total * 100 if total else 0
+    return {
+        "bullish_count": bullish_count,
+        "bearish_count": bearish_count,
+        "bullish_volume": bullish_volume,
+        "bearish_volume": bearish_volume,
+        "total_analyzed": total,
+        "bullish_percent": round(bullish_percent, 1),
+        "bearish_percent": round(bearish_percent, 1),
+        "sentiment_score": round(bullish_percent) if total else 50,  # neutral without data
+    }
+
+
+class SentimentAggregates:
+    """
+    Bullish/bearish volume and counts per market and over all markets, for
+    every SENTIMENT_WINDOWS timeframe and all time. Windows come from
+    FlowBuckets prefix sums (bullish in the "buy" columns, bearish in the
+    "sell" ones) at SENTIMENT_BUCKET_SECONDS; all time is a running total
+    of the trades seen once `live`, i.e. since the bot started (trades
+    restored from the log still fill the windows).
+    """
+
+    def __init__(self):
+        self.horizon = max(SENTIMENT_WINDOWS.values())
+        self.flows = {}  # market_title -> FlowBuckets
+        self.overall = FlowBuckets(SENTIMENT_BUCKET_SECONDS)
+        # market_title -> [bullish_volume, bearish_volume, bullish_count, bearish_count]
+        self.totals = {}
+        self.overall_totals = [0.0, 0.0, 0, 0]
+        self.live = False
+
+    def add(self, t, notional, now_ts):
+        kind = _sentiment_class(t)
+        if kind is None:
+            return
+        bullish = kind == "bullish"
+        mkt = t["market_title"]
+        if self.live:
+            totals = self.totals.get(mkt)
+            if totals is None:
+                totals = self.totals[mkt] = [0.0, 0.0, 0, 0]
+            vol, count = (0, 2) if bullish else (1, 3)
+            for acc in (totals, self.overall_totals):
+                acc[vol] += notional
+                acc[count] += 1
+
+        if t["ts"] < now_ts - self.horizon:
+            return  # already outside every window
+        flow = self.flows.get(mkt)
+        if flow is None:
+            flow = self.flows[mkt] = FlowBuckets(SENTIMENT_BUCKET_SECONDS)
+        flow.add(t["ts"], notional, bullish)
+        self.overall.add(t["ts"], notional, bullish)
+
+    def evict(self, now_ts):
+        cutoff = now_ts - self.horizon
+        self.overall.evict(cutoff)
+        for mkt in list(self.flows):
+            self.flows[mkt].evict(cutoff)
+            if not self.flows[mkt]:
+                del self.flows[mkt]
+
+    def compute(self, now_ts):
+        """
+        ({timeframe: overall entry}, {timeframe: {market: entry}}); markets
+        without bullish or bearish trades in a timeframe are left out.
+        """
+        overall, by_market = {}, {}
+        for name, seconds in SENTIMENT_WINDOWS.items():
+            since = now_ts - seconds
+            bv, sv, bc, sc = self.overall.window(since)
+            overall[name] = _sentiment_entry(bv, sv, int(bc), int(sc))
+            entries = by_market[name] = {}
+            for mkt, flow in self.flows.items():
+                bv, sv, bc, sc = flow.window(since)
+                if bc or sc:
+                    entries[mkt] = _sentiment_entry(bv, sv, int(bc), int(sc))
+        overall["all"] = _sentiment_entry(*self.overall_totals)
+        by_market["all"] = {mkt: _sentiment_entry(*acc) for mkt, acc in self.totals.items()}
+        return overall, by_market
+
+
+# ---------------- INCREMENTAL ANALYTICS ----------------
+
+
+def _bump_top(counts, key, top):
+    """
+    Increment counts[key] and return the key max() would pick afterwards.
+    counts maps key -> [count, insertion_rank]; ties go to the first inserted key,
+    exactly like max() over a dict.
+    """
+    entry = counts.get(key)
+    if entry is None:
+        entry = counts[key] = [0, len(counts)]
+    entry[0] += 1
+    if top is None:
+        return key
+    best = counts[top]
+    if entry[0] > best[0] or (entry[0] == best[0] and entry[1] < best[1]):
+        return key
+    return top
+
+
+# ---------------- TRADER LEADERBOARD ----------------
+
+
+class TopScores:
+    """
+    The k keys with the highest score, for scores that only grow (running
+    volumes). One min-heap entry per member, refreshed lazily: raising a
+    score is a dict write, and an outdated entry is only re-sifted when it
+    reaches the top.
+    """
+
+    def __init__(self, k):
+        self.k = k
+        self.scores = {}  # member -> current score
+        self._heap = []  # (score, key), one per member, score possibly outdated
+
+    def __len__(self):
+        return len(self.scores)
+
+    def _min(self):
+        heap, scores = self._heap, self.scores
+        while heap[0][0] != scores[heap[0][1]]:
+            key = heap[0][1]
+            heapq.heapreplace(heap, (scores[key], key))
+        return heap[0]
+
+    def update(self, key, score):
+        if key in self.scores:
+            self.scores[key] = score
+            return
+        if len(self.scores) >= self.k:
+            lowest, lowest_key = self._min()
+            if score <= lowest:
+                return
+            heapq.heapreplace(self._heap, (score, key))
+            del self.scores[lowest_key]
+        else:
+            heapq.heappush(self._heap, (score, key))
+        self.scores[key] = score
+
+    def ranked(self):
+        """Members, highest score first."""
+        return sorted(self.scores, key=self.scores.get, reverse=True)
+
+
+class SpaceSaving:
+    """
+    Space-Saving heavy hitters over weighted keys in at most `capacity`
+    counters. A new key takes over the smallest counter and inherits its
+    count as error, so every estimate overshoots the true weight by at most
+    its error, and any key heavier than total / capacity is tracked.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+        self.total = 0.0
+        self._heap = []  # (count, key), one per counter, count possibly outdated
+
+    def __len__(self):
+        return len(self.counts)
+
+    def _min(self):
+        heap, counts = self._heap, self.counts
+        while heap[0][0] != counts[heap[0][1]]:
+            key = heap[0][1]
+            heapq.heapreplace(heap, (counts[key], key))
+        return heap[0]
+
+    def add(self, key, weight):
+        """Count weight for key; returns the key whose counter it took, if any."""
+        self.total += weight
+        count = self.counts.get(key)
+        if count is not None:
+            self.counts[key] = count + weight
+            return None
+
+        evicted = None
+        if len(self.counts) < self.capacity:
+            count = weight
+            self.errors[key] = 0.0
+            heapq.heappush(self._heap, (count, key))
+        else:
+            smallest, evicted = self._min()
+            del self.counts[evicted], self.errors[evicted]
+            count = smallest + weight
+            self.errors[key] = smallest
+            heapq.heapreplace(self._heap, (count, key))
+        self.counts[key] = count
+        return evicted
+
+    def min_count(self):
+        """Upper bound on the weight of any key not tracked, and on any error."""
+        if len(self.counts) < self.capacity:
+            return 0.0
+        return self._min()[0]
+
+    def top(self, n):
+        """(key, estimate, error) of the n largest counters."""
+        best = heapq.nlargest(n, self.counts.items(), key=itemgetter(1))
+        return [(k, c, self.errors[k]) for k, c in best]
+
+
+def _bump_slots(counts, key, slots):
+    """
+    counts[key] += 1 in a dict of at most `slots` keys, Space-Saving style:
+    a new key replaces the smallest one and starts from its count.
+    """
+    if key in counts or len(counts) < slots:
+        counts[key] = counts.get(key, 0) + 1
+        return
+    smallest = min(counts, key=counts.get)
+    counts[key] = counts.pop(smallest) + 1
+
+
+class TraderLeaderboard:
+    """
+    Exact running totals for every trader ever seen, with top_market and
+    top_outcome maintained per trade and the top-k by volume kept in a heap,
+    so a cycle costs O(k log k) instead of sorting every trader.
+    """
+
+    mode = "exact"
+
+    def __init__(self, k=TOP_TRADERS_COUNT):
+        self.traders = {}  # name -> running aggregate
+        self.top = TopScores(k)
+
+    def add(self, name, t, notional):
+        aggr = self.traders.get(name)
+        if aggr is None:
+            aggr = self.traders[name] = {
+                "total_volume": 0,
+                "trade_count": 0,
+                "markets": {},
+                "outcomes": {},
+                "top_market": None,
+                "top_outcome": None,
+            }
+        aggr["total_volume"] += notional
+        aggr["trade_count"] += 1
+        aggr["top_market"] = _bump_top(aggr["markets"], t["market_title"], aggr["top_market"])
+        aggr["top_outcome"] = _bump_top(aggr["outcomes"], t["outcome"], aggr["top_outcome"])
+        self.top.update(name, aggr["total_volume"])
+
+    def rows(self):
+        res = []
+        for nm in self.top.ranked():
+            aggr = self.traders[nm]
+            res.append({
+                "name": nm,
+                "total_volume": aggr["total_volume"],
+                "trade_count": aggr["trade_count"],
+                "top_market": aggr["top_market"],
+                "top_outcome": aggr["top_outcome"],
+            })
+        return res
+
+    def stats(self):
+        return {"mode": self.mode, "tracked": len(self.traders)}
+
+
+class ApproxTraderLeaderboard:
+    """
+    Fixed-memory leaderboard: Space-Saving over trader volume, and per
+    tracked trader a few Space-Saving slots for markets and outcomes.
+    total_volume may overshoot by volume_error; trade_count only counts
+    since the trader last took a counter.
+    """
+
+    mode = "approx"
+
+    def __init__(self, k=TOP_TRADERS_COUNT, capacity=LEADERBOARD_CAPACITY,
+                 slots=LEADERBOARD_DETAIL_SLOTS):
+        self.k = k
+        self.slots = slots
+        self.volumes = SpaceSaving(max(capacity, k))
+        self.details = {}  # name -> [trade_count, markets, outcomes]
+
+    def add(self, name, t, notional):
+        evicted = self.volumes.add(name, notional)
+        if evicted is not None:
+            del self.details[evicted]
+        detail = self.details.get(name)
+        if detail is None:
+            detail = self.details[name] = [0, {}, {}]
+        detail[0] += 1
+        _bump_slots(detail[1], t["market_title"], self.slots)
+        _bump_slots(detail[2], t["outcome"], self.slots)
+
+    def rows(self):
+        res = []
+        for nm, volume, error in self.volumes.top(self.k):
+            trade_count, markets, outcomes = self.details[nm]
+            res.append({
+                "name": nm,
+                "total_volume": volume,
+                "trade_count": trade_count,
+                "top_market": max(markets, key=markets.get),
+                "top_outcome": max(outcomes, key=outcomes.get),
+                "volume_error": error,
+            })
+        return res
+
+    def stats(self):
+        return {
+            "mode": self.mode,
+            "tracked": len(self.volumes),
+            "capacity": self.volumes.capacity,
+            # no untracked trader has more volume than this, and no
+            # total_volume overshoots by more
+            "error_bound": self.volumes.min_count(),
+        }
+
+
+def make_leaderboard(mode=LEADERBOARD_MODE):
+    if mode == "approx":
+        return ApproxTraderLeaderboard()
+    return TraderLeaderboard()
+
+
+# ---------------- WHALE DETECTION ----------------
+
+_SKETCH_GAMMA = (1 + WHALE_SKETCH_ACCURACY) / (1 - WHALE_SKETCH_ACCURACY)
+_SKETCH_LOG_GAMMA = math.log(_SKETCH_GAMMA)
+
+
+class QuantileSketch:
+    """
+    Sliding-window quantiles of positive values within WHALE_SKETCH_ACCURACY
+    relative error: log-spaced bins (as in DDSketch) counted per time slot,
+    so the window slides by dropping whole slots. Memory grows with the
+    number of distinct bins in use, not with the number of values.
+    """
+
+    __slots__ = ("window", "slot_seconds", "slots", "counts", "n")
+
+    def __init__(self, window=WHALE_QUANTILE_WINDOW, n_slots=WHALE_SKETCH_SLOTS):
+        self.window = window
+        self.slot_seconds = max(1, window // n_slots)
+        self.slots = deque()  # (slot number, {bin: count}), ascending
+        self.counts = {}  # bin -> count over all slots
+        self.n = 0
+
+    def add(self, value, ts):
+        if value <= 0:
+            return
+        b = math.ceil(math.log(value) / _SKETCH_LOG_GAMMA)
+        slot = int(ts) // self.slot_seconds
+        slots = self.slots
+        if not slots or slot > slots[-1][0]:
+            slots.append((slot, {}))
+            bins = slots[-1][1]
+        else:
+            # late value: the newest slot not after it (or the oldest one)
+            bins = slots[0][1]
+            for number, slot_bins in reversed(slots):
+                if number <= slot:
+                    bins = slot_bins
+                    break
+        bins[b] = bins.get(b, 0) + 1
+        self.counts[b] = self.counts.get(b, 0) + 1
+        self.n += 1
+
+    def expire(self, now_ts):
+        oldest = int(now_ts - self.window) // self.slot_seconds
+        slots, counts = self.slots, self.counts
+        while slots and slots[0][0] < oldest:
+            for b, c in slots.popleft()[1].items():
+                left = counts[b] - c
+                if left:
+                    counts[b] = left
+                else:
+                    del counts[b]
+                self.n -= c
+
+    def quantile(self, q):
+        """Value below which a fraction q of the window falls (None if empty)."""
+        if not self.n:
+            return None
+        rank = q * (self.n - 1)
+        seen = 0
+        for b in sorted(self.counts):
+            seen += self.counts[b]
+            if seen > rank:
+                return 2 * _SKETCH_GAMMA ** b / (_SKETCH_GAMMA + 1)
+        return None
+
+
+class WhaleDetector:
+    """
+    Classifies every new trade once, on ingest. Whales go into a bounded
+    most-recent buffer (whales.json) and, once `live`, into a sequenced alert
+    feed (whale_alerts.json) shaped like trades_feed.json, so /ws/whales and
+    the WS whales topic stream it like the trade feed.
+    In adaptive mode each market's threshold is its WHALE_QUANTILE notional
+    over WHALE_QUANTILE_WINDOW, refreshed every cycle for markets with new
+    trades and every slot for all of them.
+    """
+
+    def __init__(self, mode=WHALE_MODE):
+        self.mode = mode
+        self.sketches = {}  # market_title -> QuantileSketch (adaptive mode)
+        self.thresholds = {}  # market_title -> current adaptive threshold
+        self._dirty = set()
+        self._refreshed_slot = None
+        self.recent = deque(maxlen=WHALE_BUFFER)
+        # Off while the bot restores from the log: only new whales alert
+        self.live = False
+        self.head = int(time.time()) * 1_000_000  # same numbering as TradeFeed
+        self.alerts = deque(maxlen=WHALE_ALERT_COUNT)  # (seq, TradeRecord, threshold)
+        self.whale_count = 0
+
+    def threshold(self, market):
+        return self.thresholds.get(market, WHALE_THRESHOLD_USD)
+
+    def classify(self, t, notional):
+        """True if t is a whale; records it. Call in trade time order."""
+        market = t["market_title"]
+        threshold = self.threshold(market)
+        if self.mode == "adaptive":
+            # judged against the threshold before this trade, then counted
+            sketch = self.sketches.get(market)
+            if sketch is None:
+                sketch = self.sketches[market] = QuantileSketch()
+            sketch.add(notional, t["ts"])
+            self._dirty.add(market)
+        if notional <= threshold:
+            return False
+        self.whale_count += 1
+        self.recent.append(t)
+        if self.live:
+            self.head += 1
+            self.alerts.append((self.head, t, threshold))
+        return True
+
+    def refresh(self, now_ts):
+        """Recompute adaptive thresholds; cheap when few markets traded."""
+        if self.mode != "adaptive":
+            return
+        slot = int(now_ts) // max(1, WHALE_QUANTILE_WINDOW // WHALE_SKETCH_SLOTS)
+        if slot != self._refreshed_slot:
+            # the window slid: every market's sketch lost its oldest slot
+            self._refreshed_slot = slot
+            markets = list(self.sketches)
+        else:
+            markets = self._dirty
+        for market in markets:
+            sketch = self.sketches.get(market)
+            if sketch is None:
+                continue
+            sketch.expire(now_ts)
+            if not sketch.n:
+                del self.sketches[market]
+                self.thresholds.pop(market, None)
+            elif sketch.n >= WHALE_MIN_SAMPLES:
+                self.thresholds[market] = max(
+                    WHALE_MIN_NOTIONAL, sketch.quantile(WHALE_QUANTILE)
+                )
+            else:
+                self.thresholds.pop(market, None)
+        self._dirty = set()
+
+    def evict(self, gone):
+        """Drop whales that left the hot trade set (gone: set of ids)."""
+        if any(id(t) in gone for t in self.recent):
+            self.recent = deque(
+                (t for t in self.recent if id(t) not in gone), maxlen=WHALE_BUFFER
+            )
+
+    def alerts_snapshot(self):
+        return {
+            "head": self.head,
+            "trades": [
+                {"seq": seq, **t.as_dict(), "threshold": threshold}
+                for seq, t, threshold in self.alerts
+            ],
+        }
+
+    def stats(self):
+        return {
+            "mode": self.mode,
+            "whales": self.whale_count,
+            "markets_with_own_threshold": len(self.thresholds),
+        }
+
+
+class IncrementalAnalytics:
+    """
+    Running per-trader, per-market and per-outcome aggregates.
+    Registered as a TradeDB consumer, so ingest() only ever sees new trades;
+    snapshot() returns the same structures as the batch compute_* functions.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.whales = WhaleDetector()
+        self.leaderboard = make_leaderboard()
+        self.markets = {}  # market_title -> running aggregate
+        # window seconds -> market_title -> SlidingWindow
+        self.windows = {VOLATILITY_WINDOW: {}}
+        # market_title -> FlowBuckets covering the longest orderflow window
+        self.flows = {}
+        self.flow_horizon = max(ORDERFLOW_WINDOWS.values())
+        self.sentiment = SentimentAggregates()
+        self._top_traders = []
+        self._traders_dirty = False
+
+    def ingest(self, trades):
+        now_ts = time.time()
+        with self.lock:
+            # trade time order: whale alerts are sequenced as they are found
+            for t in sorted(trades, key=itemgetter("ts")):
+                notional = t["size"] * t["price"]
+                is_whale = self.whales.classify(t, notional)
+                self._ingest_trader(t, notional)
+                self._ingest_market(t, notional, is_whale)
+                self._ingest_windows(t, now_ts)
+                self._ingest_flow(t, notional, now_ts)
+                self.sentiment.add(t, notional, now_ts)
+            if trades:
+                self._traders_dirty = True
+
+    def evict(self, trades):
+        """Forget evicted trades that are still referenced (running totals stay)."""
+        gone = {id(t) for t in trades}
+        with self.lock:
+            self.whales.evict(gone)
+
+    def _ingest_trader(self, t, notional):
+        name = t["name"] or t["pseudonym"] or t["proxyWallet"]
+        self.leaderboard.add(name, t, notional)
+
+    def _ingest_market(self, t, notional, is_whale):
+        mkt = t["market_title"]
+        m = self.markets.get(mkt)
+        if m is None:
+            m = self.markets[mkt] = {
+                "last_price": t["price"],
+                "total_volume": 0,
+                "buy_count": 0,
+                "sell_count": 0,
+                "whale_count": 0,
+                "volatility_1m": 0,
+                "outcomes": {},
+            }
+        m["last_price"] = t["price"]
+        m["total_volume"] += notional
+        if _infer_side(t) == "buy":
+            m["buy_count"] += 1
+        else:
+            m["sell_count"] += 1
+        if is_whale:
+            m["whale_count"] += 1
+        oc = t["outcome"]
+        m["outcomes"][oc] = m["outcomes"].get(oc, 0) + notional
+
+    def _ingest_windows(self, t, now_ts):
+        ts = t["ts"]
+        for seconds, by_market in self.windows.items():
+            if ts < now_ts - seconds:
+                continue  # already outside this window
+            window = by_market.get(t["market_title"])
+            if window is None:
+                window = by_market[t["market_title"]] = SlidingWindow(seconds)
+            window.add(ts, t["price"])
+
+    def _ingest_flow(self, t, notional, now_ts):
+        if t["ts"] < now_ts - self.flow_horizon:
+            return  # already outside every orderflow window
+        flow = self.flows.get(t["market_title"])
+        if flow is None:
+            flow = self.flows[t["market_title"]] = FlowBuckets()
+        flow.add(t["ts"], notional, _infer_side(t) == "buy")
+
+    def _evict_windows(self, now_ts):
+        for by_market in self.windows.values():
+            for mkt in list(by_market):
+                by_market[mkt].evict(now_ts)
+                if not by_market[mkt]:
+                    del by_market[mkt]
+        for mkt in list(self.flows):
+            self.flows[mkt].evict(now_ts - self.flow_horizon)
+            if not self.flows[mkt]:
+                del self.flows[mkt]
+
+    def _compute_top_traders(self):
+        if self._traders_dirty:
+            self._top_traders = self.leaderboard.rows()
+            self._traders_dirty = False
+        return list(self._top_traders)
+
+    def _compute_market_stats(self):
+        vol_windows = self.windows[VOLATILITY_WINDOW]
+        stats = {}
+        for mkt, m in self.markets.items():
+            stats[mkt] = dict(m, outcomes=dict(m["outcomes"]))
+            window = vol_windows.get(mkt)
+            stats[mkt]["volatility_1m"] = window.volatility() if window else 0
+        return stats
+
+    def _compute_orderflow(self, now_ts):
+        """{window name: {market: entry}}, markets without trades in a window left out."""
+        result = {}
+        for name, seconds in ORDERFLOW_WINDOWS.items():
+            since = now_ts - seconds
+            entries = result[name] = {}
+            for mkt, flow in self.flows.items():
+                buy_volume, sell_volume, buy_count, sell_count = flow.window(since)
+                if buy_count or sell_count:
+                    entries[mkt] = _orderflow_entry(
+                        buy_volume, sell_volume, int(buy_count), int(sell_count)
+                    )
+        return result
+
+    def snapshot(self, now=None):
+        """Return whales, top traders, market stats, orderflow and sentiment for this cycle."""
+        now = now or datetime.now(UTC)
+        with self.lock:
+            self._evict_windows(now.timestamp())
+            self.sentiment.evict(now.timestamp())
+            self.whales.refresh(now.timestamp())
+            sentiment, sentiment_markets = self.sentiment.compute(now.timestamp())
+            return {
+                "whales": list(self.whales.recent),
+                "whale_alerts": self.whales.alerts_snapshot(),
+                "top_traders": self._compute_top_traders(),
+                "market_stats": self._compute_market_stats(),
+                "orderflow": self._compute_orderflow(now.timestamp()),
+                "sentiment": sentiment,
+                "sentiment_markets": sentiment_markets,
+            }
+
+
+# ---------------- BACKUP HELPER ----------------
+
+def backup_data():
+    """
+    Create a timestamped backup of all data files.
+    Called at startup and on clean shutdown.
+    """
+    try:
+        ts = datetime.now(UTC).strftime("%Y%m%dT%H%M%SZ")
+        backup_dir = os.path.join(BACKUP_DIR, ts)
+        os.makedirs(backup_dir, exist_ok=True)
+
+        for fname in [
+            RECENT_TRADES_FILE,
+            WHALES_FILE,
+            TOP_TRADERS_FILE,
+            MARKETS_STATS_FILE,
+            ORDERFLOW_FILE,
+            LARGEST_TRADES_FILE,
+        ]:
+            src = os.path.join(DATA_DIR, fname)
+            if os.path.exists(src):
+                dst = os.path.join(backup_dir, fname)
+                with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+                    fdst.write(fsrc.read())
+
+        logging.info(f"Backup created at {backup_dir}")
+    except Exception as e:
+        logging.error(f"Backup failed: {e}")
+
+
+# ---------------- TRADE FEED ----------------
+
+
+class TradeFeed:
+    """
+    Gives every newly ingested trade a sequence number and keeps the newest
+    FEED_COUNT of them for trades_feed.json, which /ws/trades streams as
+    deltas. Numbering starts at start-time * 1e6, so it keeps increasing
+    across restarts (and stays below 2**53 for JavaScript clients).
+    """
+
+    def __init__(self, maxlen=FEED_COUNT):
+        self.head = int(time.time()) * 1_000_000
+        self.items = deque(maxlen=maxlen)  # {"seq", **trade} dicts, oldest first
+        self._lock = threading.Lock()
+
+    def ingest(self, new_trades):
+        # TradeDB consumer: called under the DB lock in ingest order
+        with self._lock:
+            for t in sorted(new_trades, key=attrgetter("ts")):
+                self.head += 1
+                # built once here, not for every one of FEED_COUNT rows per cycle
+                self.items.append({"seq": self.head, **t.as_dict()})
+
+    def snapshot(self):
+        with self._lock:
+            return {"head": self.head, "trades": list(self.items)}
+
+
+# ---------------- PIPELINE HELPERS ----------------
+
+
+class LatestMailbox:
+    """
+    Single-slot asyncio channel. put() never blocks: a value that was not
+    consumed yet is replaced (and counted in `coalesced`), so a slow consumer
+    always gets the newest value instead of a growing backlog.
+    """
+
+    def __init__(self):
+        self._value = None
+        self._has_value = False
+        self._event = asyncio.Event()
+        self.coalesced = 0
+
+    def put(self, value):
+        if self._has_value:
+            self.coalesced += 1
+        self._value = value
+        self._has_value = True
+        self._event.set()
+
+    async def get(self):
+        await self._event.wait()
+        self._event.clear()
+        value = self._value
+        self._value = None
+        self._has_value = False
+        return value
+
+
+# ---------------- POLYMARKET BOT ----------------
+
+
+class PolymarketBot:
+    def __init__(self, store=None, write_files=True):
+        """
+        store: optional SnapshotStore the outputs are published to (embedded mode).
+            In shared mode (POLYMARKET_SHARED=1) it defaults to a
+            SharedSnapshotWriter for multi-worker API servers.
+        write_files: also write data/*.json for FileCache and other processes.
+        """
+        os.makedirs(DATA_DIR, exist_ok=True)
+        if store is None and SHARED:
+            store = SharedSnapshotWriter()
+        self.trade_log = TradeLog(LOG_DIR)
+        atexit.register(self.trade_log.close)
+        self.db = TradeDB(trade_log=self.trade_log)
+        self.analytics = IncrementalAnalytics()
+        self.db.add_consumer(self.analytics)
+        self.fetcher = TradeFetcher(API_URL)
+        self.scheduler = PollScheduler(FETCH_INTERVAL)
+        self.writer = SnapshotWriter(DATA_DIR if write_files else None, store=store)
+        if hasattr(store, "attach_db"):
+            store.attach_db(self.db)  # per-market / per-wallet lookups
+        self.restore_from_log()
+        # Registered after the restore: only trades fetched from now on are streamed
+        self.feed = TradeFeed()
+        self.db.add_consumer(self.feed)
+        self.analytics.whales.live = True
+        self.analytics.sentiment.live = True  # "all" counts from here on
+        self.candle_shards = CandleShards()
+        self._candles_published = (None, float("-inf"))  # (change count, monotonic time)
+
+    def restore_from_log(self):
+        """Rebuild the hot trade set from the trade log after a restart."""
+        start = time.perf_counter()
+        min_ts = (
+            time.time() - RETENTION_SECONDS if RETENTION_SECONDS is not None else None
+        )
+        restored = self.db.restore(self.trade_log.replay(min_ts=min_ts))
+        logging.info(
+            f"Restored {restored} trades from the trade log "
+            f"in {time.perf_counter() - start:.2f}s."
+        )
+
+    def run(self):
+        asyncio.run(self.run_async())
+
+    async def run_async(self):
+        """
+        Run fetch -> ingest -> compute -> persist as concurrent stages, so the
+        next poll goes out while the previous batch is aggregated and written.
+        """
+        logging.info("Starting Polymarket local engine (Ctrl+C to exit)...")
+
+        ### Run a backup right after startup
+        backup_data()
+
+        # fetch -> ingest is a bounded queue: a stalled ingest stage blocks
+        # fetching instead of buffering without limit. compute and persist only
+        # ever need the latest state, so they get coalescing mailboxes.
+        self._ingest_queue = asyncio.Queue(maxsize=INGEST_QUEUE_SIZE)
+        self._compute_box = LatestMailbox()
+        self._persist_box = LatestMailbox()
+        self._in_flight = set()  # hashes fetched but not yet ingested
+
+        stages = [
+            asyncio.create_task(self._fetch_stage(), name="fetch"),
+            asyncio.create_task(self._ingest_stage(), name="ingest"),
+            asyncio.create_task(self._compute_stage(), name="compute"),
+            asyncio.create_task(self._persist_stage(), name="persist"),
+        ]
+        try:
+            await asyncio.gather(*stages)
+        finally:
+            for task in stages:
+                task.cancel()
+            await self.fetcher.close()
+
+    def _is_known(self, thash):
+        return thash in self._in_flight or self.db.is_known(thash)
+
+    async def _fetch_stage(self):
+        while True:
+            started = time.monotonic()
+            try:
+                raw_trades = await self.fetch()
+                if raw_trades:
+                    # built first, so a bad item cannot leave hashes in flight
+                    hashes = [str(t.get("transactionHash", "")) for t in raw_trades]
+                    self._in_flight.update(hashes)
+                    await self._ingest_queue.put((raw_trades, self.fetcher.last_gap))
+            except Exception as e:
+                # keep polling, like the other stages
+                logging.error(f"Error in fetch stage: {e}")
+            await asyncio.sleep(self.scheduler.next_delay(started, time.monotonic()))
+
+    async def _ingest_stage(self):
+        while True:
+            raw_trades, gap = await self._ingest_queue.get()
+            try:
+                await asyncio.to_thread(self.ingest, raw_trades, gap)
+                self._compute_box.put(True)
+            except Exception as e:
+                logging.error(f"Error in ingest stage: {e}")
+            finally:
+                self._in_flight.difference_update(
+                    str(t.get("transactionHash", "")) for t in raw_trades
+                )
+
+    async def _compute_stage(self):
+        while True:
+            await self._compute_box.get()
+            try:
+                self._persist_box.put(await asyncio.to_thread(self.compute_outputs))
+            except Exception as e:
+                logging.error(f"Error in compute stage: {e}")
+
+    async def _persist_stage(self):
+        while True:
+            outputs = await self._persist_box.get()
+            try:
+                await asyncio.to_thread(self.save_outputs, outputs)
+            except Exception as e:
+                logging.error(f"Error in persist stage: {e}")
+
+    async def fetch(self):
+        """Newest trades from the API (plus backfill), or None on error."""
+        try:
+            return await self.fetcher.fetch(self._is_known)
+        except FetchError as e:
+            self.scheduler.record_error(e.status, e.retry_after)
+            logging.warning(
+                f"{e} (consecutive errors: {self.scheduler.errors})"
+            )
+            return None
+
+    def ingest(self, raw_trades, gap=False):
+        parsed_trades = [p for p in map(parse_trade, raw_trades) if p is not None]
+        new_trades = self.db.update(parsed_trades)
+        self.scheduler.record_success(len(parsed_trades), new_trades, gap=gap)
+        logging.info(
+            f"Fetched {len(parsed_trades)} trades; "
+            f"{new_trades} new trades added "
+            f"(lock held {self.db.lock_stats['last_ms']:.2f} ms, "
+            f"poll interval {self.scheduler.interval:.1f}s, "
+            f"lag {self.scheduler.lag:.2f}s)."
+        )
+        return new_trades
+
+    def status(self):
+        """Scheduler, pipeline and DB health, written to bot_status.json every cycle."""
+        status = {
+            "updated": _ts_to_iso(int(time.time())),
+            "scheduler": self.scheduler.stats(),
+            "hot_trades": len(self.db.trades_by_hash),
+            "evicted_trades": self.db.evicted_count,
+            "lock_ms": dict(self.db.lock_stats),
+            "leaderboard": self.analytics.leaderboard.stats(),
+            "whales": self.analytics.whales.stats(),
+            "writer": {
+                "last_cycle": dict(self.writer.last_cycle),
+                "totals": dict(self.writer.totals),
+            },
+        }
+        if hasattr(self, "_ingest_queue"):
+            status["pipeline"] = {
+                "ingest_queue": self._ingest_queue.qsize(),
+                "compute_coalesced": self._compute_box.coalesced,
+                "persist_coalesced": self._persist_box.coalesced,
+            }
+        return status
+
+    def compute_outputs(self):
+        """Build every output of this cycle as {filename: data}."""
+        snapshot = self.analytics.snapshot()
+        return {
+            # JSON files used by your API & WebSocket
+            RECENT_TRADES_FILE: self.db.get_recent(RECENT_COUNT),
+            LARGEST_TRADES_FILE: self.db.get_largest(),
+            WHALES_FILE: snapshot["whales"],
+            WHALE_ALERTS_FILE: snapshot["whale_alerts"],
+            TOP_TRADERS_FILE: snapshot["top_traders"],
+            MARKETS_STATS_FILE: snapshot["market_stats"],
+            **{ORDERFLOW_FILES[w]: flow for w, flow in snapshot["orderflow"].items()},
+            SENTIMENT_FILE: snapshot["sentiment"],
+            SENTIMENT_MARKETS_FILE: snapshot["sentiment_markets"],
+            FEED_FILE: self.feed.snapshot(),
+            STATUS_FILE: self.status(),
+        }
+
+    def _candles_output(self):
+        """{shard file: body} of the candle shards that changed, when due, else {}."""
+        changes, published_at = self._candles_published
+        now = time.monotonic()
+        if self.db.candles.changes == changes or now - published_at < CANDLES_PUBLISH_SECONDS:
+            return {}
+        changes, dirty = self.db.take_dirty_candles()
+        self._candles_published = (changes, now)
+        return self.candle_shards.update(dirty)  # outside the DB lock
+
+    def save_outputs(self, outputs):
+        # added here, not in compute_outputs: the persist mailbox may skip a cycle
+        cycle = self.writer.write({**outputs, **self._candles_output()})
+        logging.info(
+            f"Snapshot: {cycle['written']} written, {cycle['skipped']} unchanged, "
+            f"{cycle['bytes']} bytes, {cycle['fsyncs']} fsyncs."
+        )
+
+    def compute_and_save(self):
+        self.save_outputs(self.compute_outputs())
+
+
+# ---------------- SHUTDOWN HANDLING ----------------
+
+def _graceful_shutdown(signum=None, frame=None):
+    """
+    Signal handler + atexit target.
+    Runs backup before exit.
+    """
+    logging.info(f"Received shutdown signal {signum}, creating backup and exiting...")
+    backup_data()
+    # If called from a signal handler, exit explicitly.
+    if signum is not None:
+        sys.exit(0)
+
+# ---------------- ENTRYPOINT ----------------
+
+if __name__ == "__main__":
+    # Register atexit backup (normal interpreter exit)
+    atexit.register(backup_data)
+
+    # Register signal handlers for clean shutdown (Ctrl+C, systemd stop, docker stop)
+    signal.signal(signal.SIGINT, _graceful_shutdown)
+    signal.signal(signal.SIGTERM, _graceful_shutdown)
+
+    bot = PolymarketBot()
+    bot.run()
@@ -0,0 +1,725 @@
+import asyncio
+import bisect
+import itertools
+import json
+import math
+from collections import deque
+from operator import itemgetter
+
+from fastapi import WebSocket, WebSocketDisconnect
+
+# Messages a client may have queued before it is switched to a catch-up
+WS_QUEUE_SIZE = 4
+# A single send taking longer than this drops the client (seconds)
+WS_SEND_TIMEOUT = 10
+# Sequenced trades kept for replaying reconnects (?since=<seq>); at least
+# the bot's FEED_COUNT, so one feed version always fits
+WS_RING_SIZE = 20_000
+# Trades in a full snapshot message
+WS_SNAPSHOT_COUNT = 50
+
+# Returned by ClientQueue.get() when queued deltas were dropped
+RESYNC = object()
+
+
+def _dumps(obj) -> str:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+def delta_message(seq: int, encoded_trades: list[str]) -> str:
+    return f'{{"type":"trades","seq":{seq},"trades":[{",".join(encoded_trades)}]}}'
+
+
+def snapshot_message(seq: int | None, encoded_trades: list[str], gap: bool = False) -> str:
+    # gap: trades between what the client had and this snapshot were not sent
+    return (
+        f'{{"type":"snapshot","seq":{_dumps(seq)},"gap":{_dumps(gap)},'
+        f'"trades":[{",".join(encoded_trades)}]}}'
+    )
+
+
+def new_feed_trades(feed: dict, head: int | None) -> tuple[list[dict], bool]:
+    """
+    Trades of a trades_feed.json version after seq `head`, and whether the
+    stream broke: the feed moved on by more than it holds, or the bot
+    restarted with a new numbering.
+    """
+    new = [t for t in feed.get("trades", []) if head is None or t["seq"] > head]
+    return new, bool(new) and head is not None and new[0]["seq"] != head + 1
+
+
+class TradeRing:
+    """
+    The newest WS_RING_SIZE sequenced trades, each JSON-encoded once.
+    Sequence numbers are contiguous inside the ring; reset() starts over
+    when the feed skipped ahead (missed trades, bot restart).
+    """
+
+    def __init__(self, maxlen: int = WS_RING_SIZE):
+        self.items = deque(maxlen=maxlen)  # (seq, trade JSON), oldest first
+
+    @property
+    def head(self) -> int | None:
+        return self.items[-1][0] if self.items else None
+
+    def append(self, seq: int, encoded: str) -> None:
+        self.items.append((seq, encoded))
+
+    def reset(self) -> None:
+        self.items.clear()
+
+    def since(self, seq: int) -> list[str] | None:
+        """Encoded trades after seq, or None if the ring cannot fill that gap."""
+        if not self.items:
+            return None
+        first, head = self.items[0][0], self.items[-1][0]
+        if seq < first - 1 or seq > head:
+            return None
+        return self.last(head - seq)
+
+    def last(self, n: int) -> list[str]:
+        n = min(n, len(self.items))
+        return [encoded for _, encoded in itertools.islice(reversed(self.items), n)][::-1]
+
+
+class ClientQueue:
+    """
+    Bounded per-client outbox of (seq, message). When a slow client's queue
+    overflows, its queued deltas are dropped and get() returns RESYNC once,
+    so the sender replaces them with a single catch-up from the ring instead
+    of buffering without limit.
+    """
+
+    def __init__(self, maxsize: int = WS_QUEUE_SIZE):
+        self.maxsize = maxsize
+        self.seq = None  # last sequence number this client is up to date with
+        self._items = deque()
+        self._ready = asyncio.Event()
+        self._closed = False
+        self._behind = False
+        self.sent = 0
+        self.conflated = 0
+
+    def put(self, seq: int, message: str) -> None:
+        if self._behind:
+            self.conflated += 1
+            return  # the catch-up will include it
+        if len(self._items) >= self.maxsize:
+            self.conflated += len(self._items) + 1
+            self._items.clear()
+            self._behind = True
+        else:
+            self._items.append((seq, message))
+        self._ready.set()
+
+    def close(self) -> None:
+        self._closed = True
+        self._ready.set()
+
+    async def get(self):
+        """Next (seq, message), RESYNC, or None once the client has gone away."""
+        while not self._items and not self._behind:
+            if self._closed:
+                return None
+            self._ready.clear()
+            await self._ready.wait()
+        if self._closed:
+            return None
+        if self._behind:
+            self._behind = False
+            return RESYNC
+        return self._items.popleft()
+
+
+class BroadcastHub:
+    """
+    Streams a sequenced trade feed (trades_feed.json) to WebSocket clients.
+    Woken by the data source when the feed changes, it appends the new trades
+    to a TradeRing, builds one delta message and puts that same string into
+    every subscriber's ClientQueue. Reconnecting clients pass the last seq
+    they saw and get the gap replayed from the ring, or a full snapshot if
+    the gap is older than the ring.
+    """
+
+    def __init__(
+        self,
+        source,
+        fname: str,
+        queue_size: int = WS_QUEUE_SIZE,
+        send_timeout: float = WS_SEND_TIMEOUT,
+        ring_size: int = WS_RING_SIZE,
+    ):
+        self.source = source
+        self.fname = fname
+        self.queue_size = queue_size
+        self.send_timeout = send_timeout
+        self.ring = TradeRing(ring_size)
+        self.clients: set[ClientQueue] = set()
+        self._loop = None
+        self._changed = None
+        self._task = None
+        self._version = None
+        self.stats_counters = {
+            "broadcasts": 0,
+            "resets": 0,
+            "connected_total": 0,
+            "replayed_trades": 0,
+            "snapshots": 0,
+            "resyncs": 0,
+            "dropped_slow": 0,
+            "conflated": 0,
+        }
+
+    # ---------------- feed ----------------
+
+    def _start(self) -> None:
+        if self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._changed = asyncio.Event()
+        self.source.add_listener(self._on_change)
+        self._task = self._loop.create_task(self._run(), name=f"broadcast-{self.fname}")
+        self._pull()
+
+    def _on_change(self, fname: str) -> None:
+        # Called from the source's thread (file watcher or bot)
+        if fname != self.fname:
+            return
+        try:
+            self._loop.call_soon_threadsafe(self._changed.set)
+        except RuntimeError:
+            pass  # event loop already closed
+
+    def _pull(self) -> str | None:
+        """
+        Move trades the ring has not seen from the current feed version into
+        it. Returns the message for subscribers (a delta, or a snapshot after
+        a reset), or None if nothing changed.
+        """
+        feed, version = self.source.get_versioned(self.fname)
+        if not feed or version == self._version:
+            return None
+        self._version = version
+
+        new, reset = new_feed_trades(feed, self.ring.head)
+        if not new:
+            return None
+        first = self.ring.head is None
+        if reset:
+            self.ring.reset()
+            self.stats_counters["resets"] += 1
+        encoded = [_dumps(t) for t in new]
+        for t, e in zip(new, encoded):
+            self.ring.append(t["seq"], e)
+        if first or reset:
+            # after a reset subscribers missed trades: say so instead of
+            # silently starting over
+            return snapshot_message(self.ring.head, self.ring.last(WS_SNAPSHOT_COUNT), gap=reset)
+        return delta_message(self.ring.head, encoded)
+
+    async def _run(self) -> None:
+        while True:
+            await self._changed.wait()
+            self._changed.clear()
+            # without clients the feed is not parsed; serve() catches up
+            message = self._pull() if self.clients else None
+            if message is None:
+                continue
+            seq = self.ring.head
+            for client in self.clients:
+                client.put(seq, message)
+            self.stats_counters["broadcasts"] += 1
+
+    def _catch_up(self, since: int | None) -> tuple[int | None, str | None]:
+        """(seq, message) bringing a client at `since` up to the ring head."""
+        head = self.ring.head
+        if since is not None:
+            gap = self.ring.since(since)
+            if gap is not None:
+                self.stats_counters["replayed_trades"] += len(gap)
+                return head, delta_message(head, gap) if gap else None
+        self.stats_counters["snapshots"] += 1
+        gap = since is not None and since != head
+        return head, snapshot_message(head, self.ring.last(WS_SNAPSHOT_COUNT), gap=gap)
+
+    # ---------------- connections ----------------
+
+    async def serve(self, websocket: WebSocket, since: int | None = None) -> None:
+        """
+        Handle one connection until it closes or falls too far behind. The
+        first message replays the trades after `since`, or is a snapshot.
+        """
+        await websocket.accept()
+        self._start()
+        client = ClientQueue(self.queue_size)
+        if not self.clients:
+            self._pull()  # the ring stood still while nobody was connected
+        self.clients.add(client)
+        self.stats_counters["connected_total"] += 1
+        receiver = asyncio.create_task(self._receive(websocket, client))
+
+        seq, message = self._catch_up(since)
+        try:
+            while True:
+                if message is not None:
+                    await asyncio.wait_for(websocket.send_text(message), self.send_timeout)
+                    client.sent += 1
+                client.seq = seq
+                item = await client.get()
+                if item is None:
+                    break
+                if item is RESYNC:
+                    self.stats_counters["resyncs"] += 1
+                    seq, message = self._catch_up(client.seq)
+                    continue
+                seq, message = item
+                if client.seq is not None and seq <= client.seq:
+                    seq, message = client.seq, None  # covered by a catch-up
+        except asyncio.TimeoutError:
+            self.stats_counters["dropped_slow"] += 1
+            print(f"[WS] Dropped a client stuck for {self.send_timeout}s on {self.fname}")
+        except (WebSocketDisconnect, RuntimeError, OSError):
+            pass
+        finally:
+            self.clients.discard(client)
+            self.stats_counters["conflated"] += client.conflated
+            receiver.cancel()
+            try:
+                await websocket.close()
+            except (WebSocketDisconnect, RuntimeError, OSError):
+                pass
+
+    @staticmethod
+    async def _receive(websocket: WebSocket, client: ClientQueue) -> None:
+        # Notice disconnects while idle; incoming messages are ignored
+        try:
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    break
+        except (WebSocketDisconnect, RuntimeError, OSError):
+            pass
+        finally:
+            client.close()
+
+    def stats(self) -> dict:
+        return {
+            **self.stats_counters,
+            "clients": len(self.clients),
+            "ring_trades": len(self.ring.items),
+            "head": self.ring.head,
+            "conflated": self.stats_counters["conflated"]
+            + sum(c.conflated for c in self.clients),
+        }
+
+
+# ---------------- TOPIC SUBSCRIPTIONS ----------------
+
+# Topic -> snapshot file it follows
+WS_TOPIC_FILES = {
+    "trades": "trades_feed.json",
+    "whales": "whale_alerts.json",
+    "orderflow": "orderflow.json",
+    "markets": "markets_stats.json",
+    "traders": "traders_top.json",
+}
+# Topics whose data is a sequenced {"head", "trades"} feed, streamed as new trades
+FEED_TOPICS = ("trades", "whales")
+# Topics whose data is a {market: entry} dict, streamed as changed entries
+KEYED_TOPICS = ("orderflow", "markets")
+# Default and maximum number of traders in a "traders" subscription
+WS_TRADERS_LIMIT = 20
+WS_TRADERS_MAX_LIMIT = 500
+WS_MAX_SUBSCRIPTIONS = 50
+# Largest min_notional filter accepted (far above any market's volume)
+WS_MAX_MIN_NOTIONAL = 1e15
+# Per-client queue of the multiplexed socket (small deltas, several topics)
+WS_TOPIC_QUEUE_SIZE = 32
+
+
+def _entry_volume(topic: str, entry) -> float:
+    if not isinstance(entry, dict):
+        return 0.0
+    if topic == "orderflow":
+        return entry.get("buy_volume", 0) + entry.get("sell_volume", 0)
+    return entry.get("total_volume", 0)
+
+
+class TopicGroup:
+    """Every client subscribed to one topic with identical filters."""
+
+    __slots__ = ("key", "topic", "market", "min_notional", "limit", "clients", "last")
+
+    def __init__(self, key, topic, market, min_notional, limit):
+        self.key = key
+        self.topic = topic
+        self.market = market
+        self.min_notional = min_notional
+        self.limit = limit
+        self.clients: set[ClientQueue] = set()
+        self.last = None  # last traders body sent, to skip unchanged ones
+
+
+class GroupIndex:
+    """
+    Subscription groups of one topic, bucketed by market filter (None = any
+    market) and sorted by min_notional inside each bucket. Matching a trade
+    or market entry touches only its market's bucket and the any-market
+    bucket, and within those only the groups whose threshold it passes.
+    """
+
+    def __init__(self):
+        self.buckets: dict[str | None, list] = {}  # market -> [(min_notional, key, group)]
+
+    def __len__(self):
+        return sum(len(b) for b in self.buckets.values())
+
+    def add(self, group: TopicGroup) -> None:
+        bisect.insort(
+            self.buckets.setdefault(group.market, []),
+            (group.min_notional, group.key, group),
+        )
+
+    def remove(self, group: TopicGroup) -> None:
+        bucket = self.buckets[group.market]
+        del bucket[bisect.bisect_left(bucket, (group.min_notional, group.key))]
+        if not bucket:
+            del self.buckets[group.market]
+
+    def matching(self, market: str, value: float):
+        for bucket in (self.buckets.get(market), self.buckets.get(None)):
+            if bucket:
+                n = bisect.bisect_right(bucket, value, key=itemgetter(0))
+                for _, _, group in bucket[:n]:
+                    yield group
+
+    def groups(self):
+        for bucket in self.buckets.values():
+            for _, _, group in bucket:
+                yield group
+
+
+class TopicHub:
+    """
+    Multiplexed WebSocket subscriptions. A client sends
+      {"op": "subscribe", "topic": "trades", "market": "...", "min_notional": 5000}
+    and receives only matching data, tagged with the subscription key.
+    Clients with identical filters share one TopicGroup, so each message is
+    built once per group; GroupIndex keeps fan-out proportional to the groups
+    that actually match, not to the number of subscribers.
+    """
+
+    def __init__(
+        self,
+        source,
+        queue_size: int = WS_TOPIC_QUEUE_SIZE,
+        send_timeout: float = WS_SEND_TIMEOUT,
+    ):
+        self.source = source
+        self.queue_size = queue_size
+        self.send_timeout = send_timeout
+        self.groups: dict[str, TopicGroup] = {}
+        self.index = {topic: GroupIndex() for topic in WS_TOPIC_FILES}
+        self.subscriptions: dict[ClientQueue, set[str]] = {}
+        self._files = set(WS_TOPIC_FILES.values())
+        self._topics = {fname: topic for topic, fname in WS_TOPIC_FILES.items()}
+        self._versions: dict[str, str] = {}
+        self._feed_heads = {topic: None for topic in FEED_TOPICS}
+        self._entries = {topic: {} for topic in KEYED_TOPICS}  # market -> entry JSON
+        self._dirty: set[str] = set()
+        self._loop = None
+        self._changed = None
+        self._task = None
+        self.stats_counters = {
+            "connected_total": 0,
+            "messages": 0,
+            "resyncs": 0,
+            "dropped_slow": 0,
+        }
+
+    # ---------------- updates ----------------
+
+    def _start(self) -> None:
+        if self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._changed = asyncio.Event()
+        self.source.add_listener(self._on_change)
+        self._task = self._loop.create_task(self._run(), name="broadcast-topics")
+
+    def _on_change(self, fname: str) -> None:
+        # Called from the source's thread (file watcher or bot)
+        if fname not in self._files:
+            return
+        try:
+            self._loop.call_soon_threadsafe(self._mark, fname)
+        except RuntimeError:
+            pass  # event loop already closed
+
+    def _mark(self, fname: str) -> None:
+        self._dirty.add(fname)
+        self._changed.set()
+
+    async def _run(self) -> None:
+        while True:
+            await self._changed.wait()
+            self._changed.clear()
+            dirty, self._dirty = self._dirty, set()
+            for fname in dirty:
+                self._process(fname)
+
+    def _process(self, fname: str, idle: bool = False) -> None:
+        # A topic nobody subscribes to is not parsed; _subscribe catches up
+        if not idle and not len(self.index[self._topics[fname]]):
+            return
+        data, version = self.source.get_versioned(fname)
+        if data is None or version == self._versions.get(fname):
+            return
+        self._versions[fname] = version
+        for topic in FEED_TOPICS:
+            if fname == WS_TOPIC_FILES[topic]:
+                self._publish_trades(topic, data)
+        if fname == WS_TOPIC_FILES["traders"]:
+            self._publish_traders(data)
+        for topic in KEYED_TOPICS:
+            if fname == WS_TOPIC_FILES[topic]:
+                self._publish_entries(topic, data)
+
+    def _send(self, group: TopicGroup, message: str) -> None:
+        for client in group.clients:
+            client.put(0, message)
+        self.stats_counters["messages"] += len(group.clients)
+
+    def _publish_trades(self, topic: str, feed: dict) -> None:
+        # trades_feed.json for "trades"; the bot's whale alerts for "whales"
+        new, gap = new_feed_trades(feed, self._feed_heads[topic])
+        if not new:
+            return
+        head = self._feed_heads[topic] = new[-1]["seq"]
+        matched: dict[TopicGroup, list[str]] = {}
+        for t in new:
+            encoded = None
+            notional = t["size"] * t["price"]
+            for group in self.index[topic].matching(t["market_title"], notional):
+                if encoded is None:
+                    encoded = _dumps(t)
+                matched.setdefault(group, []).append(encoded)
+        if gap:
+            # the feed skipped ahead: every subscriber may have missed trades
+            for group in self.index[topic].groups():
+                matched.setdefault(group, [])
+        for group, trades in matched.items():
+            self._send(
+                group,
+                f'{{"type":"trades","sub":{_dumps(group.key)},"seq":{head},'
+                f'"gap":{_dumps(gap)},"trades":[{",".join(trades)}]}}',
+            )
+
+    def _publish_entries(self, topic: str, data: dict) -> None:
+        previous = self._entries[topic]
+        current = {market: _dumps(entry) for market, entry in data.items()}
+        self._entries[topic] = current
+
+        matched: dict[TopicGroup, list[str]] = {}
+        for market, encoded in current.items():
+            if previous.get(market) != encoded:
+                volume = _entry_volume(topic, data[market])
+                for group in self.index[topic].matching(market, volume):
+                    matched.setdefault(group, []).append(f"{_dumps(market)}:{encoded}")
+        for market in previous.keys() - current.keys():
+            # Gone from the snapshot (evicted): tell everyone who may hold it
+            for group in self.index[topic].matching(market, float("inf")):
+                matched.setdefault(group, []).append(f"{_dumps(market)}:null")
+        for group, parts in matched.items():
+            self._send(
+                group,
+                f'{{"type":"update","sub":{_dumps(group.key)},"data":{{{",".join(parts)}}}}}',
+            )
+
+    def _traders_body(self, group: TopicGroup, traders) -> str:
+        selected = [
+            t
+            for t in traders or []
+            if t.get("total_volume", 0) >= group.min_notional
+            and (group.market is None or t.get("top_market") == group.market)
+        ]
+        return _dumps(selected[: group.limit])
+
+    def _publish_traders(self, traders) -> None:
+        for group in self.index["traders"].groups():
+            body = self._traders_body(group, traders)
+            if body != group.last:
+                group.last = body
+                self._send(
+                    group, f'{{"type":"update","sub":{_dumps(group.key)},"data":{body}}}'
+                )
+
+    def _snapshot(self, group: TopicGroup, gap: bool = False) -> str:
+        """
+        First message of a subscription: the matching current state. For the
+        feed topics, gap=True marks trades the client missed (a resync).
+        """
+        sub = _dumps(group.key)
+        topic = group.topic
+        data = self.source.get(WS_TOPIC_FILES[topic])
+        if topic in FEED_TOPICS:
+            head = self._feed_heads[topic]
+            trades = [
+                t
+                for t in (data or {}).get("trades", [])
+                # later trades arrive as the next update
+                if head is not None and t["seq"] <= head
+                and (group.market is None or t["market_title"] == group.market)
+                and t["size"] * t["price"] >= group.min_notional
+            ]
+            encoded = ",".join(_dumps(t) for t in trades[-WS_SNAPSHOT_COUNT:])
+            return (
+                f'{{"type":"snapshot","sub":{sub},"seq":{_dumps(head)},"gap":{_dumps(gap)},'
+                f'"trades":[{encoded}]}}'
+            )
+        if topic == "traders":
+            return f'{{"type":"snapshot","sub":{sub},"data":{self._traders_body(group, data)}}}'
+        entries = {
+            market: entry
+            for market, entry in (data or {}).items()
+            if (group.market is None or market == group.market)
+            and _entry_volume(topic, entry) >= group.min_notional
+        }
+        return f'{{"type":"snapshot","sub":{sub},"data":{_dumps(entries)}}}'
+
+    # ---------------- subscriptions ----------------
+
+    def _subscribe(self, client: ClientQueue, request: dict) -> str:
+        topic = request.get("topic")
+        if not isinstance(topic, str) or topic not in WS_TOPIC_FILES:
+            raise ValueError(f"unknown topic {topic!r}, expected one of {list(WS_TOPIC_FILES)}")
+        market = request.get("market")
+        if market is not None and not isinstance(market, str):
+            raise ValueError("market must be a string")
+        min_notional = request.get("min_notional", 0)
+        if not isinstance(min_notional, (int, float)) or isinstance(min_notional, bool):
+            raise ValueError("min_notional must be a number")
+        try:
+            min_notional = float(min_notional)
+        except OverflowError:
+            min_notional = math.inf  # an int too large for a float
+        if not 0 <= min_notional <= WS_MAX_MIN_NOTIONAL:  # also rejects NaN and inf
+            raise ValueError(f"min_notional must be 0..{WS_MAX_MIN_NOTIONAL:g}")
+        limit = None
+        if topic == "traders":
+            limit = request.get("limit", WS_TRADERS_LIMIT)
+            if (
+                not isinstance(limit, int)
+                or isinstance(limit, bool)
+                or not 1 <= limit <= WS_TRADERS_MAX_LIMIT
+            ):
+                raise ValueError(f"limit must be 1..{WS_TRADERS_MAX_LIMIT}")
+        subs = self.subscriptions[client]
+        if len(subs) >= WS_MAX_SUBSCRIPTIONS:
+            raise ValueError(f"at most {WS_MAX_SUBSCRIPTIONS} subscriptions per connection")
+
+        key = f"{topic}:{market or '*'}:{min_notional:g}"
+        if limit is not None:
+            key += f":{limit}"
+        if not len(self.index[topic]):
+            # first subscriber of an idle topic: bring its baseline up to date
+            self._process(WS_TOPIC_FILES[topic], idle=True)
+        group = self.groups.get(key)
+        if group is None:
+            group = self.groups[key] = TopicGroup(key, topic, market, min_notional, limit)
+            self.index[topic].add(group)
+        group.clients.add(client)
+        subs.add(key)
+        return key
+
+    def _unsubscribe(self, client: ClientQueue, key: str) -> bool:
+        if not isinstance(key, str) or key not in self.subscriptions.get(client, ()):
+            return False
+        self.subscriptions[client].discard(key)
+        group = self.groups[key]
+        group.clients.discard(client)
+        if not group.clients:
+            del self.groups[key]
+            self.index[group.topic].remove(group)
+        return True
+
+    def _handle(self, client: ClientQueue, text: str) -> None:
+        """Apply one control message from a client and queue the reply."""
+        try:
+            request = json.loads(text)
+            if not isinstance(request, dict):
+                raise ValueError("message must be a JSON object")
+            op = request.get("op")
+            if op == "subscribe":
+                key = self._subscribe(client, request)
+                client.put(0, f'{{"type":"subscribed","sub":{_dumps(key)}}}')
+                client.put(0, self._snapshot(self.groups[key]))
+            elif op == "unsubscribe":
+                key = request.get("sub")
+                if not self._unsubscribe(client, key):
+                    raise ValueError(f"not subscribed to {key!r}")
+                client.put(0, f'{{"type":"unsubscribed","sub":{_dumps(key)}}}')
+            else:
+                raise ValueError("op must be 'subscribe' or 'unsubscribe'")
+        except (ValueError, AttributeError, TypeError, OverflowError) as e:
+            client.put(0, _dumps({"type": "error", "error": str(e)}))
+
+    # ---------------- connections ----------------
+
+    async def serve(self, websocket: WebSocket) -> None:
+        await websocket.accept()
+        self._start()
+        client = ClientQueue(self.queue_size)
+        self.subscriptions[client] = set()
+        self.stats_counters["connected_total"] += 1
+        receiver = asyncio.create_task(self._receive(websocket, client))
+        try:
+            while True:
+                item = await client.get()
+                if item is None:
+                    break
+                if item is RESYNC:
+                    # Dropped updates: resend the current state of every subscription
+                    self.stats_counters["resyncs"] += 1
+                    messages = [
+                        self._snapshot(self.groups[k], gap=True) for k in self.subscriptions[client]
+                    ]
+                else:
+                    messages = [item[1]]
+                for message in messages:
+                    await asyncio.wait_for(websocket.send_text(message), self.send_timeout)
+                    client.sent += 1
+        except asyncio.TimeoutError:
+            self.stats_counters["dropped_slow"] += 1
+            print(f"[WS] Dropped a client stuck for {self.send_timeout}s on /ws")
+        except (WebSocketDisconnect, RuntimeError, OSError):
+            pass
+        finally:
+            for key in list(self.subscriptions[client]):
+                self._unsubscribe(client, key)
+            del self.subscriptions[client]
+            receiver.cancel()
+            try:
+                await websocket.close()
+            except (WebSocketDisconnect, RuntimeError, OSError):
+                pass
+
+    async def _receive(self, websocket: WebSocket, client: ClientQueue) -> None:
+        try:
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    break
+                if message.get("text") is not None:
+                    self._handle(client, message["text"])
+        except (WebSocketDisconnect, RuntimeError, OSError):
+            pass
+        finally:
+            client.close()
+
+    def stats(self) -> dict:
+        return {
+            **self.stats_counters,
+            "clients": len(self.subscriptions),
+            "groups": {topic: len(index) for topic, index in self.index.items()},
+        }
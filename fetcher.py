@@ -0,0 +1,136 @@
+import asyncio
+import logging
+
+import httpx
+
+API_URL = "https://data-api.polymarket.com/trades"
+PAGE_LIMIT = 500            # trades per page
+MAX_BACKFILL_PAGES = 10     # older pages fetched at most per cycle
+BACKFILL_CONCURRENCY = 4    # pages in flight at once
+REQUEST_TIMEOUT = 5         # seconds
+
+
+def _retry_after(value):
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None  # HTTP-date form; fall back to normal backoff
+
+
+class FetchError(Exception):
+    """Request failed; status is the HTTP status code, or None for network errors."""
+
+    def __init__(self, message, status=None, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after  # seconds, from a Retry-After header
+
+
+class TradeFetcher:
+    """
+    Async trades fetcher with a pooled keep-alive HTTP client.
+
+    fetch() always reads the newest page. If none of its trades are known
+    yet there is a gap since the last cycle, so older pages are fetched with
+    offset/limit, up to BACKFILL_CONCURRENCY at a time, until one overlaps
+    the known transactionHash set, comes back short, or MAX_BACKFILL_PAGES
+    is reached.
+    """
+
+    def __init__(
+        self,
+        api_url: str = API_URL,
+        page_limit: int = PAGE_LIMIT,
+        max_backfill_pages: int = MAX_BACKFILL_PAGES,
+        concurrency: int = BACKFILL_CONCURRENCY,
+        timeout: float = REQUEST_TIMEOUT,
+    ):
+        self.api_url = api_url
+        self.page_limit = page_limit
+        self.max_backfill_pages = max_backfill_pages
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self._client: httpx.AsyncClient | None = None
+        self._semaphore = asyncio.Semaphore(concurrency)
+        # stats of the last fetch() call
+        self.last_pages = 0
+        self.last_gap = False
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.concurrency,
+                    max_keepalive_connections=self.concurrency,
+                ),
+            )
+        return self._client
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def fetch_page(self, offset: int = 0) -> list[dict]:
+        params = {"limit": self.page_limit, "offset": offset}
+        async with self._semaphore:
+            try:
+                resp = await self._get_client().get(self.api_url, params=params)
+            except httpx.HTTPError as e:
+                raise FetchError(f"Network error: {e}") from e
+
+        if resp.status_code != 200:
+            raise FetchError(
+                f"API returned {resp.status_code}",
+                resp.status_code,
+                _retry_after(resp.headers.get("Retry-After")),
+            )
+        try:
+            page = resp.json()
+        except ValueError as e:
+            raise FetchError(f"Invalid JSON from API: {e}", resp.status_code) from e
+        return page if isinstance(page, list) else []
+
+    async def fetch(self, is_known) -> list[dict]:
+        """
+        Newest page plus any backfilled older pages, newest first.
+        is_known(transaction_hash) tells whether a trade is already stored.
+        """
+        first = await self.fetch_page(0)
+        pages = [first]
+        self.last_gap = bool(first) and not self._overlaps(first, is_known)
+
+        if self.last_gap and len(first) >= self.page_limit:
+            await self._backfill(pages, is_known)
+            if len(pages) > 1:
+                logging.info(
+                    f"Gap detected; backfilled {len(pages) - 1} older page(s)."
+                )
+
+        self.last_pages = len(pages)
+        return [t for page in pages for t in page]
+
+    async def _backfill(self, pages, is_known) -> None:
+        next_page = 1
+        while next_page <= self.max_backfill_pages:
+            wave = range(
+                next_page, min(next_page + self.concurrency, self.max_backfill_pages + 1)
+            )
+            results = await asyncio.gather(
+                *(self.fetch_page(i * self.page_limit) for i in wave),
+                return_exceptions=True,
+            )
+            for result in results:
+                if isinstance(result, Exception):
+                    # keep what we have; the next cycle backfills again
+                    logging.warning(f"Backfill page failed: {result}")
+                    return
+                pages.append(result)
+                if len(result) < self.page_limit or self._overlaps(result, is_known):
+                    return
+            next_page += len(wave)
+
+    @staticmethod
+    def _overlaps(page, is_known) -> bool:
+        return any(is_known(str(t.get("transactionHash", ""))) for t in page)
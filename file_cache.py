@@ -1,162 +1,327 @@
-import os
-import time
-import json
-import threading
-import atexit
-
-# Absolute data dir, shared with bot.py
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DATA_DIR = os.path.join(BASE_DIR, "data")
-os.makedirs(DATA_DIR, exist_ok=True)
-
-MONITOR_FILES = [
-    "trades_recent.json",
-    "whales.json",
-    "traders_top.json",
-    "markets_stats.json",
-    "orderflow.json",
-    "full_trades_sorted.txt",
-    "full_trades_chrono.txt",
-]
-
-
-class FileCache:
-    def __init__(self, data_dir: str, files: list[str]):
-        self.data_dir = data_dir
-        self.files = files
-        self._data: dict[str, object] = {}
-        self._mtimes: dict[str, float] = {}
-        self._lock = threading.Lock()
-        self._versions: dict[str, str] = {}
-        self._stop_event = threading.Event()
-        self._watcher_thread = threading.Thread(
-            target=self._watch_files, daemon=True
-        )
-        self._watcher_thread.start()
-        atexit.register(self.stop_watcher)
-
-    def stop_watcher(self) -> None:
-        """Gracefully stop the file watcher."""
-        self._stop_event.set()
-        if hasattr(self, "_watcher_thread"):
-            self._watcher_thread.join(timeout=2)
-
-    def _watch_files(self) -> None:
-        """Watch files for changes with error handling."""
-        while not self._stop_event.is_set():
-            for fname in self.files:
-                path = os.path.join(self.data_dir, fname)
-                try:
-                    if os.path.exists(path):
-                        mtime = os.path.getmtime(path)
-                        prev_mtime = self._mtimes.get(fname, 0.0)
-
-                        # Only reload if newer
-                        if mtime > prev_mtime:
-                            self._load_file(fname, path)
-                            with self._lock:
-                                self._mtimes[fname] = mtime
-                                # millisecond version, good for WS diffing
-                                self._versions[fname] = str(int(mtime * 1000))
-                            print(f"[FileCache] Reloaded {fname}")
-                except (OSError, FileNotFoundError):
-                    # File may disappear while checking; just skip
-                    continue
-                except Exception as e:
-                    print(f"[FileCache] Error watching {fname}: {e}")
-                    continue
-
-            # Sleep with timeout check
-            if self._stop_event.wait(timeout=1):
-                break
-
-    def _load_file(self, fname: str, path: str) -> None:
-        """Load file with comprehensive error handling."""
-        try:
-            with open(path, "r", encoding="utf-8") as f:
-                content = f.read()
-
-            if fname.endswith(".json"):
-                # Validate JSON before parsing
-                try:
-                    data = json.loads(content)
-                    with self._lock:
-                        self._data[fname] = data
-                except json.JSONDecodeError:
-                    print(f"[FileCache] Invalid JSON in {fname}, skipping")
-                    with self._lock:
-                        self._data[fname] = None
-            else:
-                # Text file - store as string
-                with self._lock:
-                    self._data[fname] = content
-
-        except (UnicodeDecodeError, PermissionError) as e:
-            print(f"[FileCache] File read error {fname}: {e}")
-            with self._lock:
-                self._data[fname] = None
-        except Exception as e:
-            print(f"[FileCache] Unexpected error loading {fname}: {e}")
-            with self._lock:
-                self._data[fname] = None
-
-    def get(self, fname: str, default=None, raw: bool = False):
-        """
-        Get cached data.
-        raw=True forces raw string return even for JSON files.
-        """
-        with self._lock:
-            val = self._data.get(fname, default)
-            if raw or fname.endswith(".txt"):
-                return val
-            return val
-
-    def get_versioned(self, fname: str, default=None):
-        """Returns (data, version) tuple for websocket versioning."""
-        with self._lock:
-            data = self._data.get(fname, default)
-            version = self._versions.get(fname)
-            return data, version
-
-    def invalidate(self, fname: str) -> None:
-        """Force reload a specific file immediately."""
-        path = os.path.join(self.data_dir, fname)
-        if os.path.exists(path):
-            self._load_file(fname, path)
-
-    def clear(self) -> None:
-        """Clear all cache."""
-        with self._lock:
-            self._data.clear()
-            self._mtimes.clear()
-            self._versions.clear()
-
-    @staticmethod
-    def dumps(obj) -> str:
-        """Safe JSON dump."""
-        try:
-            return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
-        except (TypeError, ValueError):
-            return ""
-        except Exception:
-            return '{"error":"serialization failed"}'
-
-
-# Global instance used by routers-api.py and routers/ws.py
-file_cache = FileCache(DATA_DIR, MONITOR_FILES)
-
-
-if __name__ == "__main__":
-    # Simple manual test
-    print("FileCache started. Monitoring:", MONITOR_FILES)
-    print("Data dir:", DATA_DIR)
-
-    try:
-        while True:
-            time.sleep(5)
-            with file_cache._lock:
-                status = {k: v is not None for k, v in file_cache._data.items()}
-            print("Cache status:", status)
-    except KeyboardInterrupt:
-        file_cache.stop_watcher()
-        print("FileCache stopped.")
+import os
+import sys
+import time
+import json
+import select
+import struct
+import ctypes
+import ctypes.util
+import threading
+import atexit
+
+from snapshots import CANDLE_SHARDS, EncodedPayload, candle_shard_name
+
+# Absolute data dir, shared with bot.py
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(BASE_DIR, "data")
+os.makedirs(DATA_DIR, exist_ok=True)
+
+MONITOR_FILES = [
+    "trades_recent.json",
+    "whales.json",
+    "traders_top.json",
+    "markets_stats.json",
+    "orderflow.json",
+    "orderflow_5m.json",
+    "orderflow_15m.json",
+    "orderflow_1h.json",
+    "orderflow_24h.json",
+    "trades_largest.json",
+    "bot_status.json",
+    "trades_feed.json",
+    "whale_alerts.json",
+    "sentiment.json",
+    "sentiment_markets.json",
+    *(candle_shard_name(i) for i in range(CANDLE_SHARDS)),
+]
+
+# Reload latency buckets (ms, upper bounds) for FileCache.get_stats()
+LATENCY_BUCKETS_MS = [1, 5, 10, 50, 100, 250, 500, 1000, 2000, 5000]
+
+
+class _Inotify:
+    """
+    Minimal Linux inotify wrapper (ctypes, no dependencies).
+    Watches one directory for files being closed after writing or renamed
+    into it, which is what atomic_save's os.replace produces.
+    """
+
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_TO = 0x00000080
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+    _EVENT = struct.Struct("iIII")
+
+    def __init__(self, directory: str):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        wd = libc.inotify_add_watch(
+            self.fd, os.fsencode(directory), self.IN_CLOSE_WRITE | self.IN_MOVED_TO
+        )
+        if wd < 0:
+            err = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(err, f"inotify_add_watch failed for {directory}")
+
+    def read_names(self, timeout: float) -> set[str]:
+        """File names with events, waiting up to timeout seconds for the first one."""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return set()
+        try:
+            buf = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return set()
+
+        names = set()
+        pos = 0
+        while pos + self._EVENT.size <= len(buf):
+            _, _, _, length = self._EVENT.unpack_from(buf, pos)
+            pos += self._EVENT.size
+            name = buf[pos:pos + length].rstrip(b"\0")
+            pos += length
+            if name:
+                names.add(os.fsdecode(name))
+        return names
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class FileCache:
+    def __init__(self, data_dir: str, files: list[str]):
+        self.data_dir = data_dir
+        self.files = files
+        self._data: dict[str, object] = {}
+        self._mtimes: dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._versions: dict[str, str] = {}
+        self._raw: dict[str, bytes | None] = {}
+        self._encoded: dict[str, EncodedPayload] = {}
+        self._reloads: dict[str, int] = {}
+        self._latency_hist = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self._listeners = []
+        self.mode = "polling"
+        self._stop_event = threading.Event()
+        self._watcher_thread = threading.Thread(
+            target=self._watch_files, daemon=True
+        )
+        self._watcher_thread.start()
+        atexit.register(self.stop_watcher)
+
+    def stop_watcher(self) -> None:
+        """Gracefully stop the file watcher."""
+        self._stop_event.set()
+        if hasattr(self, "_watcher_thread"):
+            self._watcher_thread.join(timeout=2)
+
+    def _watch_files(self) -> None:
+        """Event-driven on Linux (inotify), mtime polling elsewhere or on failure."""
+        inotify = None
+        if sys.platform.startswith("linux"):
+            try:
+                inotify = _Inotify(self.data_dir)
+                self.mode = "inotify"
+            except (OSError, AttributeError) as e:
+                print(f"[FileCache] inotify unavailable ({e}), polling instead")
+
+        try:
+            while not self._stop_event.is_set():
+                # Poll pass: initial load, fallback mode, and a safety net
+                # for anything inotify might have missed
+                self._poll_once()
+
+                if inotify is None:
+                    if self._stop_event.wait(timeout=1):
+                        break
+                    continue
+
+                # Block on events; wake up at least once per second
+                deadline = time.monotonic() + 1
+                while not self._stop_event.is_set():
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    for fname in inotify.read_names(remaining):
+                        if fname in self.files:
+                            self._reload(fname, os.path.join(self.data_dir, fname))
+        finally:
+            if inotify is not None:
+                inotify.close()
+
+    def _poll_once(self) -> None:
+        for fname in self.files:
+            path = os.path.join(self.data_dir, fname)
+            try:
+                if os.path.exists(path):
+                    mtime = os.path.getmtime(path)
+                    prev_mtime = self._mtimes.get(fname, 0.0)
+
+                    # Only reload if newer
+                    if mtime > prev_mtime:
+                        self._reload(fname, path)
+            except (OSError, FileNotFoundError):
+                # File may disappear while checking; just skip
+                continue
+            except Exception as e:
+                print(f"[FileCache] Error watching {fname}: {e}")
+                continue
+
+    def _reload(self, fname: str, path: str) -> None:
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return
+        self._load_file(fname, path)
+        latency_ms = max(0.0, (time.time() - mtime) * 1000)
+        with self._lock:
+            count = self._reloads.get(fname, 0) + 1
+            raw = self._raw.get(fname)
+        # millisecond mtime plus reload count: unique even for rewrites
+        # within the same mtime tick, good for WS diffing
+        version = f"{int(mtime * 1000)}.{count}"
+        # Serialize/compress once per version, here in the watcher thread
+        encoded = EncodedPayload(raw, version) if raw is not None else None
+        with self._lock:
+            self._mtimes[fname] = mtime
+            self._reloads[fname] = count
+            self._versions[fname] = version
+            if encoded is not None:
+                self._encoded[fname] = encoded
+            else:
+                self._encoded.pop(fname, None)
+            bucket = len(LATENCY_BUCKETS_MS)
+            for i, bound in enumerate(LATENCY_BUCKETS_MS):
+                if latency_ms <= bound:
+                    bucket = i
+                    break
+            self._latency_hist[bucket] += 1
+        print(f"[FileCache] Reloaded {fname} ({latency_ms:.1f} ms after write)")
+        for callback in self._listeners:
+            try:
+                callback(fname)
+            except Exception as e:
+                print(f"[FileCache] Listener error for {fname}: {e}")
+
+    def add_listener(self, callback) -> None:
+        """callback(fname) runs in the watcher thread after every reload."""
+        self._listeners.append(callback)
+
+    def get_stats(self) -> dict:
+        """Watcher mode, reload counts and the write-to-reload latency histogram."""
+        with self._lock:
+            labels = [f"<={b}ms" for b in LATENCY_BUCKETS_MS] + [
+                f">{LATENCY_BUCKETS_MS[-1]}ms"
+            ]
+            return {
+                "mode": self.mode,
+                "reloads": dict(self._reloads),
+                "total_reloads": sum(self._reloads.values()),
+                "latency_histogram": dict(zip(labels, self._latency_hist)),
+            }
+
+    def _load_file(self, fname: str, path: str) -> None:
+        """Load file with comprehensive error handling."""
+        try:
+            with open(path, "rb") as f:
+                raw = f.read()
+            content = raw.decode("utf-8")
+
+            if fname.endswith(".json"):
+                # Validate JSON before parsing
+                try:
+                    data = json.loads(content)
+                    with self._lock:
+                        self._data[fname] = data
+                        self._raw[fname] = raw
+                except json.JSONDecodeError:
+                    print(f"[FileCache] Invalid JSON in {fname}, skipping")
+                    with self._lock:
+                        self._data[fname] = None
+                        self._raw[fname] = None
+            else:
+                # Text file - store as string
+                with self._lock:
+                    self._data[fname] = content
+                    self._raw[fname] = raw
+
+        except (UnicodeDecodeError, PermissionError) as e:
+            print(f"[FileCache] File read error {fname}: {e}")
+            with self._lock:
+                self._data[fname] = None
+                self._raw[fname] = None
+        except Exception as e:
+            print(f"[FileCache] Unexpected error loading {fname}: {e}")
+            with self._lock:
+                self._data[fname] = None
+                self._raw[fname] = None
+
+    def get(self, fname: str, default=None, raw: bool = False):
+        """
+        Get cached data.
+        raw=True forces raw string return even for JSON files.
+        """
+        with self._lock:
+            val = self._data.get(fname, default)
+            if raw or fname.endswith(".txt"):
+                return val
+            return val
+
+    def get_versioned(self, fname: str, default=None):
+        """Returns (data, version) tuple for websocket versioning."""
+        with self._lock:
+            data = self._data.get(fname, default)
+            version = self._versions.get(fname)
+            return data, version
+
+    def get_encoded(self, fname: str) -> EncodedPayload | None:
+        """Pre-serialized, pre-compressed body of the current version."""
+        with self._lock:
+            return self._encoded.get(fname)
+
+    def invalidate(self, fname: str) -> None:
+        """Force reload a specific file immediately."""
+        path = os.path.join(self.data_dir, fname)
+        if os.path.exists(path):
+            self._reload(fname, path)
+
+    def clear(self) -> None:
+        """Clear all cache."""
+        with self._lock:
+            self._data.clear()
+            self._mtimes.clear()
+            self._versions.clear()
+            self._raw.clear()
+            self._encoded.clear()
+
+    @staticmethod
+    def dumps(obj) -> str:
+        """Safe JSON dump."""
+        try:
+            return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+        except (TypeError, ValueError):
+            return ""
+        except Exception:
+            return '{"error":"serialization failed"}'
+
+
+# Global instance used by routers-api.py and routers/ws.py
+file_cache = FileCache(DATA_DIR, MONITOR_FILES)
+
+
+if __name__ == "__main__":
+    # Simple manual test
+    print("FileCache started. Monitoring:", MONITOR_FILES)
+    print("Data dir:", DATA_DIR)
+
+    try:
+        while True:
+            time.sleep(5)
+            with file_cache._lock:
+                status = {k: v is not None for k, v in file_cache._data.items()}
+            print("Cache status:", status)
+    except KeyboardInterrupt:
+        file_cache.stop_watcher()
+        print("FileCache stopped.")
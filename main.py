@@ -1,98 +1,155 @@
-import os
-import sys
-import subprocess
-
-import uvicorn
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
-
-# -------------------------------------------------
-# Paths / imports
-# -------------------------------------------------
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-
-# Ensure this directory is on sys.path so "routers" and "bot" can be imported/found
-if BASE_DIR not in sys.path:
-    sys.path.append(BASE_DIR)
-
-# Routers package must be: BASE_DIR/routers/api.py and BASE_DIR/routers/ws.py
-from routers import api, ws  # noqa: E402
-
-
-# -------------------------------------------------
-# FastAPI app
-# -------------------------------------------------
-app = FastAPI(title="Polymarket Data Publisher API")
-
-# CORS: open for dev, tighten allow_origins in production
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-# Mount routers
-app.include_router(api.router, prefix="/api")
-app.include_router(ws.router)
-
-
-# -------------------------------------------------
-# Simple health check
-# -------------------------------------------------
-@app.get("/health")
-def health():
-    return {"status": "ok"}
-
-
-# -------------------------------------------------
-# Bot starter
-# -------------------------------------------------
-def start_bot() -> None:
-    """
-    Start bot.py in a separate process.
-    On Windows this opens a new console window.
-    """
-    bot_path = os.path.join(BASE_DIR, "bot.py")
-
-    if not os.path.exists(bot_path):
-        # Fail fast with a clear message if bot.py is missing
-        raise FileNotFoundError(f"bot.py not found at: {bot_path}")
-
-    cmd = [sys.executable, bot_path]
-
-    if os.name == "nt":
-        # Windows: open in new console window
-        CREATE_NEW_CONSOLE = subprocess.CREATE_NEW_CONSOLE
-        subprocess.Popen(
-            cmd,
-            creationflags=CREATE_NEW_CONSOLE,
-            cwd=BASE_DIR,
-        )
-    else:
-        # Linux/macOS: background process in same working directory
-        subprocess.Popen(
-            cmd,
-            cwd=BASE_DIR,
-        )
-
-
-# -------------------------------------------------
-# Entry point
-# -------------------------------------------------
-if __name__ == "__main__":
-    # 1) Start the trading/data bot that writes into ./data/*.json
-    try:
-        start_bot()
-    except FileNotFoundError as e:
-        # Log but still start API, so dashboard can show "no data" instead of crashing
-        print(f"[main] Bot not started: {e}")
-
-    # 2) Start the FastAPI server (HTTP + WebSockets)
-    uvicorn.run(
-        "main:app",
-        host="0.0.0.0",
-        port=8000,
-        reload=False,
-    )
+import os
+import sys
+import asyncio
+import subprocess
+from contextlib import asynccontextmanager
+
+import uvicorn
+from fastapi import FastAPI
+from fastapi.middleware.cors import CORSMiddleware
+
+# -------------------------------------------------
+# Paths / imports
+# -------------------------------------------------
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Ensure this directory is on sys.path so "routers" and "bot" can be imported/found
+if BASE_DIR not in sys.path:
+    sys.path.append(BASE_DIR)
+
+# Routers package must be: BASE_DIR/routers/api.py and BASE_DIR/routers/ws.py
+from routers import api, ws  # noqa: E402
+from snapshots import EMBEDDED, snapshot_store  # noqa: E402
+
+# In embedded mode, also keep writing data/*.json as a side channel
+EMBEDDED_WRITE_FILES = os.environ.get("POLYMARKET_WRITE_FILES", "1") == "1"
+# API worker processes; more than one serves the bot's shared mmap snapshot
+WORKERS = int(os.environ.get("POLYMARKET_WORKERS", "1"))
+
+
+# -------------------------------------------------
+# Embedded bot
+# -------------------------------------------------
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    With POLYMARKET_EMBEDDED=1 the bot runs as a background task of this app
+    and the routers read its published snapshots directly.
+    """
+    task = None
+    if EMBEDDED:
+        from bot import PolymarketBot, backup_data
+
+        # Restoring from the trade log can take a moment; keep the loop free
+        bot = await asyncio.to_thread(
+            PolymarketBot, store=snapshot_store, write_files=EMBEDDED_WRITE_FILES
+        )
+        task = asyncio.create_task(bot.run_async(), name="polymarket-bot")
+    try:
+        yield
+    finally:
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+            bot.trade_log.close()
+            if EMBEDDED_WRITE_FILES:
+                backup_data()
+
+
+# -------------------------------------------------
+# FastAPI app
+# -------------------------------------------------
+app = FastAPI(title="Polymarket Data Publisher API", lifespan=lifespan)
+
+# CORS: open for dev, tighten allow_origins in production
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor", "X-Has-More"],
+)
+
+# Mount routers
+app.include_router(api.router, prefix="/api")
+app.include_router(ws.router)
+
+
+# -------------------------------------------------
+# Simple health check
+# -------------------------------------------------
+@app.get("/health")
+def health():
+    return {"status": "ok"}
+
+
+# -------------------------------------------------
+# Bot starter
+# -------------------------------------------------
+def start_bot() -> None:
+    """
+    Start bot.py in a separate process.
+    On Windows this opens a new console window.
+    """
+    bot_path = os.path.join(BASE_DIR, "bot.py")
+
+    if not os.path.exists(bot_path):
+        # Fail fast with a clear message if bot.py is missing
+        raise FileNotFoundError(f"bot.py not found at: {bot_path}")
+
+    cmd = [sys.executable, bot_path]
+
+    if os.name == "nt":
+        # Windows: open in new console window
+        CREATE_NEW_CONSOLE = subprocess.CREATE_NEW_CONSOLE
+        subprocess.Popen(
+            cmd,
+            creationflags=CREATE_NEW_CONSOLE,
+            cwd=BASE_DIR,
+        )
+    else:
+        # Linux/macOS: background process in same working directory
+        subprocess.Popen(
+            cmd,
+            cwd=BASE_DIR,
+        )
+
+
+# -------------------------------------------------
+# Entry point
+# -------------------------------------------------
+if __name__ == "__main__":
+    workers = WORKERS
+    if workers > 1 and EMBEDDED:
+        # Every worker would run its own bot
+        print("[main] POLYMARKET_WORKERS ignored in embedded mode, using 1 worker")
+        workers = 1
+    elif workers > 1:
+        # Inherited by the bot and the workers: one shared snapshot instead of
+        # a FileCache per worker
+        os.environ["POLYMARKET_SHARED"] = "1"
+
+    # 1) Start the trading/data bot that writes into ./data/*.json
+    #    (in embedded mode the app's lifespan runs it in-process instead)
+    if not EMBEDDED:
+        try:
+            start_bot()
+        except FileNotFoundError as e:
+            # Log but still start API, so dashboard can show "no data" instead of crashing
+            print(f"[main] Bot not started: {e}")
+
+    # 2) Start the FastAPI server (HTTP + WebSockets)
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=8000,
+        reload=False,
+        workers=workers,
+        # WS fan-out sends one pre-serialized body to every client; per-socket
+        # compression would redo the work N times
+        ws_per_message_deflate=False,
+    )
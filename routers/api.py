@@ -1,83 +1,385 @@
-import os
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import JSONResponse, PlainTextResponse
-from file_cache import file_cache  # DATA_DIR is already used inside file_cache
-
-router = APIRouter()
-
-@router.get("/trades/recent")
-def get_trades_recent():
-    # Use logical filename; file_cache already knows DATA_DIR
-    data = file_cache.get("trades_recent.json")
-    if data is None:
-        raise HTTPException(404, "File not found or not loaded.")
-    return JSONResponse(data)
-
-
-@router.get("/trades/whales")
-def get_trades_whales():
-    data = file_cache.get("whales.json")
-    if data is None:
-        raise HTTPException(404, "File not found or not loaded.")
-    return JSONResponse(data)
-
-
-@router.get("/traders/top")
-def get_traders_top():
-    data = file_cache.get("traders_top.json")
-    if data is None:
-        raise HTTPException(404, "File not found or not loaded.")
-    return JSONResponse(data)
-
-
-@router.get("/markets")
-def get_markets():
-    data = file_cache.get("markets_stats.json")
-    if data is None:
-        raise HTTPException(404, "File not found or not loaded.")
-    return JSONResponse(data)
-
-
-@router.get("/markets/{market}")
-def get_market_data(market: str):
-    data = file_cache.get("markets_stats.json")
-    if data is None:
-        raise HTTPException(404, "File not found or not loaded.")
-
-    # If markets_stats is a dict keyed by market id:
-    if isinstance(data, dict):
-        market_obj = data.get(market)
-    else:
-        # If it's a list, look up by id field
-        market_obj = next((m for m in data if m.get("id") == market), None)
-
-    if not market_obj:
-        raise HTTPException(404, f"Market '{market}' not found.")
-
-    return JSONResponse(market_obj)
-
-
-@router.get("/orderflow")
-def get_orderflow():
-    data = file_cache.get("orderflow.json")
-    if data is None:
-        raise HTTPException(404, "File not found or not loaded.")
-    return JSONResponse(data)
-
-
-@router.get("/full/sorted")
-def get_full_sorted():
-    # Bot writes full_trades_sorted.txt (CSV content with ; delimiter)
-    data = file_cache.get("full_trades_sorted.txt", raw=True)
-    if data is None:
-        raise HTTPException(404, "File not found or not loaded.")
-    return PlainTextResponse(data, media_type="text/csv")
-
-
-@router.get("/full/chrono")
-def get_full_chrono():
-    # Bot writes full_trades_chrono.txt
-    data = file_cache.get("full_trades_chrono.txt", raw=True)
-    if data is None:
-        raise HTTPException(404, "File not found or not loaded.")
-    return PlainTextResponse(data, media_type="text/csv")
+import os
+import json
+import bisect
+import time
+import hashlib
+import threading
+from operator import itemgetter
+from typing import Literal
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from snapshots import RETENTION_SECONDS, EncodedPayload, candle_shard_file, get_data_source
+from trade_log import (
+    LOG_DIR,
+    entity_summary,
+    iter_csv,
+    iter_ndjson,
+    iter_rows_by_size_desc,
+    iter_rows_chrono_desc,
+    list_segments,
+    query_rows,
+)
+
+router = APIRouter()
+
+# FileCache over data/*.json, or the embedded bot's in-memory snapshots
+source = get_data_source()
+
+
+def encoded_response(request: Request, fname: str) -> Response:
+    """
+    Serve the source's pre-serialized body for fname: 304 when the client's
+    If-None-Match names the current version, otherwise the best precompressed
+    variant for its Accept-Encoding. No per-request JSON encoding.
+    """
+    body = source.get_encoded(fname)
+    if body is None:
+        raise HTTPException(404, "File not found or not loaded.")
+
+    headers = {"ETag": body.etag, "Vary": "Accept-Encoding", "Cache-Control": "no-cache"}
+    if body.matches(request.headers.get("if-none-match")):
+        return Response(status_code=304, headers=headers)
+
+    content, encoding = body.select(request.headers.get("accept-encoding"))
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(content, media_type="application/json", headers=headers)
+
+
+@router.get("/trades/recent")
+def get_trades_recent(request: Request):
+    # Use logical filename; the source already knows DATA_DIR
+    return encoded_response(request, "trades_recent.json")
+
+
+@router.get("/trades/whales")
+def get_trades_whales(request: Request):
+    return encoded_response(request, "whales.json")
+
+
+@router.get("/whales/alerts")
+def get_whale_alerts(
+    request: Request,
+    since: int | None = Query(None, description="Last alert seq already seen"),
+):
+    # Sequenced whale alerts ({"head", "trades"}); with ?since= only newer ones
+    if since is None:
+        return encoded_response(request, "whale_alerts.json")
+    feed = source.get("whale_alerts.json")
+    if feed is None:
+        raise HTTPException(404, "File not found or not loaded.")
+    return JSONResponse({
+        "head": feed["head"],
+        "trades": [t for t in feed["trades"] if t["seq"] > since],
+    })
+
+
+@router.get("/trades/largest")
+def get_trades_largest(request: Request):
+    return encoded_response(request, "trades_largest.json")
+
+
+@router.get("/traders/top")
+def get_traders_top(request: Request):
+    return encoded_response(request, "traders_top.json")
+
+
+@router.get("/markets")
+def get_markets(request: Request):
+    return encoded_response(request, "markets_stats.json")
+
+
+@router.get("/markets/{market}")
+def get_market_data(market: str):
+    data = source.get("markets_stats.json")
+    if data is None:
+        raise HTTPException(404, "File not found or not loaded.")
+
+    # If markets_stats is a dict keyed by market id:
+    if isinstance(data, dict):
+        market_obj = data.get(market)
+    else:
+        # If it's a list, look up by id field
+        market_obj = next((m for m in data if m.get("id") == market), None)
+
+    if not market_obj:
+        raise HTTPException(404, f"Market '{market}' not found.")
+
+    return JSONResponse(market_obj)
+
+
+def _logged_entity(field: str, value: str, breakdown: str, limit: int):
+    # Without the embedded bot's indexes: that entity's records of the bot's
+    # hot-set window, found through the trade log's postings
+    since = int(time.time()) - RETENTION_SECONDS if RETENTION_SECONDS is not None else None
+    return entity_summary(LOG_DIR, field, value, breakdown, since=since, limit=limit)
+
+
+@router.get("/markets/{market:path}/trades")
+def get_market_trades(market: str, limit: int = Query(50, ge=1, le=1000)):
+    # Embedded: the bot's per-market index, O(limit). Otherwise from the trade log.
+    if hasattr(source, "get_market_trades"):
+        data = source.get_market_trades(market, limit)
+    else:
+        data = _logged_entity("market_title", market, "outcome", limit)
+    if data is None:
+        raise HTTPException(404, f"Market '{market}' not found.")
+    return JSONResponse(data)
+
+
+def _published_candles(market: str, res: str, outcome, limit: int, since):
+    """Same result as the bot's CandleIndex.candles(), read from the market's candles shard."""
+    published = source.get(candle_shard_file(market))
+    if published is None:
+        raise HTTPException(404, "Candles not published yet.")
+    outcomes = published["markets"].get(market)
+    if outcomes is None:
+        return None
+    if outcome is not None:
+        outcomes = {outcome: outcomes[outcome]} if outcome in outcomes else {}
+    seconds = published["resolutions"][res]
+    fields = published["fields"]
+    result = {}
+    for name, series in outcomes.items():
+        rows = series[res]
+        first = max(0, len(rows) - limit)
+        if since is not None:
+            start = since - since % seconds
+            first = max(first, bisect.bisect_left(rows, start, key=itemgetter(0)))
+        result[name] = [dict(zip(fields, row)) for row in rows[first:]]
+    return result
+
+
+@router.get("/markets/{market:path}/candles")
+def get_market_candles(
+    market: str,
+    res: Literal["1m", "5m", "1h", "1d"] = "1m",
+    outcome: str | None = None,
+    limit: int = Query(200, ge=1, le=1440),
+    since: int | None = Query(None, description="Unix seconds, inclusive"),
+):
+    # OHLCV per outcome from the bot's candle rings: O(returned buckets).
+    # Without the embedded bot, from the rings it publishes as candles_NNN.json.
+    if hasattr(source, "get_candles"):
+        data = source.get_candles(market, res, outcome, limit, since)
+    else:
+        data = _published_candles(market, res, outcome, limit, since)
+    if data is None:
+        raise HTTPException(404, f"Market '{market}' not found.")
+    return JSONResponse({"market": market, "res": res, "outcomes": data})
+
+
+@router.get("/traders/{wallet}")
+def get_trader(wallet: str, limit: int = Query(50, ge=1, le=1000)):
+    # Embedded: the bot's per-wallet (proxyWallet) index. Otherwise from the trade log.
+    if hasattr(source, "get_trader"):
+        data = source.get_trader(wallet, limit)
+    else:
+        data = _logged_entity("proxyWallet", wallet, "market_title", limit)
+        if data is not None:
+            latest = data["recent_trades"][0]
+            data["name"], data["pseudonym"] = latest["name"], latest["pseudonym"]
+    if data is None:
+        raise HTTPException(404, f"Trader '{wallet}' not found.")
+    return JSONResponse(data)
+
+
+# Precomputed orderflow windows and their output files
+ORDERFLOW_WINDOW_FILES = {
+    "1m": "orderflow.json",
+    "5m": "orderflow_5m.json",
+    "15m": "orderflow_15m.json",
+    "1h": "orderflow_1h.json",
+    "24h": "orderflow_24h.json",
+}
+
+
+@router.get("/orderflow")
+def get_orderflow(request: Request, window: Literal["1m", "5m", "15m", "1h", "24h"] = "1m"):
+    # Buy/sell volume, counts, imbalance and momentum per market over `window`
+    return encoded_response(request, ORDERFLOW_WINDOW_FILES[window])
+
+
+SENTIMENT_TIMEFRAMES = ("1h", "6h", "24h", "all")
+# The bot's entry for a timeframe without bullish or bearish trades
+SENTIMENT_NEUTRAL = {
+    "bullish_count": 0, "bearish_count": 0, "bullish_volume": 0, "bearish_volume": 0,
+    "total_analyzed": 0, "bullish_percent": 0, "bearish_percent": 0, "sentiment_score": 50,
+}
+
+
+@router.get("/sentiment")
+def get_sentiment(
+    request: Request,
+    market: str | None = None,
+    window: Literal["1h", "6h", "24h", "all"] | None = None,
+):
+    # Bullish (BUY Yes / SELL No) vs bearish (BUY No / SELL Yes) trades, kept
+    # by the bot per timeframe. Over all markets by default; with ?market= for
+    # one market; with only ?window= every market's entry for that timeframe.
+    if market is None and window is None:
+        return encoded_response(request, "sentiment.json")
+    data = source.get("sentiment_markets.json")
+    if data is None:
+        raise HTTPException(404, "File not found or not loaded.")
+    if market is None:
+        return JSONResponse(data[window])
+    if market not in data["all"]:
+        raise HTTPException(404, f"Market '{market}' not found.")
+    entries = {tf: data[tf].get(market, SENTIMENT_NEUTRAL) for tf in SENTIMENT_TIMEFRAMES}
+    return JSONResponse(entries[window] if window else entries)
+
+
+@router.get("/status")
+def get_status(request: Request):
+    # Poll scheduler interval/lag and TradeDB health from the bot
+    return encoded_response(request, "bot_status.json")
+
+
+# Dashboard sections of /snapshot and the outputs behind them
+SNAPSHOT_SECTIONS = {
+    "trades": "trades_recent.json",
+    "whales": "whales.json",
+    "traders": "traders_top.json",
+    "markets": "markets_stats.json",
+    "orderflow": "orderflow.json",
+    "sentiment": "sentiment.json",
+}
+
+# Combined bodies for the current versions, keyed by the set of changed
+# sections (at most 2^6 variants); rebuilt when any section changes
+_snapshot_cache: dict[tuple, EncodedPayload] = {}
+_snapshot_cache_key: tuple = ()
+_snapshot_lock = threading.Lock()
+
+
+def _combined_snapshot(current: dict[str, EncodedPayload], changed: tuple) -> EncodedPayload:
+    """
+    {"versions": {...}, "sections": {...changed}} spliced from the sections'
+    pre-serialized bodies, compressed once per variant and cached.
+    """
+    global _snapshot_cache, _snapshot_cache_key
+    versions = tuple((name, p.version) for name, p in current.items())
+    with _snapshot_lock:
+        if versions != _snapshot_cache_key:
+            _snapshot_cache = {}
+            _snapshot_cache_key = versions
+        cached = _snapshot_cache.get(changed)
+        if cached is not None:
+            return cached
+
+        all_versions = {name: None for name in SNAPSHOT_SECTIONS}
+        all_versions.update(versions)
+        parts = [b'{"versions":', json.dumps(all_versions).encode(), b',"sections":{']
+        for i, name in enumerate(changed):
+            parts.append(b'%s"%s":' % (b"," if i else b"", name.encode()))
+            parts.append(current[name].identity)
+        parts.append(b"}}")
+        tag = hashlib.blake2b(repr((versions, changed)).encode(), digest_size=16)
+        encoded = EncodedPayload(b"".join(parts), tag.hexdigest())
+        _snapshot_cache[changed] = encoded
+        return encoded
+
+
+@router.get("/snapshot")
+def get_snapshot(
+    request: Request,
+    trades: str | None = None,
+    whales: str | None = None,
+    traders: str | None = None,
+    markets: str | None = None,
+    orderflow: str | None = None,
+    sentiment: str | None = None,
+):
+    # All dashboard sections in one request. Pass each section's last seen
+    # version (?trades=<v>&whales=<v>...); only changed sections come back,
+    # and 304 if none did. Sections the bot has not written yet are null.
+    seen = {"trades": trades, "whales": whales, "traders": traders,
+            "markets": markets, "orderflow": orderflow, "sentiment": sentiment}
+    current = {}
+    for name, fname in SNAPSHOT_SECTIONS.items():
+        encoded = source.get_encoded(fname)
+        if encoded is not None:
+            current[name] = encoded
+    changed = tuple(name for name, p in current.items() if p.version != seen[name])
+    if current and not changed:
+        return Response(status_code=304, headers={"Cache-Control": "no-cache"})
+
+    body = _combined_snapshot(current, changed)
+    headers = {"Vary": "Accept-Encoding", "Cache-Control": "no-cache"}
+    content, encoding = body.select(request.headers.get("accept-encoding"))
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(content, media_type="application/json", headers=headers)
+
+
+@router.get("/cache/stats")
+def get_cache_stats():
+    # FileCache watcher mode and reload latencies, or the mapped shared snapshot generation
+    if not hasattr(source, "get_stats"):
+        raise HTTPException(404, "No file cache in embedded mode.")
+    return JSONResponse(source.get_stats())
+
+
+@router.get("/full/sorted")
+def get_full_sorted():
+    # Derived from the bot's trade log (CSV content with ; delimiter), largest first
+    if not list_segments(LOG_DIR):
+        raise HTTPException(404, "Trade log not found.")
+    return StreamingResponse(
+        iter_csv(iter_rows_by_size_desc(LOG_DIR)), media_type="text/csv"
+    )
+
+
+@router.get("/full/chrono")
+def get_full_chrono():
+    # Derived from the bot's trade log, newest first
+    if not list_segments(LOG_DIR):
+        raise HTTPException(404, "Trade log not found.")
+    return StreamingResponse(
+        iter_csv(iter_rows_chrono_desc(LOG_DIR)), media_type="text/csv"
+    )
+
+
+@router.get("/history")
+def get_history(
+    market: str | None = None,
+    outcome: str | None = None,
+    wallet: str | None = None,
+    side: Literal["BUY", "SELL", "buy", "sell"] | None = None,
+    since: int | None = Query(None, description="Unix seconds, inclusive"),
+    until: int | None = Query(None, description="Unix seconds, exclusive"),
+    min_notional: float | None = Query(None, ge=0, description="size * price in USD"),
+    cursor: str | None = None,
+    limit: int = Query(1000, ge=1, le=10000),
+    format: Literal["ndjson", "csv"] = "ndjson",
+):
+    # Filtered page of the trade log in append order; pass X-Next-Cursor back
+    # as ?cursor= for the next page (or to pick up trades logged since)
+    if not list_segments(LOG_DIR):
+        raise HTTPException(404, "Trade log not found.")
+    try:
+        rows, next_cursor = query_rows(
+            LOG_DIR,
+            market=market,
+            outcome=outcome,
+            wallet=wallet,
+            side=side,
+            since=since,
+            until=until,
+            min_notional=min_notional,
+            cursor=cursor,
+            limit=limit,
+        )
+    except ValueError:
+        raise HTTPException(400, f"Invalid cursor '{cursor}'.")
+
+    headers = {
+        "X-Next-Cursor": next_cursor,
+        "X-Has-More": "true" if len(rows) >= limit else "false",
+    }
+    if format == "csv":
+        return StreamingResponse(iter_csv(rows), media_type="text/csv", headers=headers)
+    return StreamingResponse(
+        iter_ndjson(rows), media_type="application/x-ndjson", headers=headers
+    )
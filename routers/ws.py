@@ -1,43 +1,73 @@
-import asyncio
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-from file_cache import file_cache  # uses DATA_DIR and MONITOR_FILES from file_cache.py
-
-router = APIRouter()
-
-TRADES_RECENT_FILE = "trades_recent.json"
-
-
-@router.websocket("/ws/trades")
-async def stream_trades_recent(websocket: WebSocket) -> None:
-    """
-    Streams the contents of trades_recent.json via WebSocket.
-    Sends only when the file version changes in FileCache.
-    """
-    await websocket.accept()
-    last_version = None
-
-    try:
-        while True:
-            # FileCache works with logical file names (not full paths)
-            file_data, version = file_cache.get_versioned(TRADES_RECENT_FILE)
-
-            # Only send when there is fresh data and a new version
-            if version != last_version and file_data is not None:
-                if isinstance(file_data, str):
-                    payload = file_data
-                else:
-                    payload = file_cache.dumps(file_data)
-
-                await websocket.send_text(payload)
-                last_version = version
-
-            # Poll once per second
-            await asyncio.sleep(1)
-
-    except WebSocketDisconnect:
-        # Client disconnected, just stop this handler
-        pass
-
-    except Exception as e:
-        # Log unexpected errors instead of crashing the server
-        print(f"[WS] Error in /ws/trades: {e}")
+from fastapi import APIRouter, WebSocket
+from broadcast import BroadcastHub, TopicHub
+from snapshots import get_data_source
+
+router = APIRouter()
+
+# FileCache over data/*.json, or the embedded bot's in-memory snapshots
+source = get_data_source()
+
+TRADES_FEED_FILE = "trades_feed.json"
+WHALE_ALERTS_FILE = "whale_alerts.json"
+
+# One broadcaster for all /ws/trades connections
+trades_hub = BroadcastHub(source, TRADES_FEED_FILE)
+# and one for /ws/whales, fed by the bot's whale detector
+whales_hub = BroadcastHub(source, WHALE_ALERTS_FILE)
+# Topic subscriptions of the multiplexed /ws socket
+topics_hub = TopicHub(source)
+
+
+@router.websocket("/ws/trades")
+async def stream_trades(websocket: WebSocket, since: int | None = None) -> None:
+    """
+    Streams new trades as sequenced deltas:
+      {"type": "trades", "seq": <last seq>, "trades": [{"seq": ..., ...}]}
+    On connect, ?since=<seq> replays the trades after seq; without it, or if
+    that is older than the replay buffer, a snapshot of the newest trades
+    ({"type": "snapshot", ...}) comes first.
+    """
+    try:
+        await trades_hub.serve(websocket, since=since)
+    except Exception as e:
+        # Log unexpected errors instead of crashing the server
+        print(f"[WS] Error in /ws/trades: {e}")
+
+
+@router.websocket("/ws/whales")
+async def stream_whales(websocket: WebSocket, since: int | None = None) -> None:
+    """
+    Streams whale alerts like /ws/trades streams trades: each trade is sent
+    once, when the bot classifies it, with the "threshold" it beat. Alerts
+    have their own seq numbering; ?since=<seq> resumes after a disconnect.
+    """
+    try:
+        await whales_hub.serve(websocket, since=since)
+    except Exception as e:
+        # Log unexpected errors instead of crashing the server
+        print(f"[WS] Error in /ws/whales: {e}")
+
+
+@router.websocket("/ws")
+async def stream_topics(websocket: WebSocket) -> None:
+    """
+    Multiplexed socket. Send {"op": "subscribe", "topic": ..., filters} with
+    topic trades | whales | orderflow | markets | traders and optional
+    "market", "min_notional" (and "limit" for traders); every message for a
+    subscription carries its "sub" key, which {"op": "unsubscribe"} takes.
+    """
+    try:
+        await topics_hub.serve(websocket)
+    except Exception as e:
+        # Log unexpected errors instead of crashing the server
+        print(f"[WS] Error in /ws: {e}")
+
+
+@router.get("/ws/stats")
+def get_ws_stats():
+    # Clients, broadcasts, replays, resyncs, subscription groups and dropped slow clients
+    return {
+        "trades": trades_hub.stats(),
+        "whales": whales_hub.stats(),
+        "topics": topics_hub.stats(),
+    }
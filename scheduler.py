@@ -0,0 +1,86 @@
+import random
+
+MIN_INTERVAL = 1.0        # seconds, fastest polling when falling behind
+MAX_INTERVAL = 15.0       # seconds, slowest polling on a quiet feed
+BACKOFF_MAX = 120.0       # seconds, cap for error backoff
+BEHIND_RATIO = 0.8        # share of new trades per poll that means we lag
+QUIET_RATIO = 0.1         # share of new trades per poll that means it's quiet
+
+
+def is_retryable(status) -> bool:
+    """429, 5xx and network errors (status None) are worth backing off for."""
+    return status is None or status == 429 or status >= 500
+
+
+class PollScheduler:
+    """
+    Decides how long to wait before the next poll.
+
+    - The cadence is kept from cycle start to cycle start, so a slow cycle
+      does not push every later poll back.
+    - The interval halves when the share of new trades (or a backfill gap)
+      shows the poller is falling behind, grows by 25% on a quiet feed, and
+      otherwise drifts back to the base interval.
+    - Retryable errors switch to jittered exponential backoff, honouring
+      Retry-After when the API sends it.
+    """
+
+    def __init__(
+        self,
+        base_interval: float,
+        min_interval: float = MIN_INTERVAL,
+        max_interval: float = MAX_INTERVAL,
+        backoff_max: float = BACKOFF_MAX,
+    ):
+        self.base_interval = base_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff_max = backoff_max
+        self.interval = base_interval
+        self.errors = 0            # consecutive retryable errors
+        self.retry_after = None
+        self.lag = 0.0             # seconds the last cycle overran its slot
+        self.new_ratio = 0.0
+        self.delay = base_interval
+
+    def record_success(self, fetched: int, new: int, gap: bool = False) -> None:
+        self.errors = 0
+        self.retry_after = None
+        self.new_ratio = new / fetched if fetched else 0.0
+
+        if gap or self.new_ratio >= BEHIND_RATIO:
+            self.interval = max(self.min_interval, self.interval * 0.5)
+        elif self.new_ratio <= QUIET_RATIO:
+            self.interval = min(self.max_interval, self.interval * 1.25)
+        else:
+            self.interval += (self.base_interval - self.interval) * 0.25
+
+    def record_error(self, status=None, retry_after=None) -> None:
+        if not is_retryable(status):
+            return
+        self.errors += 1
+        self.retry_after = retry_after
+
+    def next_delay(self, cycle_started: float, now: float) -> float:
+        """Seconds to sleep before the next cycle; times from time.monotonic()."""
+        if self.errors:
+            ceiling = min(self.backoff_max, self.base_interval * 2 ** (self.errors - 1))
+            delay = random.uniform(ceiling / 2, ceiling)
+            if self.retry_after:
+                delay = max(delay, self.retry_after)
+        else:
+            delay = self.interval
+
+        elapsed = now - cycle_started
+        self.lag = max(0.0, elapsed - delay)
+        self.delay = delay
+        return max(0.0, delay - elapsed)
+
+    def stats(self) -> dict:
+        return {
+            "interval": round(self.interval, 3),
+            "next_delay": round(self.delay, 3),
+            "lag": round(self.lag, 3),
+            "new_ratio": round(self.new_ratio, 3),
+            "consecutive_errors": self.errors,
+        }
@@ -0,0 +1,293 @@
+import os
+import json
+import mmap
+import time
+import struct
+import tempfile
+import threading
+
+from snapshots import EncodedPayload
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# tmpfs on Linux, so the snapshot lives in shared memory; data/ elsewhere
+SHARED_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else os.path.join(BASE_DIR, "data")
+SHARED_PATH = os.environ.get(
+    "POLYMARKET_SHARED_PATH", os.path.join(SHARED_DIR, "polymarket-snapshot.bin")
+)
+# How often a reader with listeners (WebSocket hubs) checks for a new generation
+WATCH_INTERVAL = 0.1  # seconds
+
+MAGIC = b"PMSNAP01"
+_HEADER = struct.Struct("<8sQI")  # magic, generation, index length
+_GEN = struct.Struct("<Q")
+
+
+# ---------------- FORMAT ----------------
+#
+# <path>      header | index JSON
+#             index: {fname: [version, identity, gzip, br]}, each body an
+#             [offset, length] in that version's body file, or null.
+# <path>.d/<fname>.<version>
+#             The bodies of one output version, written once. A generation
+#             whose outputs mostly did not change only writes the changed
+#             ones, and readers keep their mapping of the rest.
+#             Every file is written to a temp file and renamed into place, so
+#             a mapped file never changes underneath its readers.
+# <path>.gen  The current generation as a u64, bumped after every rename.
+#             Readers keep it mapped and compare one integer per lookup.
+
+
+def _body_name(fname: str, version: str) -> str:
+    return f"{fname}.{version}"
+
+
+class SharedSnapshotWriter:
+    """
+    Store-like target for the bot's SnapshotWriter in shared mode.
+    publish() compresses each new version once; commit() writes the body
+    files of the new versions and a fresh index of all current outputs, then
+    bumps the generation.
+    """
+
+    def __init__(self, path: str = SHARED_PATH):
+        self.path = path
+        self.body_dir = path + ".d"
+        self._payloads: dict[str, EncodedPayload] = {}
+        self._parts: dict[str, tuple[str, list]] = {}  # fname -> (version written, parts)
+        # fname -> body file of the version before the current one; kept for
+        # one more change, so a reader that just read the previous index finds it
+        self._previous: dict[str, str] = {}
+        self._swept = False
+        self._dirty = False
+        os.makedirs(self.body_dir, exist_ok=True)
+        # Readers keep this file mapped: it is sized once and afterwards only
+        # overwritten in place, never truncated (a mapped page past EOF is SIGBUS)
+        self._gen_fd = os.open(path + ".gen", os.O_RDWR | os.O_CREAT, 0o644)
+        raw = os.pread(self._gen_fd, _GEN.size, 0)
+        # continue numbering across restarts
+        self.generation = _GEN.unpack(raw)[0] if len(raw) == _GEN.size else 0
+        if len(raw) < _GEN.size:
+            self._write_generation(self.generation)
+
+    def publish(self, fname: str, data, version: str, payload: bytes) -> None:
+        self._payloads[fname] = EncodedPayload(payload, version)
+        self._dirty = True
+
+    def _write_generation(self, generation: int) -> None:
+        os.pwrite(self._gen_fd, _GEN.pack(generation), 0)
+
+    @staticmethod
+    def _write_file(path: str, chunks) -> None:
+        fd, tmp_path = tempfile.mkstemp(
+            dir=os.path.dirname(path), prefix=".polymarket-snapshot-"
+        )
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in chunks:
+                    f.write(chunk)
+            os.chmod(tmp_path, 0o644)  # mkstemp creates 0600; workers may run as another user
+            os.replace(tmp_path, path)
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def _write_bodies(self, fname: str, p: EncodedPayload) -> list:
+        """Write one new version's body file; returns its parts."""
+        parts, bodies, offset = [], [], 0
+        for body in (p.identity, p.gzip, p.br):
+            if body is None:
+                parts.append(None)
+                continue
+            parts.append([offset, len(body)])
+            bodies.append(body)
+            offset += len(body)
+        name = _body_name(fname, p.version)
+        self._write_file(os.path.join(self.body_dir, name), bodies)
+
+        written = self._parts.get(fname)
+        stale = self._previous.pop(fname, None)
+        if stale is not None and stale != name:  # a version may come back
+            try:
+                os.remove(os.path.join(self.body_dir, stale))
+            except OSError:
+                pass
+        if written is not None:
+            self._previous[fname] = _body_name(fname, written[0])
+        self._parts[fname] = (p.version, parts)
+        return parts
+
+    def _sweep(self) -> None:
+        """Remove body files no current or previous version uses (e.g. of an earlier run)."""
+        keep = {_body_name(fname, version) for fname, (version, _) in self._parts.items()}
+        keep.update(self._previous.values())
+        for name in os.listdir(self.body_dir):
+            if name not in keep:
+                try:
+                    os.remove(os.path.join(self.body_dir, name))
+                except OSError:
+                    pass
+
+    def commit(self) -> bool:
+        """Write a new generation if anything was published since the last one."""
+        if not self._dirty:
+            return False
+        index = {}
+        for fname, p in sorted(self._payloads.items()):
+            written = self._parts.get(fname)
+            if written is not None and written[0] == p.version:
+                parts = written[1]  # unchanged since the last generation
+            else:
+                parts = self._write_bodies(fname, p)
+            index[fname] = [p.version, *parts]
+        index_bytes = json.dumps(index, separators=(",", ":")).encode("utf-8")
+        generation = self.generation + 1
+        self._write_file(
+            self.path, (_HEADER.pack(MAGIC, generation, len(index_bytes)), index_bytes)
+        )
+
+        self._write_generation(generation)
+        self.generation = generation
+        self._dirty = False
+        if not self._swept:
+            self._swept = True
+            self._sweep()
+        return True
+
+
+class SharedSnapshotReader:
+    """
+    Serves the bot's shared snapshot in an API worker, with the same read
+    interface as FileCache. Bodies are memoryviews into the mapped body
+    files: all workers share the same page-cache pages, and serving a
+    request parses nothing. A new generation maps only the versions that
+    changed. get()/get_versioned() decode JSON lazily, once per version,
+    for the few routes and WebSocket topics that need Python objects.
+    """
+
+    def __init__(self, path: str = SHARED_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._gen_map = None
+        self._generation = None
+        self._encoded: dict[str, EncodedPayload] = {}
+        self._parsed: dict[str, tuple[str, object]] = {}
+        self._listeners = []
+        self._watcher = None
+        self.remaps = 0
+        self.mode = "shared"
+
+    # ---------------- mapping ----------------
+
+    def _current_generation(self):
+        if self._gen_map is None:
+            try:
+                with open(self.path + ".gen", "rb") as f:
+                    self._gen_map = mmap.mmap(f.fileno(), _GEN.size, access=mmap.ACCESS_READ)
+            except (OSError, ValueError):
+                return None  # the bot has not published yet
+        return _GEN.unpack_from(self._gen_map, 0)[0]
+
+    def _refresh(self) -> set[str]:
+        """Map the newest generation if it changed; returns changed file names."""
+        generation = self._current_generation()
+        if generation is None or generation == self._generation:
+            return set()
+        with self._lock:
+            if generation == self._generation:
+                return set()
+            try:
+                with open(self.path, "rb") as f:
+                    raw = f.read()
+                magic, file_generation, index_len = _HEADER.unpack_from(raw, 0)
+                if magic != MAGIC:
+                    return set()
+                index = json.loads(raw[_HEADER.size:_HEADER.size + index_len])
+
+                encoded, changed = {}, set()
+                for fname, (version, *parts) in index.items():
+                    current = self._encoded.get(fname)
+                    if current is not None and current.version == version:
+                        encoded[fname] = current  # same bodies, still mapped
+                        continue
+                    encoded[fname] = self._map_version(fname, version, parts)
+                    changed.add(fname)
+            except (OSError, ValueError, struct.error):
+                # e.g. a body file already replaced twice: retry on the next lookup
+                return set()
+            # A replaced version's mapping is released once no response uses its views
+            self._encoded = encoded
+            self._generation = file_generation
+            self.remaps += 1
+            return changed
+
+    def _map_version(self, fname: str, version: str, parts) -> EncodedPayload:
+        with open(os.path.join(self.path + ".d", _body_name(fname, version)), "rb") as f:
+            view = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        bodies = [view[part[0]:part[0] + part[1]] if part else None for part in parts]
+        return EncodedPayload.from_parts(version, *bodies)
+
+    # ---------------- read interface ----------------
+
+    def get_encoded(self, fname: str) -> EncodedPayload | None:
+        """Pre-serialized, pre-compressed body of the current version."""
+        self._refresh()
+        return self._encoded.get(fname)
+
+    def get_versioned(self, fname: str, default=None):
+        """Returns (data, version) tuple for websocket versioning."""
+        encoded = self.get_encoded(fname)
+        if encoded is None:
+            return default, None
+        with self._lock:
+            cached = self._parsed.get(fname)
+            if cached is None or cached[0] != encoded.version:
+                cached = (encoded.version, json.loads(bytes(encoded.identity)))
+                self._parsed[fname] = cached
+        return cached[1], cached[0]
+
+    def get(self, fname: str, default=None, raw: bool = False):
+        return self.get_versioned(fname, default)[0]
+
+    def add_listener(self, callback) -> None:
+        """callback(fname) runs in a watcher thread after every new version."""
+        self._listeners.append(callback)
+        if self._watcher is None:
+            self._watcher = threading.Thread(target=self._watch, daemon=True)
+            self._watcher.start()
+
+    def _watch(self) -> None:
+        while True:
+            for fname in self._refresh():
+                for callback in self._listeners:
+                    try:
+                        callback(fname)
+                    except Exception as e:
+                        print(f"[SharedSnapshot] Listener error for {fname}: {e}")
+            time.sleep(WATCH_INTERVAL)
+
+    def get_stats(self) -> dict:
+        """Mapped generation and the version of every output."""
+        self._refresh()
+        return {
+            "mode": self.mode,
+            "path": self.path,
+            "pid": os.getpid(),
+            "generation": self._generation,
+            "remaps": self.remaps,
+            "versions": {fname: p.version for fname, p in self._encoded.items()},
+        }
+
+    @staticmethod
+    def dumps(obj) -> str:
+        """Safe JSON dump."""
+        try:
+            return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+        except (TypeError, ValueError):
+            return ""
+
+
+# Per-worker instance used by the routers in shared mode
+shared_reader = SharedSnapshotReader()
@@ -0,0 +1,180 @@
+import os
+import gzip
+import json
+import zlib
+import threading
+
+try:
+    import brotli  # optional, adds a br variant next to gzip
+except ImportError:
+    brotli = None
+
+# POLYMARKET_EMBEDDED=1 runs the bot inside the FastAPI process (see main.py)
+EMBEDDED = os.environ.get("POLYMARKET_EMBEDDED", "0") == "1"
+# POLYMARKET_SHARED=1: the bot publishes one memory-mapped snapshot file that
+# every API worker serves from (see shared_snapshot.py)
+SHARED = os.environ.get("POLYMARKET_SHARED", "0") == "1"
+
+# The bot's hot set: trades older than this are evicted from memory (None =
+# no age limit). The API's log-backed entity views cover the same window.
+RETENTION_SECONDS = 24 * 3600
+
+# Bodies smaller than this are always sent uncompressed
+COMPRESS_MIN_BYTES = 1024
+
+# The bot publishes its candle rings in this many files (candles_000.json ...),
+# split by a stable hash of the market, so a cycle rewrites only the shards
+# of markets that traded
+CANDLE_SHARDS = 256
+
+
+def candle_shard_file(market: str) -> str:
+    """Name of the candles file holding one market."""
+    return candle_shard_name(zlib.crc32(market.encode("utf-8")) % CANDLE_SHARDS)
+
+
+def candle_shard_name(shard: int) -> str:
+    return f"candles_{shard:03d}.json"
+
+
+class EncodedPayload:
+    """
+    One version of an output as ready-to-send bytes: the compact JSON body,
+    gzip (and brotli, if installed) variants compressed once, and an ETag.
+    Serving it costs O(1) per request instead of re-serializing.
+    """
+
+    __slots__ = ("version", "etag", "identity", "gzip", "br")
+
+    def __init__(self, payload: bytes, version: str):
+        self.version = version
+        self.etag = f'W/"{version}"'
+        self.identity = payload
+        self.gzip = None
+        self.br = None
+        if len(payload) >= COMPRESS_MIN_BYTES:
+            self.gzip = gzip.compress(payload, compresslevel=6, mtime=0)
+            if brotli is not None:
+                self.br = brotli.compress(payload, quality=5)
+
+    @classmethod
+    def from_parts(cls, version: str, identity, gzip_body=None, br_body=None):
+        """Wrap bodies that were compressed elsewhere (shared snapshot readers)."""
+        self = cls.__new__(cls)
+        self.version = version
+        self.etag = f'W/"{version}"'
+        self.identity = identity
+        self.gzip = gzip_body
+        self.br = br_body
+        return self
+
+    def matches(self, if_none_match: str | None) -> bool:
+        """True if an If-None-Match header names this version."""
+        if not if_none_match:
+            return False
+        for tag in if_none_match.split(","):
+            tag = tag.strip()
+            if tag == "*" or tag.removeprefix("W/") == self.etag.removeprefix("W/"):
+                return True
+        return False
+
+    def select(self, accept_encoding: str | None) -> tuple[bytes, str | None]:
+        """Best (body, content-encoding) for an Accept-Encoding header."""
+        accepted = set()
+        for part in (accept_encoding or "").split(","):
+            coding, _, params = part.strip().partition(";")
+            if params.replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+                continue
+            accepted.add(coding.strip().lower())
+        if self.br is not None and "br" in accepted:
+            return self.br, "br"
+        if self.gzip is not None and ("gzip" in accepted or "*" in accepted):
+            return self.gzip, "gzip"
+        return self.identity, None
+
+
+class SnapshotStore:
+    """
+    In-process snapshots published by an embedded PolymarketBot.
+    Same read interface as FileCache (get / get_versioned / dumps), keyed by
+    the same logical file names, but without the file round trip. Published
+    values are never mutated afterwards, so readers can use them lock-free.
+    """
+
+    def __init__(self):
+        self._data: dict[str, object] = {}
+        self._versions: dict[str, str] = {}
+        self._encoded: dict[str, EncodedPayload] = {}
+        self._lock = threading.Lock()
+        self._db = None  # the embedded bot's TradeDB, for entity lookups
+        self._listeners = []
+
+    def add_listener(self, callback) -> None:
+        """callback(fname) runs in the publishing thread after every new version."""
+        self._listeners.append(callback)
+
+    def attach_db(self, db) -> None:
+        self._db = db
+
+    def get_market_trades(self, market: str, limit: int):
+        """Aggregates and newest trades of one market from the live indexes."""
+        return self._db.get_market(market, limit) if self._db is not None else None
+
+    def get_trader(self, wallet: str, limit: int):
+        """Aggregates and newest trades of one proxy wallet from the live indexes."""
+        return self._db.get_wallet(wallet, limit) if self._db is not None else None
+
+    def get_candles(self, market: str, res: str, outcome=None, limit=200, since=None):
+        """One market's OHLCV candles per outcome from the live candle rings."""
+        if self._db is None:
+            return None
+        return self._db.get_candles(market, res, outcome, limit, since)
+
+    def publish(self, fname: str, data, version: str, payload: bytes) -> None:
+        """payload is the JSON encoding of data, compressed here once per version."""
+        encoded = EncodedPayload(payload, version)
+        with self._lock:
+            self._data[fname] = data
+            self._versions[fname] = version
+            self._encoded[fname] = encoded
+        for callback in self._listeners:
+            callback(fname)
+
+    def get_encoded(self, fname: str) -> EncodedPayload | None:
+        with self._lock:
+            return self._encoded.get(fname)
+
+    def get(self, fname: str, default=None, raw: bool = False):
+        with self._lock:
+            return self._data.get(fname, default)
+
+    def get_versioned(self, fname: str, default=None):
+        """Returns (data, version) tuple for websocket versioning."""
+        with self._lock:
+            return self._data.get(fname, default), self._versions.get(fname)
+
+    @staticmethod
+    def dumps(obj) -> str:
+        """Safe JSON dump."""
+        try:
+            return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+        except (TypeError, ValueError):
+            return ""
+
+
+# Global instance filled by the embedded bot
+snapshot_store = SnapshotStore()
+
+
+def get_data_source():
+    """What the routers read from: in-process snapshots, the shared mmap
+    snapshot, or the FileCache."""
+    if EMBEDDED:
+        return snapshot_store
+    if SHARED:
+        from shared_snapshot import shared_reader
+
+        return shared_reader
+    from file_cache import file_cache  # starts the file watcher
+
+    return file_cache
@@ -0,0 +1,626 @@
+import os
+import io
+import csv
+import json
+import mmap
+import zlib
+import heapq
+import bisect
+import hashlib
+import struct
+import logging
+import tempfile
+import threading
+from array import array
+from operator import itemgetter
+from datetime import datetime, UTC
+
+# Absolute log dir, shared by bot.py (writer) and routers/api.py (readers)
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+LOG_DIR = os.path.join(BASE_DIR, "data", "log")
+
+SEGMENT_MAX_BYTES = 16 * 1024 * 1024
+SEGMENT_PREFIX = "segment-"
+SEGMENT_SUFFIX = ".log"
+SEGMENT_INDEX_SUFFIX = ".idx"
+
+# Column order of the CSV exports
+TRADE_FIELDS = [
+    "size",
+    "market_title",
+    "outcome",
+    "price",
+    "ts_iso",
+    "name",
+    "pseudonym",
+    "proxyWallet",
+    "transactionHash",
+    "side",
+    "outcomeIndex",
+]
+
+# Order of the values in each log record (ts_iso is derived from ts)
+LOG_COLUMNS = [
+    "transactionHash",
+    "ts",
+    "size",
+    "price",
+    "market_title",
+    "outcome",
+    "name",
+    "pseudonym",
+    "proxyWallet",
+    "side",
+    "outcomeIndex",
+]
+_TS = LOG_COLUMNS.index("ts")
+_SIZE = LOG_COLUMNS.index("size")
+_PRICE = LOG_COLUMNS.index("price")
+_SIDE = LOG_COLUMNS.index("side")
+_OUTCOME_INDEX = LOG_COLUMNS.index("outcomeIndex")
+# Columns with per-value postings (record offsets), for the entity views
+POSTING_FIELDS = ("market_title", "proxyWallet")
+_POSTING_COLUMNS = tuple(LOG_COLUMNS.index(f) for f in POSTING_FIELDS)
+
+
+# ---------------- RECORD FORMAT ----------------
+#
+# One trade per line:  <crc32 as 8 hex chars> <compact JSON array>\n
+# The CRC covers the JSON bytes. A missing newline or a CRC mismatch marks
+# a torn write; readers stop there and the writer truncates it on startup.
+
+
+def encode_record(t) -> bytes:
+    payload = json.dumps(
+        [t[c] for c in LOG_COLUMNS], ensure_ascii=False, separators=(",", ":")
+    ).encode("utf-8")
+    return b"%08x %s\n" % (zlib.crc32(payload), payload)
+
+
+def _iter_segment(path, start: int = 0, needles=()):
+    """
+    Yield (end_offset, row) for each valid record of one segment, via mmap,
+    beginning at byte offset start. Records whose raw bytes lack any of the
+    needles are skipped before checksum and JSON decoding.
+    """
+    try:
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                pos = start
+                size = len(buf)
+                while pos < size:
+                    nl = buf.find(b"\n", pos)
+                    if nl < 0:
+                        return  # incomplete tail
+                    line = buf[pos:nl]
+                    if needles and not all(n in line for n in needles):
+                        pos = nl + 1
+                        continue
+                    try:
+                        crc = int(line[:8], 16)
+                        payload = line[9:]
+                        if zlib.crc32(payload) != crc:
+                            return
+                        row = json.loads(payload)
+                    except ValueError:
+                        return
+                    pos = nl + 1
+                    yield pos, row
+    except FileNotFoundError:
+        return
+
+
+def _record_at(buf, pos: int):
+    """Row of the record starting at byte pos (already checked when indexed)."""
+    return json.loads(buf[pos + 9:buf.find(b"\n", pos)])
+
+
+def list_segments(log_dir: str = LOG_DIR) -> list[str]:
+    """Segment paths, oldest first."""
+    try:
+        names = os.listdir(log_dir)
+    except OSError:
+        return []
+    names = [
+        n for n in names if n.startswith(SEGMENT_PREFIX) and n.endswith(SEGMENT_SUFFIX)
+    ]
+    return [os.path.join(log_dir, n) for n in sorted(names)]
+
+
+# ---------------- SEGMENT INDEXES ----------------
+#
+# A segment that is no longer the newest never changes again. Its sidecar
+# <segment>.idx holds a header (magic, min ts, max ts, record count, number
+# of distinct keys per POSTING_FIELDS column) and then, as int64:
+#   - the record start offsets by ts descending, then by size descending
+#     (each stable, so ties keep append order)
+#   - per POSTING_FIELDS column, a table of (key hash, first posting,
+#     posting count) sorted by hash
+#   - per POSTING_FIELDS column, the postings: record start offsets grouped
+#     by key, in append order
+# The header lets replays skip whole segments; the orders let exports merge
+# the segments lazily instead of loading the history; the postings let the
+# entity views read only one market's or wallet's records. The writer
+# indexes a segment when it rolls over; readers index older logs (or
+# sidecars of an older format) on first use.
+
+_INDEX_HEADER = struct.Struct("<8sqqqqq")
+_INDEX_MAGIC = b"PMLOGIX2"
+_ENTRY = 3  # int64s per posting table entry
+
+
+def _key_hash(value) -> int:
+    # Stable across processes; collisions only cost a wasted record read
+    digest = hashlib.blake2b(_needle(value), digest_size=8).digest()
+    return int.from_bytes(digest, "little", signed=True)
+
+
+def _index_path(path: str) -> str:
+    return path[:-len(SEGMENT_SUFFIX)] + SEGMENT_INDEX_SUFFIX
+
+
+def build_segment_index(path: str) -> bytes:
+    """Sidecar contents for a sealed segment (holds its offsets, not its rows)."""
+    starts, ts, sizes = array("q"), [], []
+    keys = [{} for _ in POSTING_FIELDS]  # per column: key hash -> record starts
+    start = 0
+    for end, row in _iter_segment(path):
+        starts.append(start)
+        ts.append(row[_TS])
+        sizes.append(row[_SIZE])
+        for by_hash, col in zip(keys, _POSTING_COLUMNS):
+            by_hash.setdefault(_key_hash(row[col]), array("q")).append(start)
+        start = end
+    n = len(starts)
+    by_ts = array("q", (starts[i] for i in sorted(range(n), key=ts.__getitem__, reverse=True)))
+    by_size = array("q", (starts[i] for i in sorted(range(n), key=sizes.__getitem__, reverse=True)))
+    tables, postings = [], []
+    for by_hash in keys:
+        table, flat = array("q"), array("q")
+        for h in sorted(by_hash):
+            table.extend((h, len(flat), len(by_hash[h])))
+            flat.extend(by_hash[h])
+        tables.append(table.tobytes())
+        postings.append(flat.tobytes())
+    header = _INDEX_HEADER.pack(
+        _INDEX_MAGIC, min(ts, default=0), max(ts, default=0), n, *(len(k) for k in keys)
+    )
+    return b"".join([header, by_ts.tobytes(), by_size.tobytes(), *tables, *postings])
+
+
+def write_segment_index(path: str) -> bytes:
+    """Build and store a sealed segment's sidecar; returns its contents."""
+    index = build_segment_index(path)
+    tmp_path = None
+    try:
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(index)
+        os.replace(tmp_path, _index_path(path))
+    except OSError as e:
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        # still usable from memory; the next reader tries again
+        logging.warning(f"Trade log {os.path.basename(path)}: cannot write index: {e}")
+    return index
+
+
+def _load_index(path: str):
+    """Sidecar of a sealed segment, mapped (or built if it is missing)."""
+    try:
+        with open(_index_path(path), "rb") as f:
+            index = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if index[:len(_INDEX_MAGIC)] == _INDEX_MAGIC:
+            return index
+    except (OSError, ValueError):
+        pass
+    return write_segment_index(path)
+
+
+def segment_ts_range(path: str) -> tuple[int, int, int]:
+    """(min ts, max ts, record count) of a sealed segment."""
+    _, min_ts, max_ts, count, *_ = _INDEX_HEADER.unpack_from(_load_index(path), 0)
+    return min_ts, max_ts, count
+
+
+def _sealed_postings(path: str, field: str, value) -> list[int]:
+    """Start offsets of the records of a sealed segment whose field may equal value."""
+    index = _load_index(path)
+    _, _, _, count, *n_keys = _INDEX_HEADER.unpack_from(index, 0)
+    f = POSTING_FIELDS.index(field)
+    tables = _INDEX_HEADER.size + 2 * count * 8
+    start = tables + sum(n_keys[:f]) * _ENTRY * 8
+    view = memoryview(index)
+    table = view[start:start + n_keys[f] * _ENTRY * 8].cast("q")
+    try:
+        h = _key_hash(value)
+        hashes = table[0::_ENTRY]
+        i = bisect.bisect_left(hashes, h)
+        if i == len(hashes) or hashes[i] != h:
+            return []
+        first, n = table[i * _ENTRY + 1], table[i * _ENTRY + 2]
+        at = tables + sum(n_keys) * _ENTRY * 8 + f * count * 8 + first * 8
+        return view[at:at + n * 8].cast("q").tolist()
+    finally:
+        table.release()
+        view.release()
+
+
+class _TailPostings:
+    """
+    Postings of the newest segment, which still grows and has no sidecar.
+    Each lookup first indexes only the records appended since the previous
+    one, so every record is decoded once per process.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._path = None
+        self._end = 0
+        self._postings = {}
+
+    def lookup(self, path: str, field: str, value) -> list[int]:
+        with self._lock:
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                return []
+            if path != self._path or size < self._end:
+                # rolled over (or a new log): start on the new segment
+                self._path, self._end = path, 0
+                self._postings = {f: {} for f in POSTING_FIELDS}
+            for end, row in _iter_segment(path, self._end):
+                for f, col in zip(POSTING_FIELDS, _POSTING_COLUMNS):
+                    self._postings[f].setdefault(row[col], []).append(self._end)
+                self._end = end
+            return list(self._postings[field].get(value, ()))
+
+
+_tail_postings = _TailPostings()
+
+
+def _iter_ordered(path: str, sealed: bool, order: int):
+    """
+    Rows of one segment by ts (order 0) or size (order 1), descending. Sealed
+    segments are read through their index; the newest one, at most
+    SEGMENT_MAX_BYTES, is sorted in memory.
+    """
+    if not sealed:
+        rows = [row for _, row in _iter_segment(path)]
+        rows.sort(key=itemgetter(_SIZE if order else _TS), reverse=True)
+        yield from rows
+        return
+    index = _load_index(path)
+    count = _INDEX_HEADER.unpack_from(index, 0)[3]
+    if not count:
+        return
+    first = _INDEX_HEADER.size + order * count * 8
+    offsets = memoryview(index)[first:first + count * 8].cast("q")
+    try:
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            for pos in offsets:
+                yield _record_at(buf, pos)
+    finally:
+        offsets.release()
+
+
+def _merged(log_dir: str, order: int):
+    """All segments merged by ts or size, descending; one row per segment held."""
+    segments = list_segments(log_dir)
+    runs = [
+        _iter_ordered(path, i < len(segments) - 1, order) for i, path in enumerate(segments)
+    ]
+    return heapq.merge(*runs, key=itemgetter(_SIZE if order else _TS), reverse=True)
+
+
+def iter_rows(log_dir: str = LOG_DIR, min_ts=None):
+    """
+    All logged rows in append order, optionally only those with ts >= min_ts.
+    Sealed segments whose newest trade is older than min_ts are not read.
+    """
+    segments = list_segments(log_dir)
+    for i, path in enumerate(segments):
+        if min_ts is not None and i < len(segments) - 1:
+            _, max_ts, count = segment_ts_range(path)
+            if not count or max_ts < min_ts:
+                continue
+        for _, row in _iter_segment(path):
+            if min_ts is None or row[_TS] >= min_ts:
+                yield row
+
+
+def _segment_seq(path: str) -> int:
+    return int(os.path.basename(path)[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)])
+
+
+# ---------------- HISTORY QUERIES ----------------
+#
+# A cursor is "<segment seq>-<byte offset>": the log position just after the
+# last record a page scanned. Positions never move (the log is append-only),
+# so cursors stay valid while new trades arrive and a page never rescans
+# records an earlier page already looked at.
+
+
+def encode_cursor(seq: int, offset: int) -> str:
+    return f"{seq}-{offset}"
+
+
+def decode_cursor(cursor: str) -> tuple[int, int]:
+    """Parse a cursor; raises ValueError when malformed."""
+    seq, _, offset = cursor.partition("-")
+    seq, offset = int(seq), int(offset)
+    if seq < 0 or offset < 0:
+        raise ValueError(cursor)
+    return seq, offset
+
+
+def _needle(value) -> bytes:
+    # The value as it appears inside a logged JSON array
+    return json.dumps(value, ensure_ascii=False).encode("utf-8")
+
+
+def query_rows(
+    log_dir: str = LOG_DIR,
+    market=None,
+    outcome=None,
+    wallet=None,
+    side=None,
+    since=None,
+    until=None,
+    min_notional=None,
+    cursor=None,
+    limit: int = 1000,
+):
+    """
+    One page of logged rows in append order matching every given filter
+    (exact market title, outcome, proxy wallet and side; since <= ts < until;
+    size * price >= min_notional). Returns (rows, next_cursor); at most limit
+    rows are held in memory, whatever the size of the log.
+    """
+    start_seq, start_offset = decode_cursor(cursor) if cursor else (0, 0)
+    side = side.lower() if side else None
+    checks = [
+        (LOG_COLUMNS.index(col), value)
+        for col, value in (
+            ("market_title", market),
+            ("outcome", outcome),
+            ("proxyWallet", wallet),
+            ("side", side),
+        )
+        if value is not None
+    ]
+    needles = tuple(_needle(value) for _, value in checks)
+
+    rows = []
+    next_cursor = encode_cursor(start_seq, start_offset)
+    segments = list_segments(log_dir)
+    for path in segments:
+        seq = _segment_seq(path)
+        if seq < start_seq:
+            continue
+        sealed = path != segments[-1]
+        if since is not None and sealed:
+            _, max_ts, count = segment_ts_range(path)
+            if not count or max_ts < since:
+                next_cursor = encode_cursor(seq + 1, 0)
+                continue
+        start = start_offset if seq == start_seq else 0
+        for end, row in _iter_segment(path, start, needles):
+            next_cursor = encode_cursor(seq, end)
+            if any(row[i] != value for i, value in checks):
+                continue
+            ts = row[_TS]
+            if (since is not None and ts < since) or (until is not None and ts >= until):
+                continue
+            if min_notional is not None and row[_SIZE] * row[_PRICE] < min_notional:
+                continue
+            rows.append(row)
+            if len(rows) >= limit:
+                return rows, next_cursor
+        if sealed:
+            # Rolled-over segments are complete: resume past any filtered tail
+            next_cursor = encode_cursor(seq + 1, 0)
+    return rows, next_cursor
+
+
+def _row_side(row) -> str:
+    # Same rule as _infer_side in bot.py
+    side = str(row[_SIDE]).lower()
+    if "buy" in side:
+        return "buy"
+    if "sell" in side:
+        return "sell"
+    return "buy" if row[_OUTCOME_INDEX] == 0 else "sell"
+
+
+def entity_summary(log_dir: str, field: str, value, breakdown: str, since=None, limit: int = 50):
+    """
+    Aggregates and newest `limit` trades of one market or wallet (field, one
+    of POSTING_FIELDS) over the logged trades with ts >= since, in the shape
+    of the bot's per-entity indexes, or None if it has none. For API
+    processes without the bot's memory. Reads only that entity's records,
+    found through the segment postings.
+    """
+    key, split = LOG_COLUMNS.index(field), LOG_COLUMNS.index(breakdown)
+    totals = {"trade_count": 0, "total_volume": 0.0, "buy_volume": 0.0, "sell_volume": 0.0}
+    counts, volumes = {}, {}
+    first_ts = last_ts = None
+    newest = []  # min-heap of (ts, n, row): the `limit` newest by ts
+    segments = list_segments(log_dir)
+    for i, path in enumerate(segments):
+        if i < len(segments) - 1:
+            _, max_ts, count = segment_ts_range(path)
+            if not count or (since is not None and max_ts < since):
+                continue
+            offsets = _sealed_postings(path, field, value)
+        else:
+            offsets = _tail_postings.lookup(path, field, value)
+        if offsets:
+            with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                rows = [_record_at(buf, pos) for pos in offsets]
+        else:
+            rows = ()
+        for row in rows:
+            ts = row[_TS]
+            if row[key] != value or (since is not None and ts < since):
+                continue
+            notional = row[_SIZE] * row[_PRICE]
+            totals["trade_count"] += 1
+            totals["total_volume"] += notional
+            totals[f"{_row_side(row)}_volume"] += notional
+            b = row[split]
+            counts[b] = counts.get(b, 0) + 1
+            volumes[b] = volumes.get(b, 0.0) + notional
+            first_ts = ts if first_ts is None else min(first_ts, ts)
+            last_ts = ts if last_ts is None else max(last_ts, ts)
+            item = (ts, totals["trade_count"], row)
+            if len(newest) < limit:
+                heapq.heappush(newest, item)
+            elif item > newest[0]:
+                heapq.heapreplace(newest, item)
+    if not totals["trade_count"]:
+        return None
+    return {
+        **totals,
+        "first_ts": first_ts,
+        "last_ts": last_ts,
+        "breakdown": {b: {"trade_count": n, "volume": volumes[b]} for b, n in counts.items()},
+        "recent_trades": [
+            {**dict(zip(TRADE_FIELDS, _export_values(row))), "ts": row[_TS]}
+            for _, _, row in sorted(newest, reverse=True)
+        ],
+    }
+
+
+# ---------------- EXPORTS ----------------
+
+
+def iter_rows_chrono_desc(log_dir: str = LOG_DIR):
+    """Newest trade first across all segments, merged from their ts indexes."""
+    return _merged(log_dir, 0)
+
+
+def iter_rows_by_size_desc(log_dir: str = LOG_DIR):
+    """Largest trade first, merged from the segments' size indexes."""
+    return _merged(log_dir, 1)
+
+
+def _export_values(row):
+    values = dict(zip(LOG_COLUMNS, row))
+    values["ts_iso"] = (
+        datetime.fromtimestamp(values["ts"], UTC).isoformat().replace("+00:00", "Z")
+    )
+    return [values[f] for f in TRADE_FIELDS]
+
+
+def iter_csv(rows, chunk_rows: int = 1000):
+    """Stream rows as ';' CSV text chunks with a header (German Excel friendly)."""
+    out = io.StringIO()
+    writer = csv.writer(out, delimiter=";")
+    writer.writerow(TRADE_FIELDS)
+    pending = 0
+    for row in rows:
+        writer.writerow(_export_values(row))
+        pending += 1
+        if pending >= chunk_rows:
+            yield out.getvalue()
+            out.seek(0)
+            out.truncate()
+            pending = 0
+    yield out.getvalue()
+
+
+def iter_ndjson(rows, chunk_rows: int = 1000):
+    """Stream rows as newline-delimited JSON objects with the CSV columns."""
+    lines = []
+    for row in rows:
+        lines.append(
+            json.dumps(dict(zip(TRADE_FIELDS, _export_values(row))), ensure_ascii=False)
+        )
+        if len(lines) >= chunk_rows:
+            yield "\n".join(lines) + "\n"
+            lines = []
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+
+# ---------------- WRITER ----------------
+
+
+class TradeLog:
+    """
+    Append-only, segmented, checksummed trade log.
+    Every new trade is written exactly once; segments roll over at
+    SEGMENT_MAX_BYTES. On open, a torn tail in the newest segment is truncated.
+    """
+
+    def __init__(
+        self,
+        log_dir: str = LOG_DIR,
+        segment_max_bytes: int = SEGMENT_MAX_BYTES,
+        fsync: bool = True,
+    ):
+        self.log_dir = log_dir
+        self.segment_max_bytes = segment_max_bytes
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        os.makedirs(log_dir, exist_ok=True)
+
+        segments = list_segments(log_dir)
+        if segments:
+            self._recover(segments[-1])
+            self._seq = _segment_seq(segments[-1])
+        else:
+            self._seq = 1
+        self._file = open(self._segment_path(self._seq), "ab")
+
+    def _segment_path(self, seq: int) -> str:
+        return os.path.join(self.log_dir, f"{SEGMENT_PREFIX}{seq:06d}{SEGMENT_SUFFIX}")
+
+    @staticmethod
+    def _recover(path: str) -> None:
+        valid_end = 0
+        for end, _ in _iter_segment(path):
+            valid_end = end
+        size = os.path.getsize(path)
+        if valid_end < size:
+            logging.warning(
+                f"Trade log {os.path.basename(path)}: truncating "
+                f"{size - valid_end} bytes of torn/corrupt tail"
+            )
+            with open(path, "r+b") as f:
+                f.truncate(valid_end)
+
+    def append(self, trades) -> int:
+        """Append trades; returns bytes written."""
+        if not trades:
+            return 0
+        data = b"".join(encode_record(t) for t in trades)
+        with self._lock:
+            if self._file.tell() and self._file.tell() + len(data) > self.segment_max_bytes:
+                self._file.close()
+                # index the sealed segment off the ingest path
+                threading.Thread(
+                    target=write_segment_index,
+                    args=(self._segment_path(self._seq),),
+                    name="trade-log-index",
+                    daemon=True,
+                ).start()
+                self._seq += 1
+                self._file = open(self._segment_path(self._seq), "ab")
+            self._file.write(data)
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+        return len(data)
+
+    def replay(self, min_ts=None):
+        """Rows of every logged trade with ts >= min_ts, in append order."""
+        return iter_rows(self.log_dir, min_ts=min_ts)
+
+    def close(self) -> None:
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()